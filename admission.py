@@ -0,0 +1,136 @@
+import math
+import time
+import threading
+from typing import Callable, Dict, Optional
+from metrics import REGISTRY
+
+# Weight of the latest request in the per-lane service time average
+SERVICE_TIME_SMOOTHING = 0.2
+
+
+class AdmissionTicket:
+    """Outcome of one admission check; admitted tickets must be released"""
+
+    def __init__(self, lane: str, cost: float, admitted: bool, status: int = 200, retry_after: int = 0):
+        self.lane = lane
+        self.cost = cost
+        self.admitted = admitted
+        self.status = status
+        self.retry_after = retry_after
+        self.released = False
+
+
+class AdmissionController:
+    """Bounds the analysis work in flight by its expected cost.
+
+    Requests are sized from their body length before the body is read.
+    Small requests share a budget of estimated seconds (the estimate()
+    of each admitted request, in the units of estimate_processing_time);
+    bodies above large_threshold bytes, or of unknown length, take one of
+    max_large slots of their own. A big upload therefore never uses up
+    the budget small requests run in. A small request that does not fit
+    waits up to max_wait seconds for budget to free up, so a short burst
+    is absorbed rather than rejected; after that it is turned away with
+    503. A large request is turned away at once with 429 when every large
+    slot is taken. Retry-After is the lane's recent service time.
+    """
+
+    def __init__(self, capacity: float, max_large: int, large_threshold: int, estimate: Callable[[int], float],
+                 max_wait: float = 0.0):
+        self.capacity = capacity
+        self.max_large = max_large
+        self.large_threshold = large_threshold
+        self.estimate = estimate
+        self.max_wait = max_wait
+        self._lock = threading.Lock()
+        self._released = threading.Condition(self._lock)
+        self._cost = {'small': 0.0, 'large': 0.0}
+        self._in_flight = {'small': 0, 'large': 0}
+        self._service_time = {'small': 1.0, 'large': 10.0}
+
+    def admit(self, content_length: Optional[int]) -> AdmissionTicket:
+        """Admit a request of content_length bytes or say how it was rejected.
+
+        Blocks for up to max_wait seconds when a small request does not fit yet.
+        """
+        large = content_length is None or content_length > self.large_threshold
+        lane = 'large' if large else 'small'
+        cost = self.estimate(content_length or 0)
+        waited = None
+        with self._lock:
+            admitted = self._fits(lane, cost)
+            if not admitted and not large and self.max_wait > 0:
+                started = time.perf_counter()
+                deadline = started + self.max_wait
+                while not admitted:
+                    remaining = deadline - time.perf_counter()
+                    if remaining <= 0:
+                        break
+                    self._released.wait(remaining)
+                    admitted = self._fits(lane, cost)
+                waited = time.perf_counter() - started
+            if admitted:
+                self._cost[lane] += cost
+                self._in_flight[lane] += 1
+            retry_after = max(1, math.ceil(self._service_time[lane]))
+            self._record_depth(lane)
+        if waited is not None:
+            REGISTRY.observe('analyzer_admission_wait_seconds', waited, 'Time small requests waited for admission budget',
+                             outcome='admitted' if admitted else 'rejected')
+        if admitted:
+            return AdmissionTicket(lane, cost, True)
+
+        status = 429 if large else 503
+        REGISTRY.inc('analyzer_admission_rejected_total', 1, 'Requests turned away by admission control',
+                     lane=lane, status=status)
+        return AdmissionTicket(lane, cost, False, status, retry_after)
+
+    def resize(self, ticket: AdmissionTicket, size: int) -> AdmissionTicket:
+        """Admit an admitted request again at its real size, e.g. once an upload is decompressed.
+
+        The body length a request was admitted on can be far below the text
+        it expands to. When the new size costs more or belongs to the large
+        lane, the old ticket is released and the request is admitted afresh;
+        the returned ticket is the one to release (or, if rejected, the
+        answer to send).
+        """
+        large = size > self.large_threshold
+        if ticket.lane == ('large' if large else 'small') and self.estimate(size) <= ticket.cost:
+            return ticket
+        self.release(ticket)
+        return self.admit(size)
+
+    def _fits(self, lane: str, cost: float) -> bool:
+        if lane == 'large':
+            return self._in_flight['large'] < self.max_large
+        # An idle lane takes any request, so nothing is rejected forever
+        return self._in_flight['small'] == 0 or self._cost['small'] + cost <= self.capacity
+
+    def release(self, ticket: AdmissionTicket, elapsed: Optional[float] = None):
+        """Return an admitted ticket's cost; elapsed feeds the Retry-After estimate"""
+        if not ticket.admitted or ticket.released:
+            return
+        ticket.released = True
+        lane = ticket.lane
+        with self._lock:
+            self._cost[lane] = max(0.0, self._cost[lane] - ticket.cost)
+            self._in_flight[lane] -= 1
+            if elapsed is not None:
+                self._service_time[lane] += SERVICE_TIME_SMOOTHING * (elapsed - self._service_time[lane])
+            self._record_depth(lane)
+            self._released.notify_all()
+
+    def _record_depth(self, lane: str):
+        # Called under the lock so the gauges never go back to an older value
+        REGISTRY.set_gauge('analyzer_admission_in_flight', self._in_flight[lane], 'Admitted requests not yet finished', lane=lane)
+        REGISTRY.set_gauge('analyzer_admission_cost_seconds', self._cost[lane], 'Estimated seconds of admitted work', lane=lane)
+
+    def stats(self) -> Dict:
+        with self._lock:
+            return {
+                'capacity': self.capacity,
+                'max_large': self.max_large,
+                'in_flight': dict(self._in_flight),
+                'cost': dict(self._cost),
+                'service_time': dict(self._service_time)
+            }
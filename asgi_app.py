@@ -0,0 +1,374 @@
+import os
+import time
+import asyncio
+import tempfile
+import traceback
+from concurrent.futures.process import BrokenProcessPool
+from contextlib import asynccontextmanager
+from fastapi import FastAPI, Request
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import JSONResponse, PlainTextResponse
+from werkzeug.utils import secure_filename
+from enhanced_analyzer import PREDICTION_MODES
+from language_detection import detect_language_with_time
+from metrics import REGISTRY
+
+# Worker processes for feature extraction and language detection. The event
+# loop only parses requests, so this is what spreads analysis over the cores.
+# It sizes the analyzer's own pool (an explicit ANALYZER_PROCESS_WORKERS wins),
+# which forks when the analyzer is built, before any of its threads start
+ASGI_PROCESS_WORKERS = int(os.environ.get('ANALYZER_ASGI_WORKERS', str(os.cpu_count() or 1)))
+os.environ.setdefault('ANALYZER_PROCESS_WORKERS', str(ASGI_PROCESS_WORKERS))
+os.environ.setdefault('ANALYZER_BATCH_WORKERS', str(ASGI_PROCESS_WORKERS))
+
+import enhanced_app
+from enhanced_app import (
+    ADMISSION_PATHS, LANGUAGE_SAMPLE_CHARS, STREAM_CHUNK_CHARS, UPLOAD_FOLDER, admission, admission_rejection, allowed_file,
+    build_prediction_response, estimate_processing_time, extract_code_from_file, get_health_status, get_model_info,
+    get_readiness, render_metrics, should_stream_file
+)
+
+# Same analyzer (models, caches, hot reload, process pool) as the Flask app
+analyzer = enhanced_app.analyzer
+
+# Same request size limit as the Flask app
+MAX_CONTENT_LENGTH = enhanced_app.app.config['MAX_CONTENT_LENGTH']
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    yield
+    if analyzer.batcher is not None:
+        analyzer.batcher.close()
+    analyzer.stop_watching_models()
+    analyzer.shutdown_process_pool()
+
+
+app = FastAPI(title='Enhanced AI Code Detection', lifespan=lifespan)
+
+
+def error_response(message, status_code):
+    return JSONResponse({'error': message}, status_code=status_code)
+
+
+def too_large_response():
+    return error_response('Request too large (max 50MB).', 413)
+
+
+class RequestTooLarge(Exception):
+    """The request body grew past MAX_CONTENT_LENGTH while it was being read"""
+
+
+class BodySizeLimit:
+    """Enforce the body size limit on the bytes actually received.
+
+    content_too_large only sees a declared Content-Length; a chunked body
+    has none, so reads past max_bytes raise RequestTooLarge instead of
+    buffering the rest. Routes answer it with 413, and so does this
+    middleware if it escapes one before a response has started.
+    """
+
+    def __init__(self, app, max_bytes: int):
+        self.app = app
+        self.max_bytes = max_bytes
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] != 'http':
+            await self.app(scope, receive, send)
+            return
+        received = 0
+        response_started = False
+
+        async def limited_receive():
+            nonlocal received
+            if received > self.max_bytes:
+                # The rest of the body is never read; like a finished body, nothing more arrives
+                await asyncio.Event().wait()
+            message = await receive()
+            if message['type'] == 'http.request':
+                received += len(message.get('body', b''))
+                if received > self.max_bytes:
+                    raise RequestTooLarge(f'Request body exceeds {self.max_bytes} bytes')
+            return message
+
+        async def tracked_send(message):
+            nonlocal response_started
+            response_started = response_started or message['type'] == 'http.response.start'
+            await send(message)
+
+        try:
+            await self.app(scope, limited_receive, tracked_send)
+        except RequestTooLarge:
+            if response_started:
+                raise
+            await too_large_response()(scope, receive, send)
+
+
+@app.middleware('http')
+async def admit_request(request: Request, call_next):
+    """Turn analysis requests away before their body is read when the server is at capacity"""
+    if admission is None or request.method != 'POST' or request.url.path not in ADMISSION_PATHS:
+        return await call_next(request)
+    content_length = request.headers.get('content-length')
+    # A small request may wait briefly for budget, which must not block the event loop
+    ticket = await run_in_threadpool(admission.admit, int(content_length) if content_length and content_length.isdigit() else None)
+    if not ticket.admitted:
+        return rejection_response(ticket)
+    request.state.admission = ticket
+    started = time.perf_counter()
+    try:
+        return await call_next(request)
+    finally:
+        admission.release(request.state.admission, time.perf_counter() - started)
+
+
+# Outermost, so the limit covers every body read, admission's included
+app.add_middleware(BodySizeLimit, max_bytes=MAX_CONTENT_LENGTH)
+
+
+def rejection_response(ticket):
+    body, status, headers = admission_rejection(ticket)
+    return JSONResponse(body, status_code=status, headers=headers)
+
+
+async def resize_admission(request: Request, size):
+    """Admit the request again at the size of its extracted text; a rejection response when it no longer fits"""
+    ticket = getattr(request.state, 'admission', None)
+    if ticket is None:
+        return None
+    ticket = await run_in_threadpool(admission.resize, ticket, size)
+    request.state.admission = ticket
+    return None if ticket.admitted else rejection_response(ticket)
+
+
+async def run_in_process(function, *args):
+    """Run CPU-bound work on the analyzer's process pool, or a worker thread without one"""
+    pool = analyzer.process_pool
+    if pool is not None:
+        try:
+            return await asyncio.get_running_loop().run_in_executor(pool, function, *args)
+        except BrokenProcessPool as e:
+            print(f"Warning: process pool failed ({e}), running in a thread")
+    return await run_in_threadpool(function, *args)
+
+
+async def detect_language(code, filename=None):
+    """Detect the language off the event loop and record how long detection took"""
+    detected_language, elapsed = await run_in_process(detect_language_with_time, code, filename)
+    REGISTRY.observe_timings({'language_detection': elapsed})
+    return detected_language, elapsed
+
+
+def content_too_large(request: Request):
+    content_length = request.headers.get('content-length')
+    return content_length is not None and content_length.isdigit() and int(content_length) > MAX_CONTENT_LENGTH
+
+
+def save_upload(upload, filename):
+    """Copy a parsed upload to its own file in the upload folder and return the path"""
+    descriptor, file_path = tempfile.mkstemp(suffix='.' + filename.rsplit('.', 1)[1].lower(), dir=UPLOAD_FOLDER)
+    with os.fdopen(descriptor, 'wb') as f:
+        upload.file.seek(0)
+        while True:
+            block = upload.file.read(1024 * 1024)
+            if not block:
+                break
+            f.write(block)
+    return file_path
+
+
+def remove_upload(file_path):
+    try:
+        os.remove(file_path)
+    except Exception as e:
+        print(f"Error cleaning up uploaded file: {e}")
+
+
+async def read_upload(form):
+    """(file path, filename, error response) for the 'file' field of a multipart form"""
+    upload = form.get('file')
+    if upload is None or isinstance(upload, str):
+        return None, None, error_response('No file part', 400)
+    if not upload.filename:
+        return None, None, error_response('No file selected', 400)
+    if not allowed_file(upload.filename):
+        return None, None, error_response('File type not allowed', 400)
+    filename = secure_filename(upload.filename) or 'uploaded_file'
+    if '.' not in filename:
+        return None, None, error_response('File type not allowed', 400)
+    file_path = await run_in_threadpool(save_upload, upload, filename)
+    return file_path, filename, None
+
+
+async def predict(code, mode):
+    """Await the micro-batcher directly, so queued requests hold no thread"""
+    if analyzer.batcher is not None and analyzer.batcher.accepts(code):
+        return await asyncio.wrap_future(analyzer.batcher.submit(code, mode))
+    return await run_in_threadpool(analyzer.predict, code, mode)
+
+
+async def analyze_prediction(code, filename=None, mode='full', file_info=None):
+    """Prediction and language detection run concurrently, both off the event loop"""
+    start_time = time.time()
+    estimated_time = estimate_processing_time(len(code))
+    prediction_result, (detected_language, language_time) = await asyncio.gather(
+        predict(code, mode),
+        detect_language(code, filename)
+    )
+    total_time = time.time() - start_time
+    response = build_prediction_response(prediction_result, detected_language, total_time, estimated_time, language_time)
+    if file_info:
+        response['file_info'] = file_info
+    return JSONResponse(response)
+
+
+async def analyze_file_streaming(file_path, filename):
+    """Analyze a large text file chunk by chunk on the process pool"""
+    start_time = time.time()
+    estimated_time = estimate_processing_time(os.path.getsize(file_path))
+
+    def read_sample():
+        # Pygments only needs the head of the file
+        with open(file_path, 'r', encoding='utf-8', errors='ignore') as f:
+            return f.read(LANGUAGE_SAMPLE_CHARS)
+
+    sample = await run_in_threadpool(read_sample)
+    prediction_result, (detected_language, language_time) = await asyncio.gather(
+        run_in_threadpool(analyzer.predict_file, file_path, STREAM_CHUNK_CHARS),
+        detect_language(sample, filename)
+    )
+    total_time = time.time() - start_time
+    response = build_prediction_response(prediction_result, detected_language, total_time, estimated_time, language_time)
+    response['file_info'] = {
+        'filename': filename,
+        'size': prediction_result['characters'],
+        'type': filename.rsplit('.', 1)[1].lower(),
+        'streamed': True
+    }
+    return JSONResponse(response)
+
+
+@app.get('/health')
+async def health():
+    return get_health_status()
+
+
+@app.get('/health/live')
+async def health_live():
+    """Liveness: the event loop is up and serving requests"""
+    return {"status": "ok"}
+
+
+@app.get('/health/ready')
+async def health_ready():
+    """Readiness: models are loaded, so predictions use the neural tier when one exists"""
+    status = get_readiness()
+    return JSONResponse(status, status_code=200 if status['status'] == 'ready' else 503)
+
+
+@app.post('/analyze')
+async def analyze(request: Request):
+    """Analyze a JSON {"code": ...} body or a multipart file upload"""
+    if content_too_large(request):
+        return too_large_response()
+    try:
+        file_info = None
+        filename = None
+        if request.headers.get('content-type', '').startswith('multipart/form-data'):
+            # The form's spooled temporary files are released once the upload is copied out
+            async with request.form() as form:
+                file_path, filename, error = await read_upload(form)
+                mode = request.query_params.get('mode') or form.get('mode') or 'full'
+            if error:
+                return error
+            try:
+                code, error = await run_in_threadpool(extract_code_from_file, file_path)
+                if error:
+                    return error_response(error, 400)
+                rejection = await resize_admission(request, len(code or ''))
+                if rejection:
+                    return rejection
+                file_info = {
+                    'filename': filename,
+                    'size': os.path.getsize(file_path),
+                    'type': filename.rsplit('.', 1)[1].lower()
+                }
+            finally:
+                remove_upload(file_path)
+        else:
+            try:
+                data = await request.json()
+            except ValueError:
+                return error_response('Request body must be JSON.', 400)
+            if not isinstance(data, dict):
+                return error_response('Request body must be a JSON object.', 400)
+            code = data.get('code', '')
+            mode = request.query_params.get('mode') or data.get('mode') or 'full'
+
+        if not isinstance(code, str) or not code.strip():
+            return error_response('Please provide some code to analyze or upload a file.', 400)
+        if mode not in PREDICTION_MODES:
+            return error_response(f'Unknown mode (use one of: {", ".join(PREDICTION_MODES)}).', 400)
+        return await analyze_prediction(code, filename, mode, file_info)
+
+    except RequestTooLarge:
+        return too_large_response()
+    except Exception as e:
+        print(f"Internal error in /analyze: {e}")
+        traceback.print_exc()
+        return error_response(f'Internal error: {str(e)}', 500)
+
+
+@app.post('/upload')
+async def upload(request: Request):
+    """Dedicated file upload endpoint; the body is parsed without holding a worker"""
+    if content_too_large(request):
+        return too_large_response()
+    try:
+        async with request.form() as form:
+            file_path, filename, error = await read_upload(form)
+        if error:
+            return error
+        try:
+            if should_stream_file(file_path):
+                return await analyze_file_streaming(file_path, filename)
+            extracted_code, error = await run_in_threadpool(extract_code_from_file, file_path)
+            if error:
+                return error_response(error, 400)
+        finally:
+            remove_upload(file_path)
+
+        if not extracted_code or not extracted_code.strip():
+            return error_response('Please provide some code to analyze or upload a file.', 400)
+        rejection = await resize_admission(request, len(extracted_code))
+        if rejection:
+            return rejection
+        file_info = {'filename': filename, 'size': len(extracted_code), 'type': filename.rsplit('.', 1)[1].lower()}
+        return await analyze_prediction(extracted_code, filename, 'full', file_info)
+
+    except RequestTooLarge:
+        return too_large_response()
+    except Exception as e:
+        print(f"Upload error: {e}")
+        traceback.print_exc()
+        return error_response(f'Upload error: {str(e)}', 500)
+
+
+@app.get('/model_info')
+async def model_info():
+    """Get information about the loaded models"""
+    return get_model_info()
+
+
+@app.get('/metrics')
+async def metrics():
+    """Prometheus metrics: per-stage timing histograms and cache counters"""
+    return PlainTextResponse(render_metrics(), media_type='text/plain; version=0.0.4')
+
+
+if __name__ == '__main__':
+    import uvicorn
+
+    print("Starting Enhanced AI Code Detection App (ASGI)...")
+    print(f"- Analysis Workers: {analyzer.process_workers or 'in-process'}")
+    uvicorn.run(app, host='0.0.0.0', port=5005)
@@ -0,0 +1,112 @@
+import time
+import queue
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Callable, Dict, List
+from metrics import REGISTRY
+
+# Histogram buckets for the number of requests coalesced into one batch
+BATCH_SIZE_BUCKETS = (1, 2, 4, 8, 16, 32, 64, 128, 256)
+
+
+class MicroBatcher:
+    """Coalesces concurrent single-snippet predictions into batched calls.
+
+    A collector thread takes the first waiting request, keeps collecting
+    until window seconds after that request arrived, max_items are in
+    hand or the next request would take the batch past max_chars, and
+    hands the group to predict_batch (one extraction pass on the worker
+    pool and one model call per mode). Results are fanned back out
+    through futures. At most concurrency batches run at once; while they
+    are busy, new requests queue up and join the next batch.
+
+    Extraction time grows with the characters in a batch, so max_chars
+    bounds how long a queued request can wait behind a running batch.
+    Snippets longer than that are not accepted and should be predicted
+    directly (see accepts()).
+    """
+
+    def __init__(self, predict_batch: Callable[[List[str], str], List[Dict]], window: float = 0.002,
+                 max_items: int = 64, max_chars: int = 64 * 1024, concurrency: int = 2):
+        self.predict_batch = predict_batch
+        self.window = window
+        self.max_items = max_items
+        self.max_chars = max_chars
+        self._queue = queue.SimpleQueue()
+        self._slots = threading.Semaphore(concurrency)
+        self._executor = ThreadPoolExecutor(max_workers=concurrency, thread_name_prefix='micro-batch')
+        self._collector = threading.Thread(target=self._collect, name='micro-batch-collector', daemon=True)
+        self._collector.start()
+
+    def accepts(self, code: str) -> bool:
+        """Whether a snippet is small enough to share a batch"""
+        return len(code) <= self.max_chars
+
+    def submit(self, code: str, mode: str = 'full') -> Future:
+        """Queue one snippet; the future resolves to its prediction"""
+        future = Future()
+        self._queue.put((code, mode, future, time.perf_counter()))
+        return future
+
+    def predict(self, code: str, mode: str = 'full') -> Dict:
+        return self.submit(code, mode).result()
+
+    def close(self):
+        """Stop collecting once the queued requests are dispatched"""
+        self._queue.put(None)
+        self._collector.join()
+        self._executor.shutdown(wait=True)
+
+    def _collect(self):
+        stopping = False
+        carried = None
+        while not stopping:
+            self._slots.acquire()
+            # A request that did not fit in the last batch starts the next one
+            first = carried if carried is not None else self._queue.get()
+            carried = None
+            if first is None:
+                self._slots.release()
+                break
+            batch = [first]
+            chars = len(first[0])
+            deadline = first[3] + self.window
+            while len(batch) < self.max_items:
+                remaining = deadline - time.perf_counter()
+                try:
+                    # Past the window, only take what is already waiting
+                    item = self._queue.get(timeout=remaining) if remaining > 0 else self._queue.get_nowait()
+                except queue.Empty:
+                    break
+                if item is None:
+                    stopping = True
+                    break
+                if chars + len(item[0]) > self.max_chars:
+                    carried = item
+                    break
+                batch.append(item)
+                chars += len(item[0])
+            self._executor.submit(self._run, batch)
+
+    def _run(self, batch):
+        try:
+            dispatched = time.perf_counter()
+            groups = {}
+            for code, mode, future, enqueued in batch:
+                REGISTRY.observe('analyzer_batch_queue_wait_seconds', dispatched - enqueued,
+                                 'Time a request waited to join a micro-batch', mode=mode)
+                groups.setdefault(mode, []).append((code, future))
+
+            for mode, items in groups.items():
+                REGISTRY.observe('analyzer_batch_size', len(items), 'Requests coalesced into one micro-batch',
+                                 buckets=BATCH_SIZE_BUCKETS, mode=mode)
+                try:
+                    predictions = self.predict_batch([code for code, _ in items], mode)
+                except Exception as e:
+                    for _, future in items:
+                        future.set_exception(e)
+                    continue
+                for (_, future), prediction in zip(items, predictions):
+                    future.set_result(prediction)
+        finally:
+            self._slots.release()
@@ -2,29 +2,143 @@ import re
 import ast
 import numpy as np
 import time
-from collections import Counter
-import math
+import copy
 from pygments.lexers import guess_lexer
 from pygments.util import ClassNotFound
-from typing import Dict, List, Tuple, Optional
+from typing import Dict, Iterable, List, Tuple, Optional
 import os
-from concurrent.futures import ThreadPoolExecutor
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+import multiprocessing
 import threading
-from functools import lru_cache
-import joblib
-from sklearn.preprocessing import StandardScaler
+import pickle
+import hashlib
 import warnings
+from feature_engine import (
+    FusedFeatureExtractor, ParsedDocument, FEATURE_COUNT, FEATURE_VERSION, FEATURE_NAMES, resolve_features, classify_indentation, naming_conventions
+)
+from feature_stream import StreamingFeatureExtractor
+from feature_cache import FeatureCache, DiskFeatureCache, content_hash
+from metrics import REGISTRY, StageClock
+from mlp_engine import CALIBRATION_PATH, MLPSummary, build_engine, build_quantized_engine, load_calibration, probe_inputs
+from fast_model import DistilledModel, FAST_MODEL_PATH, CASCADE_MODEL_PATH
+from model_bundle import BUNDLE_DIR, load_bundle, load_pickles
+from shadow_model import ShadowModel, ShadowScorer, load_shadow_model
+from batch_scheduler import MicroBatcher
 warnings.filterwarnings('ignore')
 
+# Per-process analyzer used by process-pool workers
+_worker_analyzer = None
+
+# 'full' runs the neural (or rule-based) model, 'fast' the distilled student and
+# 'cascade' a cheap first stage that defers uncertain snippets to the full path
+PREDICTION_MODES = ('full', 'fast', 'cascade')
+
+# Shape of a prediction's 'comprehensive_analysis', reported as 'analysis_level':
+# 'comprehensive' has basic_metrics, complexity, style and quality; 'basic' has
+# basic_metrics only and is what cascade stage-one predictions carry, since
+# the full analysis costs more than the stage they skip
+ANALYSIS_LEVELS = ('comprehensive', 'basic')
+
+def _init_process_worker():
+    """Compile the pattern tables once when a worker process starts"""
+    global _worker_analyzer
+    _worker_analyzer = EnhancedCodeAnalyzer(load_models=False)
+
+def _extract_in_worker(code: str) -> Tuple[np.ndarray, Dict, Dict[str, float]]:
+    """Extract features in a worker process and return a compact vector"""
+    features, analysis, timings = _worker_analyzer._extract_and_analyze(code)
+    return np.asarray(features, dtype=np.float64), analysis, timings
+
+def _iter_file_chunks(path: str, chunk_chars: int, counter: Dict[str, int]) -> Iterable[str]:
+    """Yield a text file in fixed-size chunks, counting characters"""
+    with open(path, 'r', encoding='utf-8', errors='ignore') as f:
+        while True:
+            chunk = f.read(chunk_chars)
+            if not chunk:
+                break
+            counter['size'] += len(chunk)
+            yield chunk
+
+def _stream_file_in_worker(path: str, chunk_chars: int) -> Tuple[np.ndarray, Dict, Dict[str, float], int]:
+    """Stream a text file through the extractor in a worker process"""
+    timings = {}
+    counter = {'size': 0}
+    features, analysis = _worker_analyzer.stream_extractor.extract(_iter_file_chunks(path, chunk_chars, counter), timings)
+    return np.asarray(features, dtype=np.float64), analysis, timings, counter['size']
+
+class ModelState:
+    """Everything one model load produces, published to requests as a unit.
+
+    Requests take one reference and use it to the end, so a reload that
+    swaps in a new state never changes the models under a running request.
+    """
+
+    def __init__(self, neural_model=None, scaler=None, label_encoder=None, inference_engine=None,
+                 quantized_engine=None, quantization_report: Optional[Dict] = None,
+                 fast_model: Optional[DistilledModel] = None, cascade_model: Optional[DistilledModel] = None,
+                 version: str = 'rule_based', model_format: Optional[str] = None, manifest: Optional[Dict] = None,
+                 load_seconds: Optional[float] = None, shadow_model: Optional[ShadowModel] = None):
+        self.neural_model = neural_model
+        self.scaler = scaler
+        self.label_encoder = label_encoder
+        self.inference_engine = inference_engine
+        self.quantized_engine = quantized_engine
+        self.quantization_report = quantization_report
+        self.fast_model = fast_model
+        self.cascade_model = cascade_model
+        self.version = version
+        self.model_format = model_format
+        self.manifest = manifest
+        self.load_seconds = load_seconds
+        self.shadow_model = shadow_model
+        self.loaded_at = time.time()
+
+    @property
+    def namespace(self) -> str:
+        """Cache namespace: feature schema plus model version"""
+        return f"{FEATURE_VERSION}:{self.version}"
+
 class EnhancedCodeAnalyzer:
-    def __init__(self):
-        self.feature_cache = {}
-        self.cache_lock = threading.Lock()
-        
-        # Initialize models
-        self.neural_model = None
-        self.scaler = None
-        self.label_encoder = None
+    def __init__(self, process_workers: int = 0, load_models: bool = True, cache_max_bytes: int = 64 * 1024 * 1024,
+                 disk_cache_path: Optional[str] = None, cascade_band: Tuple[float, float] = (0.2, 0.8),
+                 quantize: bool = False, background_load: bool = False, model_wait: float = 0.0,
+                 shadow_dir: Optional[str] = None, shadow_interval: float = 0.5,
+                 batch_window: float = 0.0, batch_max_items: int = 64, batch_max_chars: int = 64 * 1024,
+                 pool_min_batch: int = 1):
+        # Features and predictions keyed by content hash, bounded by size
+        self.feature_cache = FeatureCache(max_bytes=cache_max_bytes)
+        
+        # Optional persistent cache shared by all workers and restarts
+        self.disk_cache = DiskFeatureCache(disk_cache_path) if disk_cache_path else None
+        
+        # Loaded models, replaced as a whole on every (re)load
+        self.models = ModelState()
+        self._reload_lock = threading.Lock()
+        self._watch_stop = None
+        
+        # Optional int8 engine, kept only if it passes calibration
+        self.quantize = quantize
+        
+        # Stage-one AI probabilities inside this band go on to full extraction
+        self.cascade_band = cascade_band
+        
+        # Optional process pool for GIL-bound feature extraction. Workers are
+        # forked, so the pool starts before this analyzer starts any thread.
+        # Batches of fewer than pool_min_batch snippets skip the round trip
+        self.process_pool = None
+        self.process_workers = 0
+        self.pool_min_batch = pool_min_batch
+        if process_workers:
+            self.start_process_pool(process_workers)
+        
+        # Optional candidate model, scored off the request path on rows the live model scored
+        self.shadow_dir = shadow_dir
+        self.shadow_scorer = ShadowScorer(interval=shadow_interval) if shadow_dir else None
+        
+        # Concurrent predict() calls arriving within batch_window seconds share one batch
+        # of at most batch_max_chars characters; longer snippets are predicted on their own
+        self.batcher = MicroBatcher(self.predict_batch, batch_window, batch_max_items, batch_max_chars) if batch_window > 0 else None
         
         # Performance optimizations
         self.compiled_patterns = {
@@ -61,313 +175,315 @@ class EnhancedCodeAnalyzer:
             'private_methods': re.compile(r'_\w+'),
             'constants': re.compile(r'^[A-Z_][A-Z0-9_]*\s*=', re.MULTILINE)
         }
-        
-        # Load models in background
-        self._load_models()
+        self.feature_extractor = FusedFeatureExtractor(self.compiled_patterns)
+        self.stream_extractor = StreamingFeatureExtractor(self.compiled_patterns)
+        
+        # Load models, on a background thread when asked. Until they are ready,
+        # predictions wait up to model_wait seconds and then use the rule-based tier
+        self.models_ready = threading.Event()
+        self.model_wait = model_wait
+        if load_models and background_load:
+            threading.Thread(target=self._load_models, name='model-loader', daemon=True).start()
+        elif load_models:
+            self._load_models()
+        else:
+            self.models_ready.set()
         print("Enhanced Code Analyzer initialized (Comprehensive Analysis)")
 
+    def start_process_pool(self, workers: int):
+        """Run feature extraction on a pool of worker processes"""
+        # Never nest pools inside a worker (spawned children re-import __main__)
+        if multiprocessing.parent_process() is not None or self.process_pool is not None:
+            return
+        if threading.active_count() > 1:
+            print("Warning: starting the process pool after other threads; workers are forked with them running")
+        self.process_pool = ProcessPoolExecutor(max_workers=workers, initializer=_init_process_worker)
+        self.process_workers = workers
+        
+        # Start the workers now, before any request threads exist
+        list(self.process_pool.map(_extract_in_worker, [''] * workers))
+        print(f"Started feature extraction process pool ({workers} workers)")
+
+    def shutdown_process_pool(self):
+        """Stop the worker processes and go back to in-process extraction"""
+        if self.process_pool is not None:
+            self.process_pool.shutdown(wait=True)
+            self.process_pool = None
+            self.process_workers = 0
+
     def _load_models(self):
-        """Load neural models if available"""
+        """Load neural models if available and publish them once they validate"""
         try:
-            # Try to load improved models first
-            if os.path.exists('models/improved_neural_model.pkl'):
-                self.neural_model = joblib.load('models/improved_neural_model.pkl')
-                print("Loaded improved neural model")
-            elif os.path.exists('models/simple_neural_model.pkl'):
-                self.neural_model = joblib.load('models/simple_neural_model.pkl')
-                print("Loaded simple neural model")
-                
-            if os.path.exists('models/improved_scaler.pkl'):
-                self.scaler = joblib.load('models/improved_scaler.pkl')
-                print("Loaded improved scaler")
-            elif os.path.exists('models/simple_neural_scaler.pkl'):
-                self.scaler = joblib.load('models/simple_neural_scaler.pkl')
-                print("Loaded simple neural scaler")
-                
-            if os.path.exists('models/improved_label_encoder.pkl'):
-                self.label_encoder = joblib.load('models/improved_label_encoder.pkl')
-                print("Loaded improved label encoder")
-            elif os.path.exists('models/simple_neural_label_encoder.pkl'):
-                self.label_encoder = joblib.load('models/simple_neural_label_encoder.pkl')
-                print("Loaded simple neural label encoder")
-            
-            print("Enhanced models loaded successfully")
-        except Exception as e:
-            print(f"Warning: Could not load neural models: {e}")
-            print("Falling back to traditional features only")
+            with self._reload_lock:
+                state = self._build_models()
+                try:
+                    self._validate_models(state)
+                except Exception as e:
+                    print(f"Warning: neural models rejected ({e}), using rule-based predictions")
+                    state = ModelState(fast_model=state.fast_model, cascade_model=state.cascade_model,
+                                       load_seconds=state.load_seconds, shadow_model=state.shadow_model)
+                self._publish(state)
+        finally:
+            # Waiting requests go on with whatever is published, even if loading failed
+            self.models_ready.set()
 
-    @lru_cache(maxsize=2000)
-    def extract_features_fast(self, code: str) -> List[float]:
-        start_time = time.time()
-        
-        # Basic features (optimized)
-        basic_features = self._extract_basic_features(code)
-        
-        # Advanced features (optimized)
-        advanced_features = self._extract_advanced_features_cached(code)
-        
-        # Style features (optimized)
-        style_features = self._extract_style_features(code)
-        
-        # Enhanced features (optimized)
-        enhanced_features = self._extract_enhanced_features(code)
-        
-        # Comprehensive analysis features
-        comprehensive_features = self._extract_comprehensive_features(code)
-        
-        # Combine all features
-        features = basic_features + advanced_features + style_features + enhanced_features + comprehensive_features
-        
-        # Always return exactly 80 features
-        if len(features) < 80:
-            features += [0.0] * (80 - len(features))
-        elif len(features) > 80:
-            features = features[:80]
-        
-        elapsed = time.time() - start_time
-        print(f"Enhanced feature extraction completed in {elapsed:.3f}s (features: {len(features)})")
-        return features
+    def reload_models(self) -> Dict:
+        """Load the models on disk again and swap them in once they validate.
 
-    def _extract_basic_features(self, code: str) -> List[float]:
-        """Extract basic code statistics (optimized)"""
-        features = []
-        
-        # Length features
-        features.append(len(code))
-        features.append(code.count('\n'))
-        features.append(len(code.split()))
-        
-        # Character distribution (optimized)
-        alpha_count = sum(1 for c in code if c.isalpha())
-        digit_count = sum(1 for c in code if c.isdigit())
-        space_count = sum(1 for c in code if c.isspace())
-        bracket_count = sum(1 for c in code if c in '{}[]()')
-        punct_count = sum(1 for c in code if c in ';:,.')
-        
-        features.extend([alpha_count, digit_count, space_count, bracket_count, punct_count])
-        
-        # Line statistics (optimized)
-        lines = code.split('\n')
-        line_count = len(lines)
-        if line_count > 0:
-            line_lengths = [len(line) for line in lines]
-            features.extend([line_count, np.mean(line_lengths), np.std(line_lengths)])
-        else:
-            features.extend([0, 0, 0])
-        
-        return features
+        Runs on the caller's thread, off the request path. Requests keep
+        scoring with the current models until the swap, and a set that fails
+        to load or validate is rejected while the current one stays in place.
+        """
+        with self._reload_lock:
+            previous = self.models
+            try:
+                state = self._build_models(strict=True)
+                if previous.neural_model is not None and state.neural_model is None:
+                    raise ValueError("no neural model found")
+                self._validate_models(state)
+            except Exception as e:
+                print(f"Warning: model reload rejected: {e}")
+                return {'reloaded': False, 'model_version': previous.version, 'error': str(e)}
+            self._publish(state)
+        print(f"Models reloaded: {previous.version} -> {state.version}")
+        return {'reloaded': True, 'model_version': state.version, 'previous_version': previous.version}
 
-    def _extract_advanced_features_cached(self, code: str) -> List[float]:
-        """Extract advanced code features with caching (optimized)"""
-        features = []
+    def _publish(self, state: ModelState):
+        """Swap in a new model state and drop predictions made by the old one"""
+        self.models = state
         
-        # Comment analysis (optimized)
-        lines = code.split('\n')
-        comment_lines = sum(1 for line in lines if line.strip().startswith(('#', '//', '/*', '*')))
-        features.append(comment_lines)
-        features.append(comment_lines / max(len(lines), 1))
-        
-        # Function and class analysis (optimized)
-        try:
-            tree = ast.parse(code)
-            functions = len([node for node in ast.walk(tree) if isinstance(node, ast.FunctionDef)])
-            classes = len([node for node in ast.walk(tree) if isinstance(node, ast.ClassDef)])
-            imports = len([node for node in ast.walk(tree) if isinstance(node, ast.Import)])
-            imports_from = len([node for node in ast.walk(tree) if isinstance(node, ast.ImportFrom)])
-            calls = len([node for node in ast.walk(tree) if isinstance(node, ast.Call)])
-            assignments = len([node for node in ast.walk(tree) if isinstance(node, ast.Assign)])
-            loops = len([node for node in ast.walk(tree) if isinstance(node, (ast.For, ast.While))])
-            conditionals = len([node for node in ast.walk(tree) if isinstance(node, ast.If)])
-        except:
-            functions = classes = imports = imports_from = calls = assignments = loops = conditionals = 0
-        
-        features.extend([functions, classes, imports, imports_from, calls, assignments, loops, conditionals])
-        
-        # Complexity metrics (optimized)
-        features.append(code.count('if') + code.count('elif') + code.count('else'))
-        features.append(code.count('for') + code.count('while'))
-        features.append(code.count('try') + code.count('except') + code.count('finally'))
-        
-        return features
+        # Features do not depend on the model and stay cached; every other
+        # entry is a prediction keyed by the namespace of the models that made it
+        self.feature_cache.discard(lambda key: key[0] != 'features')
 
-    def _extract_style_features(self, code: str) -> List[float]:
-        """Extract code style and formatting features (optimized)"""
-        features = []
-        
-        # Indentation analysis (optimized)
-        lines = code.split('\n')
-        indent_levels = []
-        for line in lines:
-            if line.strip():
-                indent = len(line) - len(line.lstrip())
-                indent_levels.append(indent)
+    def _validate_models(self, state: ModelState):
+        """Score probe rows through the new models; raises if they cannot serve"""
+        if state.neural_model is None or state.scaler is None:
+            return
+        for name, artifact in (('scaler', state.scaler), ('neural model', state.neural_model)):
+            n_features = getattr(artifact, 'n_features_in_', None)
+            if n_features is not None and n_features != FEATURE_COUNT:
+                raise ValueError(f"{name} expects {n_features} features but extraction produces {FEATURE_COUNT}")
+        probe = probe_inputs(FEATURE_COUNT, state.scaler, rows=8)
+        engine = state.quantized_engine or state.inference_engine
+        probabilities = engine.predict_proba(probe) if engine is not None else state.neural_model.predict_proba(state.scaler.transform(probe))
+        if probabilities.shape[0] != len(probe) or not np.all(np.isfinite(probabilities)):
+            raise ValueError("model returned invalid probabilities on probe rows")
+
+    def watch_models(self, interval: float = 5.0, directory: str = 'models'):
+        """Reload whenever the files in the model directory change.
+
+        A change is acted on once two polls in a row see the same files, so a
+        model that is still being copied in is not read half-written.
+        """
+        if self._watch_stop is not None:
+            return
+        self._watch_stop = threading.Event()
+        stop = self._watch_stop
+        
+        def signature():
+            paths = []
+            for root, _, names in os.walk(directory):
+                paths.extend(os.path.join(root, name) for name in names)
+            entries = []
+            for path in sorted(paths):
+                try:
+                    info = os.stat(path)
+                except OSError:
+                    continue
+                entries.append((path, info.st_mtime_ns, info.st_size))
+            return tuple(entries)
+        
+        def poll():
+            current, pending = signature(), None
+            while not stop.wait(interval):
+                latest = signature()
+                if latest == current:
+                    pending = None
+                elif latest == pending:
+                    current, pending = latest, None
+                    self.reload_models()
+                else:
+                    pending = latest
+        
+        threading.Thread(target=poll, name='model-watcher', daemon=True).start()
+        print(f"Watching {directory} for model changes every {interval}s")
+
+    def stop_watching_models(self):
+        if self._watch_stop is not None:
+            self._watch_stop.set()
+            self._watch_stop = None
+
+    def _build_models(self, strict: bool = False) -> ModelState:
+        """Load every model artifact into a new state without publishing it"""
+        start_time = time.time()
+        neural_model = scaler = label_encoder = bundle = None
+        model_format = None
         
-        if indent_levels:
-            features.extend([np.mean(indent_levels), np.std(indent_levels), max(indent_levels)])
+        # Prefer the memory-mapped bundle: no unpickling, and pages shared across workers
+        try:
+            bundle = load_bundle(BUNDLE_DIR)
+        except Exception as e:
+            if strict:
+                raise
+            print(f"Warning: Could not load model bundle: {e}")
+        if bundle is not None:
+            neural_model, scaler, label_encoder = bundle.neural_model, bundle.scaler, bundle.label_encoder
+            model_format = 'bundle'
+            print(f"Loaded model bundle {bundle.checksum[:16]}")
         else:
-            features.extend([0, 0, 0])
-        
-        # Naming conventions (optimized)
-        words = self.compiled_patterns['words'].findall(code)
-        camel_case = sum(1 for word in words if re.match(r'^[a-z]+[A-Z]', word))
-        snake_case = sum(1 for word in words if '_' in word)
-        pascal_case = sum(1 for word in words if re.match(r'^[A-Z][a-zA-Z0-9]*$', word))
-        
-        features.extend([camel_case, snake_case, pascal_case])
+            try:
+                neural_model, scaler, label_encoder = load_pickles('models')
+                if neural_model is not None:
+                    model_format = 'pickle'
+                print("Enhanced models loaded successfully")
+            except Exception as e:
+                if strict:
+                    raise
+                print(f"Warning: Could not load neural models: {e}")
+                print("Falling back to traditional features only")
+        
+        quantized_engine, quantization_report = None, None
+        if self.quantize:
+            quantized_engine, quantization_report = build_quantized_engine(neural_model, scaler, load_calibration(CALIBRATION_PATH))
+        
+        # Plain NumPy forward pass with the scaler folded in, verified against sklearn;
+        # not needed when the int8 engine scores instead
+        inference_engine = build_engine(neural_model, scaler) if quantized_engine is None else None
+        fast_model = self._load_distilled_model(FAST_MODEL_PATH, 'fast')
+        cascade_model = self._load_distilled_model(CASCADE_MODEL_PATH, 'cascade')
+        shadow_model = self._load_shadow_model()
+        if bundle is not None:
+            model_version = bundle.checksum[:16] + ('-int8' if quantized_engine is not None else '')
+        else:
+            model_version = self._compute_model_version(neural_model, scaler, label_encoder, quantized_engine is not None)
         
-        # Code structure (optimized)
-        features.append(code.count('def '))
-        features.append(code.count('class '))
-        features.append(code.count('import '))
-        features.append(code.count('from '))
+        # The int8 engine replaces the float weights, so only their labels and shape stay loaded
+        if quantized_engine is not None:
+            neural_model = MLPSummary(neural_model)
+            quantization_report['float_weights_resident'] = False
         
-        return features
+        return ModelState(neural_model, scaler, label_encoder, inference_engine, quantized_engine, quantization_report,
+                          fast_model, cascade_model, model_version, model_format,
+                          bundle.manifest if bundle is not None else None, time.time() - start_time, shadow_model)
 
-    def _extract_enhanced_features(self, code: str) -> List[float]:
-        """Extract enhanced features that simulate neural-like patterns (optimized)"""
-        features = []
-        
-        # Code complexity metrics (optimized with compiled patterns)
-        features.append(len(self.compiled_patterns['function_calls'].findall(code)))
-        features.append(len(self.compiled_patterns['method_calls'].findall(code)))
-        features.append(len(self.compiled_patterns['camel_case'].findall(code)))
-        features.append(len(self.compiled_patterns['snake_case'].findall(code)))
-        
-        # Code patterns (optimized)
-        patterns = ['return', 'print', 'assert', 'raise', 'with', 'async', 'await']
-        for pattern in patterns:
-            features.append(code.count(pattern))
-        
-        # Variable patterns (optimized)
-        features.append(len(self.compiled_patterns['variables'].findall(code)))
-        features.append(len(self.compiled_patterns['add_assign'].findall(code)))
-        features.append(len(self.compiled_patterns['sub_assign'].findall(code)))
-        
-        # String patterns (optimized)
-        features.append(code.count('"'))
-        features.append(code.count("'"))
-        features.append(code.count('f"'))
-        features.append(code.count("f'"))
-        
-        # Number patterns (optimized)
-        features.append(len(self.compiled_patterns['floats'].findall(code)))
-        features.append(len(self.compiled_patterns['integers'].findall(code)))
-        
-        # Control flow patterns (optimized)
-        control_patterns = ['break', 'continue', 'pass']
-        for pattern in control_patterns:
-            features.append(code.count(pattern))
-        
-        # Error handling (optimized)
-        error_patterns = ['except', 'finally', 'else:']
-        for pattern in error_patterns:
-            features.append(code.count(pattern))
-        
-        # Documentation (optimized)
-        doc_patterns = ['"""', "'''", 'TODO', 'FIXME', 'HACK']
-        for pattern in doc_patterns:
-            features.append(code.count(pattern))
-        
-        # Modern Python features (optimized)
-        modern_patterns = ['lambda', 'yield', 'generator', 'decorator']
-        for pattern in modern_patterns:
-            features.append(code.count(pattern))
-        
-        # Code quality indicators (optimized)
-        features.append(len(self.compiled_patterns['mixed_case'].findall(code)))
-        features.append(len(self.compiled_patterns['multiple_spaces'].findall(code)))
-        features.append(len(self.compiled_patterns['tabs'].findall(code)))
-        
-        return features
+    def _load_distilled_model(self, path: str, name: str) -> Optional[DistilledModel]:
+        """Load a distilled student if one was trained for this feature schema"""
+        if not os.path.exists(path):
+            return None
+        try:
+            model = DistilledModel.load(path)
+        except Exception as e:
+            print(f"Warning: Could not load {name} model: {e}")
+            return None
+        if model.feature_version != FEATURE_VERSION:
+            print(f"Warning: {name} model was trained on another feature version, ignoring it")
+            return None
+        print(f"Loaded distilled {name} model")
+        return model
 
-    def _extract_comprehensive_features(self, code: str) -> List[float]:
-        """Extract comprehensive analysis features"""
-        features = []
-        
-        # Advanced features
-        features.append(len(self.compiled_patterns['type_hints'].findall(code)))
-        features.append(len(self.compiled_patterns['f_strings'].findall(code)))
-        features.append(len(self.compiled_patterns['list_comprehensions'].findall(code)))
-        features.append(len(self.compiled_patterns['lambda_functions'].findall(code)))
-        features.append(len(self.compiled_patterns['generator_expressions'].findall(code)))
-        features.append(len(self.compiled_patterns['context_managers'].findall(code)))
-        features.append(len(self.compiled_patterns['exception_handling'].findall(code)))
-        features.append(len(self.compiled_patterns['assertions'].findall(code)))
-        features.append(len(self.compiled_patterns['docstrings'].findall(code)))
-        features.append(len(self.compiled_patterns['magic_methods'].findall(code)))
-        features.append(len(self.compiled_patterns['private_methods'].findall(code)))
-        features.append(len(self.compiled_patterns['constants'].findall(code)))
-        
-        # Code entropy (complexity measure)
-        char_freq = Counter(code)
-        total_chars = len(code)
-        if total_chars > 0:
-            entropy = -sum((freq/total_chars) * math.log2(freq/total_chars) for freq in char_freq.values())
-            features.append(entropy)
-        else:
-            features.append(0)
-        
-        # Unique identifier ratio
-        words = self.compiled_patterns['words'].findall(code)
-        unique_words = len(set(words))
-        features.append(unique_words / max(len(words), 1))
-        
-        # Function complexity (average function length)
+    def _load_shadow_model(self) -> Optional[ShadowModel]:
+        """Load the shadow model; a broken one only disables shadow scoring"""
+        if self.shadow_scorer is None:
+            return None
         try:
-            tree = ast.parse(code)
-            functions = len([node for node in ast.walk(tree) if isinstance(node, ast.FunctionDef)])
-            if functions > 0:
-                features.append(len(code) / functions)
-            else:
-                features.append(0)
-        except:
-            features.append(0)
+            shadow_model = load_shadow_model(self.shadow_dir)
+        except Exception as e:
+            print(f"Warning: Could not load shadow model: {e}")
+            return None
+        if shadow_model is not None:
+            print(f"Loaded shadow model {shadow_model.version}")
+        return shadow_model
+
+    def _compute_model_version(self, neural_model, scaler, label_encoder, quantized: bool = False) -> str:
+        """Short fingerprint of the loaded model, scaler and label encoder"""
+        if neural_model is None and scaler is None:
+            return 'rule_based'
+        try:
+            payload = pickle.dumps((neural_model, scaler, label_encoder), protocol=pickle.HIGHEST_PROTOCOL)
+            version = hashlib.blake2b(payload, digest_size=8).hexdigest()
+        except Exception:
+            return 'unknown'
         
+        # Int8 probabilities differ slightly, so they get their own cache namespace
+        return f"{version}-int8" if quantized else version
+
+    def wait_for_models(self, timeout: Optional[float] = None) -> bool:
+        """Block until the models are loaded or the timeout passes; True when ready"""
+        return self.models_ready.wait(self.model_wait if timeout is None else timeout)
+
+    @property
+    def model_version(self) -> str:
+        return self.models.version
+
+    @property
+    def cache_namespace(self) -> str:
+        """Persistent cache namespace: feature schema plus model version"""
+        return self.models.namespace
+
+    def extract_features_fast(self, code: str) -> List[float]:
+        digest = content_hash(code)
+        key = ('features', digest)
+        features = self.feature_cache.get(key)
+        if features is None and self.disk_cache is not None:
+            features = self.disk_cache.get_features(digest, self.cache_namespace)
+            if features is not None:
+                self.feature_cache.put(key, features)
+        if features is None:
+            features = self._extract_document_features(ParsedDocument(code))
+            self.feature_cache.put(key, features)
+            if self.disk_cache is not None:
+                self.disk_cache.put(digest, self.cache_namespace, features)
         return features
 
-    def analyze_code_comprehensive(self, code: str) -> Dict:
+    def extract_feature_subset(self, code: str, names: Optional[List[str]] = None,
+                               timings: Optional[Dict[str, float]] = None) -> Dict[str, float]:
+        """Named features, computing only the graph nodes they need.
+
+        Reuses the cached full vector when there is one; raises KeyError for
+        unknown feature names.
+        """
+        names = list(FEATURE_NAMES if names is None else names)
+        columns = resolve_features(names)
+        features = self.feature_cache.get(('features', content_hash(code)))
+        if features is None:
+            features = self.feature_extractor.extract_columns(ParsedDocument(code), columns, timings)
+        else:
+            features = [features[column] for column in columns]
+        return dict(zip(names, features))
+
+    def _extract_document_features(self, doc: ParsedDocument, timings: Optional[Dict[str, float]] = None) -> List[float]:
+        # Single-pass extraction of all feature groups
+        return self.feature_extractor.extract(doc, timings)
+
+    def analyze_code_comprehensive(self, code: str, doc: Optional[ParsedDocument] = None) -> Dict:
         """Comprehensive code analysis with detailed insights"""
+        doc = doc or ParsedDocument(code)
+        index = doc.line_index
         analysis = {}
         
         # Basic metrics
-        lines = code.split('\n')
-        analysis['basic_metrics'] = {
-            'total_lines': len(lines),
-            'code_lines': len([line for line in lines if line.strip() and not line.strip().startswith('#')]),
-            'comment_lines': len([line for line in lines if line.strip().startswith('#')]),
-            'blank_lines': len([line for line in lines if not line.strip()]),
-            'total_characters': len(code),
-            'average_line_length': np.mean([len(line) for line in lines if line.strip()]) if lines else 0
+        analysis['basic_metrics'] = self._basic_metrics(code, doc)
+        
+        # Complexity analysis (all zeros when the code does not parse)
+        analysis['complexity'] = {
+            'functions': doc.count_nodes(ast.FunctionDef),
+            'classes': doc.count_nodes(ast.ClassDef),
+            'imports': doc.count_nodes(ast.Import, ast.ImportFrom),
+            'function_calls': doc.count_nodes(ast.Call),
+            'assignments': doc.count_nodes(ast.Assign),
+            'loops': doc.count_nodes(ast.For, ast.While),
+            'conditionals': doc.count_nodes(ast.If),
+            'exceptions': doc.count_nodes(ast.Try, ast.ExceptHandler)
         }
         
-        # Complexity analysis
-        try:
-            tree = ast.parse(code)
-            functions = [node for node in ast.walk(tree) if isinstance(node, ast.FunctionDef)]
-            classes = [node for node in ast.walk(tree) if isinstance(node, ast.ClassDef)]
-            
-            analysis['complexity'] = {
-                'functions': len(functions),
-                'classes': len(classes),
-                'imports': len([node for node in ast.walk(tree) if isinstance(node, (ast.Import, ast.ImportFrom))]),
-                'function_calls': len([node for node in ast.walk(tree) if isinstance(node, ast.Call)]),
-                'assignments': len([node for node in ast.walk(tree) if isinstance(node, ast.Assign)]),
-                'loops': len([node for node in ast.walk(tree) if isinstance(node, (ast.For, ast.While))]),
-                'conditionals': len([node for node in ast.walk(tree) if isinstance(node, ast.If)]),
-                'exceptions': len([node for node in ast.walk(tree) if isinstance(node, (ast.Try, ast.ExceptHandler))])
-            }
-        except:
-            analysis['complexity'] = {
-                'functions': 0, 'classes': 0, 'imports': 0, 'function_calls': 0,
-                'assignments': 0, 'loops': 0, 'conditionals': 0, 'exceptions': 0
-            }
-        
         # Style analysis
+        pattern_counts, naming, _ = doc.pattern_counts(self.feature_extractor.pattern_counter)
         analysis['style'] = {
-            'indentation_consistency': self._analyze_indentation(code),
-            'naming_conventions': self._analyze_naming_conventions(code),
+            'indentation_consistency': self._analyze_indentation(code, doc),
+            'naming_conventions': naming_conventions(naming['camel_words'], naming['snake_words'], naming['pascal_words'], naming['words']),
             'comment_ratio': analysis['basic_metrics']['comment_lines'] / max(analysis['basic_metrics']['total_lines'], 1),
-            'line_length_variation': np.std([len(line) for line in lines if line.strip()]) if lines else 0
+            'line_length_variation': np.std(index.content_lengths)
         }
         
         # Language detection removed - handled by enhanced_app.py with Pygments
@@ -375,91 +491,289 @@ class EnhancedCodeAnalyzer:
         # Code quality indicators
         analysis['quality'] = {
             'has_docstrings': bool(self.compiled_patterns['docstrings'].findall(code)),
-            'has_type_hints': bool(self.compiled_patterns['type_hints'].findall(code)),
-            'has_error_handling': bool(self.compiled_patterns['exception_handling'].findall(code)),
-            'has_assertions': bool(self.compiled_patterns['assertions'].findall(code)),
-            'uses_modern_features': bool(self.compiled_patterns['f_strings'].findall(code) or 
-                                       self.compiled_patterns['lambda_functions'].findall(code))
+            'has_type_hints': pattern_counts['type_hints'] > 0,
+            'has_error_handling': pattern_counts['exception_handling'] > 0,
+            'has_assertions': pattern_counts['assertions'] > 0,
+            'uses_modern_features': pattern_counts['f_strings'] > 0 or pattern_counts['lambda_functions'] > 0
         }
         
         return analysis
 
-    def _analyze_indentation(self, code: str) -> str:
-        """Analyze indentation consistency"""
-        lines = code.split('\n')
-        indent_levels = []
-        for line in lines:
-            if line.strip():
-                indent = len(line) - len(line.lstrip())
-                indent_levels.append(indent)
-        
-        if not indent_levels:
-            return "No indentation"
-        
-        if len(set(indent_levels)) == 1:
-            return "Consistent"
-        elif len(set(indent_levels)) <= 3:
-            return "Mostly consistent"
-        else:
-            return "Inconsistent"
-
-    def _analyze_naming_conventions(self, code: str) -> Dict:
-        """Analyze naming conventions"""
-        words = self.compiled_patterns['words'].findall(code)
-        
-        camel_case = sum(1 for word in words if re.match(r'^[a-z]+[A-Z]', word))
-        snake_case = sum(1 for word in words if '_' in word)
-        pascal_case = sum(1 for word in words if re.match(r'^[A-Z][a-zA-Z0-9]*$', word))
-        
-        total = len(words)
-        if total == 0:
-            return {'camel_case': 0, 'snake_case': 0, 'pascal_case': 0, 'dominant': 'none'}
-        
-        conventions = {
-            'camel_case': camel_case / total,
-            'snake_case': snake_case / total,
-            'pascal_case': pascal_case / total
+    def _basic_metrics(self, code: str, doc: ParsedDocument) -> Dict:
+        """Line and character counts from the shared line index"""
+        index = doc.line_index
+        return {
+            'total_lines': index.line_count,
+            'code_lines': int(np.count_nonzero(~index.blank & ~index.hash_comment)),
+            'comment_lines': int(np.count_nonzero(index.hash_comment)),
+            'blank_lines': int(np.count_nonzero(index.blank)),
+            'total_characters': len(code),
+            'average_line_length': np.mean(index.content_lengths)
         }
-        
-        dominant = max(conventions, key=conventions.get)
-        conventions['dominant'] = dominant
-        
-        return conventions
 
-    def predict(self, code: str) -> Dict:
+    def _analyze_indentation(self, code: str, doc: Optional[ParsedDocument] = None) -> str:
+        """Analyze indentation consistency"""
+        doc = doc or ParsedDocument(code)
+        return classify_indentation(np.unique(doc.line_index.content_indents).tolist())
+
+    def predict(self, code: str, mode: str = 'full') -> Dict:
         """Make prediction using neural model with comprehensive analysis"""
-        start_time = time.time()
-        features = self.extract_features_fast(code)
-        
-        # Get comprehensive analysis
-        comprehensive_analysis = self.analyze_code_comprehensive(code)
+        if self.batcher is not None and self.batcher.accepts(code):
+            return self.batcher.predict(code, mode)
+        return self.predict_batch([code], mode)[0]
+
+    def predict_batch(self, codes: List[str], mode: str = 'full') -> List[Dict]:
+        """Predict many snippets with a single scaler and model call"""
+        if mode not in PREDICTION_MODES:
+            raise ValueError(f"Unknown prediction mode: {mode}")
+        if not codes:
+            return []
+        self.wait_for_models()
+        models = self.models
+        
+        # The fast and cascade tiers fall back to the full path until a model is distilled
+        fast = mode == 'fast' and models.fast_model is not None
+        cascade = mode == 'cascade' and models.cascade_model is not None
+        namespace = models.namespace
+        if fast:
+            namespace = f"{namespace}:fast-{models.fast_model.version}"
+        elif cascade:
+            low, high = self.cascade_band
+            namespace = f"{namespace}:cascade-{models.cascade_model.version}-{low}-{high}"
+        
+        # Predictions are cached per model version, so nothing scored before a
+        # model load (or by another tier) is served after it
+        prediction_kind = ('prediction', namespace)
+        score = self._score_fast if fast else self._score
         
-        if self.neural_model is not None and self.scaler is not None:
+        start_time = time.time()
+        keys = [content_hash(code) for code in codes]
+        
+        # Serve repeated files from the cache and score each distinct file once
+        results = {}
+        pending = {}
+        for key, code in zip(keys, codes):
+            if key in results or key in pending:
+                continue
+            cached = self.feature_cache.get((prediction_kind, key))
+            if cached is None and self.disk_cache is not None:
+                cached = self.disk_cache.get_prediction(key, namespace)
+                if cached is not None:
+                    self.feature_cache.put((prediction_kind, key), cached)
+            if cached is not None:
+                lookup_time = time.time() - start_time
+                results[key] = dict(cached, processing_time=lookup_time, timings={'cache_lookup': lookup_time})
+            else:
+                pending[key] = code
+        
+        # Confident stage-one predictions skip the regex, AST and analysis stages
+        if cascade and pending:
+            for key, (features, prediction) in self._cascade_stage_one(pending, models).items():
+                prediction['model_version'] = models.version
+                self.feature_cache.put((prediction_kind, key), prediction)
+                if self.disk_cache is not None:
+                    self.disk_cache.put(key, namespace, features, prediction)
+                results[key] = prediction
+                del pending[key]
+        
+        if pending:
+            pending_codes = list(pending.values())
+            extracted = self._extract_all(pending_codes)
+            predictions = score(pending_codes, extracted, models)
+            for key, (features, _, _), prediction in zip(pending, extracted, predictions):
+                if cascade:
+                    prediction['cascade_stage'] = 'full'
+                self.feature_cache.put(('features', key), list(features))
+                self.feature_cache.put((prediction_kind, key), prediction)
+                if self.disk_cache is not None:
+                    self.disk_cache.put(key, namespace, features, prediction)
+                results[key] = prediction
+        
+        # Snippets repeated within the batch each get their own copy
+        returned = set()
+        output = []
+        for key in keys:
+            output.append(copy.deepcopy(results[key]) if key in returned else results[key])
+            returned.add(key)
+        return output
+
+    def predict_file(self, path: str, chunk_chars: int = 64 * 1024) -> Dict:
+        """Predict a large text file chunk by chunk, reading it on the process pool when enabled.
+
+        The result carries the number of characters read as 'characters'.
+        """
+        self.wait_for_models()
+        models = self.models
+        extracted = None
+        if self.process_pool is not None:
+            try:
+                extracted = self.process_pool.submit(_stream_file_in_worker, path, chunk_chars).result()
+            except BrokenProcessPool as e:
+                print(f"Warning: feature extraction pool failed ({e}), extracting in-process")
+                self.process_pool = None
+                self.process_workers = 0
+        if extracted is None:
+            timings = {}
+            counter = {'size': 0}
+            features, analysis = self.stream_extractor.extract(_iter_file_chunks(path, chunk_chars, counter), timings)
+            extracted = (features, analysis, timings, counter['size'])
+        
+        features, analysis, timings, size = extracted
+        # The text is never materialized, so there is no content hash to cache under
+        result = self._score([''], [(features, analysis, timings)], models)[0]
+        return dict(result, characters=size)
+
+    def _score(self, codes: List[str], extracted: List[Tuple[List[float], Dict, Dict[str, float]]],
+               models: Optional[ModelState] = None) -> List[Dict]:
+        """Run the model (or the rule-based fallback) over extracted snippets"""
+        models = models or self.models
+        features_list = [item[0] for item in extracted]
+        analyses = [item[1] for item in extracted]
+        timings_list = [item[2] for item in extracted]
+        for timings in timings_list:
+            REGISTRY.observe_timings(timings)
+        
+        results = None
+        if models.neural_model is not None and models.scaler is not None:
             try:
-                # Scale features
-                features_scaled = self.scaler.transform([features])
+                model_timings = {}
+                lap = StageClock(model_timings)
                 
-                # Make prediction
-                prediction = self.neural_model.predict(features_scaled)[0]
-                probability = self.neural_model.predict_proba(features_scaled)[0]
+                # Score the whole (N, 80) matrix in one call
+                matrix = np.asarray(features_list, dtype=np.float64)
+                engine = models.quantized_engine or models.inference_engine
+                if engine is not None:
+                    probabilities = engine.predict_proba(matrix)
+                else:
+                    features_scaled = models.scaler.transform(matrix)
+                    lap('scaling')
+                    probabilities = models.neural_model.predict_proba(features_scaled)
+                predictions = models.neural_model.classes_[np.argmax(probabilities, axis=1)]
+                lap('inference')
+                REGISTRY.observe_timings(model_timings)
                 
-                elapsed = time.time() - start_time
-                return {
-                    'prediction': 'AI' if prediction == 1 else 'Human',
-                    'confidence': float(max(probability)),
-                    'ai_probability': float(probability[1] if len(probability) > 1 else probability[0]),
-                    'human_probability': float(probability[0] if len(probability) > 1 else 1 - probability[0]),
-                    'features_used': len(features),
-                    'neural_features': 80,
-                    'processing_time': elapsed,
-                    'comprehensive_analysis': comprehensive_analysis,
-                    'model_type': 'enhanced_neural'
-                }
+                # The shadow model sees the same rows later, on its own thread
+                if models.shadow_model is not None:
+                    self.shadow_scorer.submit(models.shadow_model, matrix, probabilities, sum(model_timings.values()))
+                
+                # Share the batched model time across the rows
+                for timings in timings_list:
+                    for stage, seconds in model_timings.items():
+                        timings[stage] = seconds / len(codes)
+                results = [
+                    self._neural_prediction(prediction, probability, features, analysis, sum(timings.values()))
+                    for prediction, probability, features, analysis, timings
+                    in zip(predictions, probabilities, features_list, analyses, timings_list)
+                ]
             except Exception as e:
                 print(f"Error in neural prediction: {e}")
         
-        # Fallback to rule-based prediction
-        return self._rule_based_prediction(code, features, comprehensive_analysis, time.time() - start_time)
+        # Fallback to rule-based prediction, reported as such whatever models are loaded
+        model_version = models.version
+        if results is None:
+            results = [
+                self._rule_based_prediction(code, features, analysis, sum(timings.values()))
+                for code, features, analysis, timings in zip(codes, features_list, analyses, timings_list)
+            ]
+            model_version = 'rule_based'
+        
+        for result, timings in zip(results, timings_list):
+            result['timings'] = timings
+            result['model_version'] = model_version
+        return results
+
+    def _score_fast(self, codes: List[str], extracted: List[Tuple[List[float], Dict, Dict[str, float]]],
+                    models: ModelState) -> List[Dict]:
+        """Score extracted snippets with the distilled fast model"""
+        for _, _, timings in extracted:
+            REGISTRY.observe_timings(timings)
+        
+        model_timings = {}
+        lap = StageClock(model_timings)
+        probabilities = models.fast_model.predict_proba([features for features, _, _ in extracted])
+        lap('fast_inference')
+        REGISTRY.observe_timings(model_timings)
+        
+        results = []
+        for (features, analysis, timings), probability in zip(extracted, probabilities):
+            timings['fast_inference'] = model_timings['fast_inference'] / len(codes)
+            result = self._neural_prediction(int(np.argmax(probability)), probability, features, analysis, sum(timings.values()))
+            result['model_type'] = 'fast_distilled'
+            result['timings'] = timings
+            result['model_version'] = models.version
+            results.append(result)
+        return results
+
+    def _cascade_stage_one(self, pending: Dict[str, str], models: ModelState) -> Dict[str, Tuple[List[float], Dict]]:
+        """Score the cascade model's own columns of every pending snippet and keep the confident ones"""
+        timings = {}
+        lap = StageClock(timings)
+        docs = {key: ParsedDocument(code) for key, code in pending.items()}
+        columns = models.cascade_model.columns
+        basic = [self.feature_extractor.extract_columns(doc, columns) for doc in docs.values()]
+        lap('stage_one_features')
+        probabilities = models.cascade_model.predict_proba(basic, selected=True)
+        lap('cascade_inference')
+        REGISTRY.observe_timings(timings)
+        
+        low, high = self.cascade_band
+        per_item = {stage: elapsed / len(pending) for stage, elapsed in timings.items()}
+        decided = {}
+        for (key, doc), features, probability in zip(docs.items(), basic, probabilities):
+            if low <= probability[1] <= high:
+                continue
+            analysis = {'basic_metrics': self._basic_metrics(pending[key], doc)}
+            result = self._neural_prediction(int(np.argmax(probability)), probability, features, analysis, sum(per_item.values()))
+            result['model_type'] = 'cascade_stage_one'
+            result['cascade_stage'] = 'stage_one'
+            result['analysis_level'] = 'basic'
+            result['timings'] = dict(per_item)
+            decided[key] = (features, result)
+        
+        help_text = 'Cascade predictions by the stage that decided them'
+        REGISTRY.inc('analyzer_cascade_decisions_total', len(decided), help_text, stage='stage_one')
+        REGISTRY.inc('analyzer_cascade_decisions_total', len(pending) - len(decided), help_text, stage='full')
+        return decided
+
+    def _extract_all(self, codes: List[str]) -> List[Tuple[List[float], Dict, Dict[str, float]]]:
+        """Extract and analyze every snippet, on the process pool when enabled"""
+        if self.process_pool is not None and len(codes) >= self.pool_min_batch:
+            try:
+                chunksize = max(1, len(codes) // (self.process_workers * 4))
+                return list(self.process_pool.map(_extract_in_worker, codes, chunksize=chunksize))
+            except BrokenProcessPool as e:
+                print(f"Warning: feature extraction pool failed ({e}), extracting in-process")
+                self.process_pool = None
+                self.process_workers = 0
+        
+        return [self._extract_and_analyze(code) for code in codes]
+
+    def _extract_and_analyze(self, code: str) -> Tuple[List[float], Dict, Dict[str, float]]:
+        """Features, comprehensive analysis and per-stage timings for one snippet"""
+        timings = {}
+        
+        # Parse once and share the document between extraction and analysis
+        doc = ParsedDocument(code)
+        features = self._extract_document_features(doc, timings)
+        lap = StageClock(timings)
+        analysis = self.analyze_code_comprehensive(code, doc)
+        lap('analysis')
+        return features, analysis, timings
+
+    def _neural_prediction(self, prediction, probability, features: List[float], analysis: Dict, elapsed: float) -> Dict:
+        """Build the response for one row of neural model output"""
+        return {
+            'prediction': 'AI' if prediction == 1 else 'Human',
+            'confidence': float(max(probability)),
+            'ai_probability': float(probability[1] if len(probability) > 1 else probability[0]),
+            'human_probability': float(probability[0] if len(probability) > 1 else 1 - probability[0]),
+            'features_used': len(features),
+            'neural_features': 80,
+            'processing_time': elapsed,
+            'comprehensive_analysis': analysis,
+            'analysis_level': 'comprehensive',
+            'model_type': 'enhanced_neural'
+        }
 
     def _rule_based_prediction(self, code: str, features: List[float], analysis: Dict, elapsed: float) -> Dict:
         """Rule-based prediction as fallback with comprehensive analysis"""
@@ -508,5 +822,6 @@ class EnhancedCodeAnalyzer:
             'neural_features': 80,
             'processing_time': elapsed,
             'comprehensive_analysis': analysis,
+            'analysis_level': 'comprehensive',
             'model_type': 'enhanced_rule_based'
         } 
\ No newline at end of file
@@ -1,18 +1,21 @@
 import os
 import numpy as np
 import joblib
-from flask import Flask, request, jsonify, render_template
-from enhanced_analyzer import EnhancedCodeAnalyzer
+from flask import Flask, Response, g, request, jsonify, render_template
+from enhanced_analyzer import EnhancedCodeAnalyzer, ModelState, PREDICTION_MODES
+from feature_engine import FEATURE_LAYOUT, FEATURE_NAMES
+from metrics import REGISTRY
+from admission import AdmissionController
 from werkzeug.utils import secure_filename
+from concurrent.futures.process import BrokenProcessPool
 import time
 import threading
-from concurrent.futures import ThreadPoolExecutor
 import zipfile
 import tempfile
 import shutil
 import traceback
-from pygments.lexers import guess_lexer, guess_lexer_for_filename
-from pygments.util import ClassNotFound
+import hmac
+from language_detection import detect_language_with_time
 
 # Add PDF support
 try:
@@ -25,13 +28,62 @@ app = Flask(__name__)
 # Global variables for caching and performance
 model_cache = {}
 cache_lock = threading.Lock()
-executor = ThreadPoolExecutor(max_workers=8)
+
+# Worker processes for feature extraction on every request (0 runs single snippets in-process)
+ANALYZER_PROCESS_WORKERS = int(os.environ.get('ANALYZER_PROCESS_WORKERS', '0'))
+
+# Worker processes that extract features and detect languages for batches of two or
+# more snippets while ANALYZER_PROCESS_WORKERS is 0 (0 runs batches in-process too)
+ANALYZER_BATCH_WORKERS = int(os.environ.get('ANALYZER_BATCH_WORKERS', str(os.cpu_count() or 1)))
+
+# Optional SQLite file shared by all workers for cached features and predictions
+ANALYZER_DISK_CACHE = os.environ.get('ANALYZER_DISK_CACHE') or None
+
+# Cascade mode defers snippets whose stage-one AI probability falls in "low,high"
+ANALYZER_CASCADE_BAND = tuple(float(bound) for bound in os.environ.get('ANALYZER_CASCADE_BAND', '0.2,0.8').split(','))
+
+# Score with the int8-quantized MLP when it passes its calibration check
+ANALYZER_QUANTIZE = os.environ.get('ANALYZER_QUANTIZE', '').lower() in ('1', 'true', 'yes')
+
+# Models load in the background; requests wait this many seconds for them
+# before falling back to the rule-based tier
+ANALYZER_MODEL_WAIT = float(os.environ.get('ANALYZER_MODEL_WAIT', '10'))
+
+# Poll the model directory every this many seconds and hot-reload on change (0 disables)
+ANALYZER_MODEL_WATCH = float(os.environ.get('ANALYZER_MODEL_WATCH', '0'))
+
+# Directory of a candidate model to shadow-score live traffic with (e.g. models/shadow; unset disables)
+ANALYZER_SHADOW_DIR = os.environ.get('ANALYZER_SHADOW_DIR') or None
+
+# Concurrent single-snippet predictions arriving within this many milliseconds
+# (up to ANALYZER_BATCH_MAX_ITEMS snippets and ANALYZER_BATCH_MAX_CHARS characters)
+# are scored as one batch (0 disables). Longer snippets skip the batcher, so they
+# never hold up the small ones queued behind them
+ANALYZER_BATCH_WINDOW_MS = float(os.environ.get('ANALYZER_BATCH_WINDOW_MS', '2'))
+ANALYZER_BATCH_MAX_ITEMS = int(os.environ.get('ANALYZER_BATCH_MAX_ITEMS', '64'))
+ANALYZER_BATCH_MAX_CHARS = int(os.environ.get('ANALYZER_BATCH_MAX_CHARS', str(64 * 1024)))
+
+# Admission control: small requests are admitted while the estimate_processing_time
+# of everything in flight stays within this many seconds (0 disables admission
+# control), and at most ANALYZER_MAX_LARGE_REQUESTS large uploads run at once.
+# A small request that does not fit waits up to ANALYZER_ADMISSION_WAIT_MS for budget
+ANALYZER_ADMISSION_CAPACITY = float(os.environ.get('ANALYZER_ADMISSION_CAPACITY', '120'))
+ANALYZER_MAX_LARGE_REQUESTS = int(os.environ.get('ANALYZER_MAX_LARGE_REQUESTS', '2'))
+ANALYZER_ADMISSION_WAIT_MS = float(os.environ.get('ANALYZER_ADMISSION_WAIT_MS', '250'))
+
+# Shared secret for the /admin endpoints; they are disabled when unset
+ANALYZER_ADMIN_TOKEN = os.environ.get('ANALYZER_ADMIN_TOKEN') or None
 
 # File upload configuration
 UPLOAD_FOLDER = 'uploads'
 ALLOWED_EXTENSIONS = {'txt', 'py', 'js', 'java', 'cpp', 'c', 'cs', 'php', 'rb', 'go', 'rs', 'swift', 'kt', 'scala', 'html', 'css', 'xml', 'json', 'sql', 'sh', 'bat', 'ps1', 'md', 'pdf', 'zip', 'rar', '7z'}
 app.config['UPLOAD_FOLDER'] = UPLOAD_FOLDER
 app.config['MAX_CONTENT_LENGTH'] = 50 * 1024 * 1024  # 50MB max file size
+MAX_BATCH_ITEMS = 500  # Max snippets per /analyze_batch request
+STREAM_UPLOAD_THRESHOLD = 1024 * 1024  # Plain-text uploads above this size are analyzed in chunks
+STREAM_CHUNK_CHARS = 64 * 1024
+LANGUAGE_SAMPLE_CHARS = 16 * 1024  # Head of a streamed upload used for language detection
+ADMISSION_PATHS = {'/analyze', '/analyze_batch', '/upload', '/features'}  # POST routes that run analysis
 
 # Create upload directory
 os.makedirs(UPLOAD_FOLDER, exist_ok=True)
@@ -39,40 +91,23 @@ os.makedirs(UPLOAD_FOLDER, exist_ok=True)
 # Initialize the enhanced analyzer
 analyzer = None
 
-EXTENSION_LANGUAGE_MAP = {
-    'py': 'Python',
-    'js': 'JavaScript',
-    'java': 'Java',
-    'cpp': 'C++',
-    'c': 'C',
-    'cs': 'C#',
-    'php': 'PHP',
-    'rb': 'Ruby',
-    'go': 'Go',
-    'rs': 'Rust',
-    'swift': 'Swift',
-    'kt': 'Kotlin',
-    'scala': 'Scala',
-    'html': 'HTML',
-    'css': 'CSS',
-    'xml': 'XML',
-    'json': 'JSON',
-    'sql': 'SQL',
-    'sh': 'Shell',
-    'bat': 'Batch',
-    'ps1': 'PowerShell',
-    'md': 'Markdown'
-}
-
 def allowed_file(filename):
     return '.' in filename and filename.rsplit('.', 1)[1].lower() in ALLOWED_EXTENSIONS
 
 def initialize_analyzer():
-    """Initialize the enhanced analyzer"""
+    """Initialize the enhanced analyzer; its models keep loading in the background"""
     global analyzer
     print("Loading enhanced analyzer...")
-    analyzer = EnhancedCodeAnalyzer()
-    print("Enhanced analyzer loaded successfully")
+    analyzer = EnhancedCodeAnalyzer(process_workers=ANALYZER_PROCESS_WORKERS or ANALYZER_BATCH_WORKERS,
+                                    pool_min_batch=1 if ANALYZER_PROCESS_WORKERS else 2,
+                                    disk_cache_path=ANALYZER_DISK_CACHE,
+                                    cascade_band=ANALYZER_CASCADE_BAND, quantize=ANALYZER_QUANTIZE,
+                                    background_load=True, model_wait=ANALYZER_MODEL_WAIT, shadow_dir=ANALYZER_SHADOW_DIR,
+                                    batch_window=ANALYZER_BATCH_WINDOW_MS / 1000, batch_max_items=ANALYZER_BATCH_MAX_ITEMS,
+                                    batch_max_chars=ANALYZER_BATCH_MAX_CHARS)
+    if ANALYZER_MODEL_WATCH > 0:
+        analyzer.watch_models(ANALYZER_MODEL_WATCH)
+    print("Enhanced analyzer started, models loading in the background")
 
 def extract_code_from_file(file_path):
     """Extract code from various file types"""
@@ -130,6 +165,11 @@ def extract_code_from_file(file_path):
     except Exception as e:
         return None, f"Error reading file: {str(e)}"
 
+def should_stream_file(file_path):
+    """Large plain-text uploads are analyzed without reading them into memory"""
+    file_ext = file_path.rsplit('.', 1)[1].lower()
+    return file_ext not in ('pdf', 'zip', 'rar', '7z') and os.path.getsize(file_path) > STREAM_UPLOAD_THRESHOLD
+
 def estimate_processing_time(code_length):
     """Estimate processing time based on code length"""
     # Base time: 0.1s for small code, scales with length
@@ -137,56 +177,214 @@ def estimate_processing_time(code_length):
     length_factor = code_length / 1000  # 1s per 1000 characters
     return min(base_time + length_factor, 5.0)  # Max 5 seconds
 
-def detect_language_perfect(code, filename=None):
-    # 0. If extension is .py, always return Python
-    if filename and filename.lower().endswith('.py'):
-        return 'Python'
-    # 1. Try Pygments
+def detect_language_timed(code, filename=None, detection=None):
+    """Detect the language (or collect a submit_language_detection result) and record how long detection took"""
     try:
-        if filename:
-            lexer = guess_lexer_for_filename(filename, code)
-        else:
-            lexer = guess_lexer(code)
-        pygments_lang = lexer.name
-        # Heuristic: If Pygments says Transact-SQL but code looks like Python, override
-        if not filename and pygments_lang == 'Transact-SQL':
-            if any(keyword in code for keyword in ['def ', 'import ', '#', 'print(', 'self', 'class ']):
-                return 'Python'
-        if pygments_lang and pygments_lang != 'Text only':
-            return pygments_lang
-    except ClassNotFound:
-        pass
-    # 2. Fallback to file extension
-    if filename and '.' in filename:
-        ext = filename.rsplit('.', 1)[1].lower()
-        return EXTENSION_LANGUAGE_MAP.get(ext, 'Unknown')
-    return 'Unknown'
+        detected_language, elapsed = detection.result() if detection is not None else detect_language_with_time(code, filename)
+    except BrokenProcessPool as e:
+        print(f"Warning: process pool failed ({e}), detecting the language in-process")
+        detected_language, elapsed = detect_language_with_time(code, filename)
+    REGISTRY.observe_timings({'language_detection': elapsed})
+    return detected_language, elapsed
+
+def submit_language_detection(items):
+    """Queue language detection for (code, filename) pairs on the analyzer's process pool.
+
+    Submitted ahead of the batch's feature extraction, the detections run on the
+    workers alongside it. Returns one future per item, or None items when the
+    batch runs in-process.
+    """
+    pool = analyzer.process_pool
+    if pool is None or len(items) < analyzer.pool_min_batch:
+        return [None] * len(items)
+    try:
+        return [pool.submit(detect_language_with_time, code, filename) for code, filename in items]
+    except (BrokenProcessPool, RuntimeError) as e:
+        print(f"Warning: process pool unavailable ({e}), detecting languages in-process")
+        return [None] * len(items)
+
+def build_prediction_response(prediction_result, detected_language, total_time, estimated_time, language_time=0.0):
+    """Shape an analyzer prediction into the public /analyze response.
+
+    'analysis_level' says which sections comprehensive_analysis carries (see
+    ANALYSIS_LEVELS); at 'basic', style and complexity are empty.
+    """
+    analysis_level = prediction_result.get('analysis_level', 'comprehensive')
+    response = {
+        'prediction': prediction_result['prediction'],
+        'confidence': prediction_result['confidence'],
+        'ai_probability': prediction_result['ai_probability'],
+        'human_probability': prediction_result['human_probability'],
+        'language': detected_language,
+        'features_used': prediction_result['features_used'],
+        'neural_features': prediction_result['neural_features'],
+        'model_type': prediction_result['model_type'],
+        'model_version': prediction_result.get('model_version'),
+        'message': 'Enhanced analysis complete with comprehensive code insights.' if analysis_level == 'comprehensive'
+                   else 'Decided by the cascade first stage; only basic metrics were computed.',
+        'performance': {
+            'total_time': total_time,
+            'estimated_time': estimated_time,
+            'feature_extraction_time': prediction_result.get('processing_time', 0),
+            'prediction_time': total_time - prediction_result.get('processing_time', 0),
+            'stages': dict(prediction_result.get('timings', {}), language_detection=language_time)
+        },
+        'comprehensive_analysis': prediction_result['comprehensive_analysis'],
+        'analysis_level': analysis_level,
+        'style': prediction_result['comprehensive_analysis'].get('style', {}),
+        'complexity': prediction_result['comprehensive_analysis'].get('complexity', {})
+    }
+    if 'cascade_stage' in prediction_result:
+        response['cascade_stage'] = prediction_result['cascade_stage']
+    return response
+
+def get_prediction_mode(data=None):
+    """Requested model tier from the query string, form or JSON body"""
+    mode = request.args.get('mode') or request.form.get('mode')
+    if not mode and isinstance(data, dict):
+        mode = data.get('mode')
+    return mode or 'full'
+
+def parse_batch_item(item):
+    """Return (code, filename, error) for one /analyze_batch entry"""
+    if isinstance(item, str):
+        code, filename = item, None
+    elif isinstance(item, dict):
+        code, filename = item.get('code'), item.get('filename')
+    else:
+        return None, None, 'Item must be a string or an object with a "code" field.'
+    
+    if not isinstance(code, str) or not code.strip():
+        return None, None, 'Please provide some code to analyze.'
+    if filename is not None and not isinstance(filename, str):
+        return None, None, 'Filename must be a string.'
+    return code, filename, None
 
 # Initialize on startup
 initialize_analyzer()
 
+# Bodies above the streaming threshold (or of unknown length) are large requests
+admission = AdmissionController(ANALYZER_ADMISSION_CAPACITY, ANALYZER_MAX_LARGE_REQUESTS, STREAM_UPLOAD_THRESHOLD,
+                                estimate_processing_time, ANALYZER_ADMISSION_WAIT_MS / 1000) if ANALYZER_ADMISSION_CAPACITY > 0 else None
+
+def admission_rejection(ticket):
+    """Body, status and headers for a request turned away by admission control"""
+    message = 'Too many large uploads in progress.' if ticket.status == 429 else 'Server is busy.'
+    return ({'error': f'{message} Retry in {ticket.retry_after}s.', 'retry_after': ticket.retry_after},
+            ticket.status, {'Retry-After': str(ticket.retry_after)})
+
+@app.before_request
+def admit_request():
+    """Turn analysis requests away before their body is read when the server is at capacity"""
+    if admission is None or request.method != 'POST' or request.path not in ADMISSION_PATHS:
+        return None
+    ticket = admission.admit(request.content_length)
+    if not ticket.admitted:
+        body, status, headers = admission_rejection(ticket)
+        return jsonify(body), status, headers
+    g.admission = (ticket, time.perf_counter())
+    return None
+
+def resize_admission(size):
+    """Admit the current request again at the size of its extracted text.
+
+    Zip and PDF uploads were admitted on their compressed body length;
+    returns a rejection response when the extracted text no longer fits.
+    """
+    admitted = g.get('admission')
+    if admitted is None:
+        return None
+    ticket, started = admitted
+    ticket = admission.resize(ticket, size)
+    if not ticket.admitted:
+        g.pop('admission')
+        body, status, headers = admission_rejection(ticket)
+        return jsonify(body), status, headers
+    g.admission = (ticket, started)
+    return None
+
+@app.teardown_request
+def release_admission(error=None):
+    admitted = g.pop('admission', None)
+    if admitted is not None:
+        ticket, started = admitted
+        admission.release(ticket, time.perf_counter() - started)
+
 @app.route('/')
 def index():
     return render_template('enhanced_index.html')
 
-@app.route('/health')
-def health():
+def models_ready():
+    """Whether the analyzer exists and its background model load has finished"""
+    return analyzer is not None and analyzer.models_ready.is_set()
+
+def current_models():
+    """The analyzer's model state, read once so a reload cannot change it mid-response"""
+    return analyzer.models if analyzer is not None else ModelState()
+
+def get_health_status():
+    """Body of the /health response"""
+    models = current_models()
     model_status = "enhanced"
-    if analyzer is not None and getattr(analyzer, 'neural_model', None) is not None:
+    if models.neural_model is not None:
         model_status += "_with_neural"
     else:
         model_status += "_fallback"
     
-    return jsonify({
+    return {
         "status": "ok", 
+        "ready": models_ready(),
         "analyzer": model_status, 
-        "features": analyzer.__dict__.get('feature_cache', {}),
-        "neural_model_loaded": analyzer is not None and getattr(analyzer, 'neural_model', None) is not None,
+        "features": analyzer.feature_cache.stats() if analyzer is not None else {},
+        "disk_cache": analyzer.disk_cache.stats() if analyzer is not None and analyzer.disk_cache is not None else None,
+        "neural_model_loaded": models.neural_model is not None,
+        "model_version": models.version,
         "enhanced_features": 80,
         "performance": "optimized",
         "file_upload": "enabled",
-        "comprehensive_analysis": "enabled"
-    })
+        "comprehensive_analysis": "enabled",
+        "admission": admission.stats() if admission is not None else None
+    }
+
+@app.route('/health')
+def health():
+    return jsonify(get_health_status())
+
+@app.route('/health/live')
+def health_live():
+    """Liveness: the process is up and serving requests"""
+    return jsonify({"status": "ok"})
+
+@app.route('/health/ready')
+def health_ready():
+    """Readiness: models are loaded, so predictions use the neural tier when one exists"""
+    status = get_readiness()
+    return jsonify(status), 200 if status['status'] == 'ready' else 503
+
+def get_readiness():
+    """Body of the /health/ready response; status is 'loading' until the models are in"""
+    if not models_ready():
+        return {"status": "loading"}
+    models = current_models()
+    return {
+        "status": "ready",
+        "model_version": models.version,
+        "neural_model_loaded": models.neural_model is not None,
+        "model_load_seconds": models.load_seconds
+    }
+
+@app.route('/admin/reload_models', methods=['POST'])
+def admin_reload_models():
+    """Load the models on disk again and swap them in if they validate"""
+    if ANALYZER_ADMIN_TOKEN is None:
+        return jsonify({'error': 'Admin endpoints are disabled (set ANALYZER_ADMIN_TOKEN).'}), 403
+    if not hmac.compare_digest(request.headers.get('X-Admin-Token', ''), ANALYZER_ADMIN_TOKEN):
+        return jsonify({'error': 'Invalid admin token.'}), 403
+    if analyzer is None:
+        return jsonify({'error': 'Analyzer not initialized.'}), 503
+    
+    result = analyzer.reload_models()
+    return jsonify(result), 200 if 'error' not in result else 422
 
 @app.route('/analyze', methods=['POST'])
 def analyze_code():
@@ -224,6 +422,10 @@ def analyze_code():
                     os.remove(file_path)
                 except:
                     pass
+                
+                rejection = resize_admission(len(code or ''))
+                if rejection:
+                    return rejection
             else:
                 return jsonify({'error': 'File type not allowed.'}), 400
         
@@ -235,39 +437,24 @@ def analyze_code():
         if not code or not code.strip():
             return jsonify({'error': 'Please provide some code to analyze or upload a file.'}), 400
         
+        mode = get_prediction_mode(None if file_info else data)
+        if mode not in PREDICTION_MODES:
+            return jsonify({'error': f'Unknown mode (use one of: {", ".join(PREDICTION_MODES)}).'}), 400
+        
         # Estimate processing time
         estimated_time = estimate_processing_time(len(code))
         
         # Use enhanced analyzer for prediction
-        prediction_result = analyzer.predict(code) if analyzer is not None else {'prediction': 'Error', 'confidence': 0, 'ai_probability': 0, 'human_probability': 0, 'features_used': 0, 'neural_features': 0, 'processing_time': 0, 'comprehensive_analysis': {}, 'model_type': 'none'}
+        prediction_result = analyzer.predict(code, mode) if analyzer is not None else {'prediction': 'Error', 'confidence': 0, 'ai_probability': 0, 'human_probability': 0, 'features_used': 0, 'neural_features': 0, 'processing_time': 0, 'comprehensive_analysis': {}, 'model_type': 'none'}
         
         # Detect language using Pygments
-        detected_language = detect_language_perfect(code, filename if file_info else None)
+        detected_language, language_time = detect_language_timed(code, filename if file_info else None)
         
         # Calculate total processing time
         total_time = time.time() - start_time
         
         # Prepare response
-        response = {
-            'prediction': prediction_result['prediction'],
-            'confidence': prediction_result['confidence'],
-            'ai_probability': prediction_result['ai_probability'],
-            'human_probability': prediction_result['human_probability'],
-            'language': detected_language,
-            'features_used': prediction_result['features_used'],
-            'neural_features': prediction_result['neural_features'],
-            'model_type': prediction_result['model_type'],
-            'message': 'Enhanced analysis complete with comprehensive code insights.',
-            'performance': {
-                'total_time': total_time,
-                'estimated_time': estimated_time,
-                'feature_extraction_time': prediction_result.get('processing_time', 0),
-                'prediction_time': total_time - prediction_result.get('processing_time', 0)
-            },
-            'comprehensive_analysis': prediction_result['comprehensive_analysis'],
-            'style': prediction_result['comprehensive_analysis'].get('style', {}),
-            'complexity': prediction_result['comprehensive_analysis'].get('complexity', {})
-        }
+        response = build_prediction_response(prediction_result, detected_language, total_time, estimated_time, language_time)
         
         # Add file information if available
         if file_info:
@@ -280,6 +467,111 @@ def analyze_code():
         traceback.print_exc()
         return jsonify({'error': f'Internal error: {str(e)}'}), 500
 
+@app.route('/analyze_batch', methods=['POST'])
+def analyze_batch():
+    """Analyze a JSON array of snippets with one batched model call"""
+    try:
+        start_time = time.time()
+        data = request.get_json(silent=True)
+        items = data.get('snippets') if isinstance(data, dict) else data
+        
+        if not isinstance(items, list) or not items:
+            return jsonify({'error': 'Provide a non-empty JSON array of snippets.'}), 400
+        if len(items) > MAX_BATCH_ITEMS:
+            return jsonify({'error': f'Too many snippets (max {MAX_BATCH_ITEMS}).'}), 400
+        if analyzer is None:
+            return jsonify({'error': 'Analyzer not initialized.'}), 503
+        mode = get_prediction_mode(data)
+        if mode not in PREDICTION_MODES:
+            return jsonify({'error': f'Unknown mode (use one of: {", ".join(PREDICTION_MODES)}).'}), 400
+        
+        # Validate every item up front; invalid items keep their slot with an error
+        results = [None] * len(items)
+        valid = []
+        for index, item in enumerate(items):
+            code, filename, error = parse_batch_item(item)
+            if error:
+                results[index] = {'index': index, 'error': error}
+            else:
+                valid.append((index, code, filename))
+        
+        # Detect languages and extract features on the worker pool, then score
+        # all valid snippets at once
+        detections = submit_language_detection([(code, filename) for _, code, filename in valid])
+        predictions = analyzer.predict_batch([code for _, code, _ in valid], mode)
+        batch_time = time.time() - start_time
+        
+        for (index, code, filename), prediction_result, detection in zip(valid, predictions, detections):
+            try:
+                detected_language, language_time = detect_language_timed(code, filename, detection)
+                response = build_prediction_response(prediction_result, detected_language, batch_time, estimate_processing_time(len(code)), language_time)
+                response['index'] = index
+                if filename:
+                    response['file_info'] = {
+                        'filename': filename,
+                        'size': len(code),
+                        'type': filename.rsplit('.', 1)[1].lower() if '.' in filename else 'text'
+                    }
+                results[index] = response
+            except Exception as e:
+                results[index] = {'index': index, 'error': f'Internal error: {str(e)}'}
+        
+        return jsonify({
+            'results': results,
+            'count': len(results),
+            'analyzed': len(valid),
+            'performance': {
+                'total_time': time.time() - start_time,
+                'batch_size': len(valid)
+            }
+        })
+        
+    except Exception as e:
+        print(f"Internal error in /analyze_batch: {e}")
+        traceback.print_exc()
+        return jsonify({'error': f'Internal error: {str(e)}'}), 500
+
+@app.route('/features', methods=['GET', 'POST'])
+def features():
+    """List the feature names, or compute the requested subset for a snippet"""
+    if request.method == 'GET':
+        return jsonify({
+            'features': [{'index': index, 'name': name, 'node': node} for index, (name, node, _) in enumerate(FEATURE_LAYOUT)],
+            'count': len(FEATURE_LAYOUT)
+        })
+    
+    try:
+        start_time = time.time()
+        data = request.get_json(silent=True)
+        if not isinstance(data, dict):
+            return jsonify({'error': 'Provide a JSON object with code and optional feature names.'}), 400
+        code = data.get('code', '')
+        names = data.get('features')
+        if not isinstance(code, str) or not code.strip():
+            return jsonify({'error': 'Please provide some code to analyze.'}), 400
+        if names is not None and (not isinstance(names, list) or not all(isinstance(name, str) for name in names)):
+            return jsonify({'error': 'features must be a list of feature names.'}), 400
+        unknown = [name for name in names or [] if name not in FEATURE_NAMES]
+        if unknown:
+            return jsonify({'error': f'Unknown features: {", ".join(unknown)}'}), 400
+        if analyzer is None:
+            return jsonify({'error': 'Analyzer not initialized.'}), 503
+        
+        timings = {}
+        values = analyzer.extract_feature_subset(code, names, timings)
+        return jsonify({
+            'features': {name: float(value) for name, value in values.items()},
+            'performance': {
+                'total_time': time.time() - start_time,
+                'stages': timings
+            }
+        })
+        
+    except Exception as e:
+        print(f"Internal error in /features: {e}")
+        traceback.print_exc()
+        return jsonify({'error': f'Internal error: {str(e)}'}), 500
+
 @app.route('/upload', methods=['POST'])
 def upload_file():
     """Dedicated file upload endpoint"""
@@ -296,6 +588,15 @@ def upload_file():
             file_path = os.path.join(app.config['UPLOAD_FOLDER'], filename)
             file.save(file_path)
             
+            if should_stream_file(file_path):
+                try:
+                    return analyze_file_streaming(file_path, filename)
+                finally:
+                    try:
+                        os.remove(file_path)
+                    except Exception as e:
+                        print(f"Error cleaning up uploaded file: {e}")
+            
             # Extract code from file
             try:
                 extracted_code, error = extract_code_from_file(file_path)
@@ -312,6 +613,10 @@ def upload_file():
             except Exception as e:
                 print(f"Error cleaning up uploaded file: {e}")
             
+            rejection = resize_admission(len(extracted_code or ''))
+            if rejection:
+                return rejection
+            
             # Analyze the extracted code
             return analyze_code_internal(extracted_code, filename)
         else:
@@ -334,32 +639,13 @@ def analyze_code_internal(code, filename=None):
         prediction_result = analyzer.predict(code) if analyzer is not None else {'prediction': 'Error', 'confidence': 0, 'ai_probability': 0, 'human_probability': 0, 'features_used': 0, 'neural_features': 0, 'processing_time': 0, 'comprehensive_analysis': {}, 'model_type': 'none'}
         
         # Detect language using Pygments
-        detected_language = detect_language_perfect(code, filename)
+        detected_language, language_time = detect_language_timed(code, filename)
         
         # Calculate total processing time
         total_time = time.time() - start_time
         
         # Prepare response
-        response = {
-            'prediction': prediction_result['prediction'],
-            'confidence': prediction_result['confidence'],
-            'ai_probability': prediction_result['ai_probability'],
-            'human_probability': prediction_result['human_probability'],
-            'language': detected_language,
-            'features_used': prediction_result['features_used'],
-            'neural_features': prediction_result['neural_features'],
-            'model_type': prediction_result['model_type'],
-            'message': 'Enhanced analysis complete with comprehensive code insights.',
-            'performance': {
-                'total_time': total_time,
-                'estimated_time': estimated_time,
-                'feature_extraction_time': prediction_result.get('processing_time', 0),
-                'prediction_time': total_time - prediction_result.get('processing_time', 0)
-            },
-            'comprehensive_analysis': prediction_result['comprehensive_analysis'],
-            'style': prediction_result['comprehensive_analysis'].get('style', {}),
-            'complexity': prediction_result['comprehensive_analysis'].get('complexity', {})
-        }
+        response = build_prediction_response(prediction_result, detected_language, total_time, estimated_time, language_time)
         
         # Add file information if available
         if filename:
@@ -374,12 +660,93 @@ def analyze_code_internal(code, filename=None):
     except Exception as e:
         return jsonify({'error': f'Internal error: {str(e)}'}), 500
 
+def analyze_file_streaming(file_path, filename):
+    """Analyze a large text file chunk by chunk, on the process pool when enabled"""
+    try:
+        start_time = time.time()
+        estimated_time = estimate_processing_time(os.path.getsize(file_path))
+        
+        if analyzer is None:
+            return jsonify({'error': 'Analyzer not initialized.'}), 503
+        prediction_result = analyzer.predict_file(file_path, STREAM_CHUNK_CHARS)
+        
+        # Pygments only needs the head of the file
+        with open(file_path, 'r', encoding='utf-8', errors='ignore') as f:
+            sample = f.read(LANGUAGE_SAMPLE_CHARS)
+        detected_language, language_time = detect_language_timed(sample, filename)
+        
+        total_time = time.time() - start_time
+        response = build_prediction_response(prediction_result, detected_language, total_time, estimated_time, language_time)
+        response['file_info'] = {
+            'filename': filename,
+            'size': prediction_result['characters'],
+            'type': filename.rsplit('.', 1)[1].lower() if '.' in filename else 'text',
+            'streamed': True
+        }
+        return jsonify(response)
+        
+    except Exception as e:
+        return jsonify({'error': f'Internal error: {str(e)}'}), 500
+
+@app.route('/metrics')
+def metrics():
+    """Prometheus metrics: per-stage timing histograms and cache counters"""
+    return Response(render_metrics(), mimetype='text/plain; version=0.0.4')
+
+def render_metrics():
+    """Refresh the cache gauges and render every metric in Prometheus text format"""
+    if analyzer is not None:
+        caches = {'memory': analyzer.feature_cache}
+        if analyzer.disk_cache is not None:
+            caches['disk'] = analyzer.disk_cache
+        for cache_name, cache in caches.items():
+            for stat, value in cache.stats().items():
+                if isinstance(value, (int, float)):
+                    REGISTRY.set_gauge(f'analyzer_cache_{stat}', value, f'Feature cache {stat}', cache=cache_name)
+    return REGISTRY.render()
+
+def get_inference_engine_name(models):
+    """Which forward pass scores neural predictions"""
+    if models.quantized_engine is not None:
+        return 'numpy_int8'
+    if models.inference_engine is not None:
+        return 'numpy_folded'
+    return 'sklearn'
+
+def get_bundle_summary(models):
+    """Checksum and shape of the memory-mapped model bundle, when one is loaded"""
+    manifest = models.manifest
+    if not manifest:
+        return None
+    return {key: manifest.get(key) for key in ('checksum', 'created', 'layers', 'n_features', 'format')}
+
+def get_shadow_summary(models):
+    """Shadow model version and its running comparison with the live model"""
+    if models.shadow_model is None:
+        return None
+    return dict(analyzer.shadow_scorer.stats(), version=models.shadow_model.version, format=models.shadow_model.model_format)
+
 @app.route('/model_info')
 def model_info():
     """Get information about the loaded models"""
-    return jsonify({
-        'neural_model_loaded': analyzer is not None and getattr(analyzer, 'neural_model', None) is not None,
+    return jsonify(get_model_info())
+
+def get_model_info():
+    """Body of the /model_info response"""
+    models = current_models()
+    return {
+        'neural_model_loaded': models.neural_model is not None,
         'analyzer_type': 'EnhancedCodeAnalyzer',
+        'model_version': models.version,
+        'model_loaded_at': time.strftime('%Y-%m-%dT%H:%M:%S', time.localtime(models.loaded_at)),
+        'model_format': models.model_format,
+        'model_bundle': get_bundle_summary(models),
+        'inference_engine': get_inference_engine_name(models),
+        'quantization': models.quantization_report,
+        'fast_model': models.fast_model.report if models.fast_model is not None else None,
+        'cascade_model': models.cascade_model.report if models.cascade_model is not None else None,
+        'cascade_band': list(ANALYZER_CASCADE_BAND),
+        'shadow_model': get_shadow_summary(models),
         'feature_extraction_methods': [
             'basic_features',
             'advanced_features',
@@ -396,16 +763,17 @@ def model_info():
             'supported_formats': list(ALLOWED_EXTENSIONS),
             'archive_support': ['zip', 'rar', '7z']
         }
-    })
+    }
 
 if __name__ == '__main__':
     print("Starting Enhanced AI Code Detection App...")
     print("Model Status:")
-    print(f"- Neural Model: {'Loaded' if analyzer is not None and getattr(analyzer, 'neural_model', None) is not None else 'Not Available'}")
+    neural_loaded = current_models().neural_model is not None
+    print(f"- Neural Model: {'Loaded' if neural_loaded else 'Loading in background' if not models_ready() else 'Not Available'}")
     print(f"- Enhanced Features: 80")
     print(f"- Performance: Optimized")
     print(f"- File Upload: Enabled")
     print(f"- Comprehensive Analysis: Enabled")
-    print(f"- Fallback Mode: {'Active' if analyzer is not None and getattr(analyzer, 'neural_model', None) is None else 'Neural Mode'}")
+    print(f"- Fallback Mode: {'Neural Mode' if neural_loaded else 'Active'}")
     
     app.run(debug=False, threaded=True, host='0.0.0.0', port=5005) 
\ No newline at end of file
@@ -0,0 +1,189 @@
+import os
+import sys
+import json
+import hashlib
+import time
+import argparse
+import joblib
+import numpy as np
+from scipy.special import expit
+from typing import Dict, List, Optional, Sequence
+from feature_engine import BASIC_FEATURE_COUNT, FEATURE_COUNT, FEATURE_VERSION
+
+FAST_MODEL_PATH = 'models/fast_model.pkl'
+CASCADE_MODEL_PATH = 'models/cascade_model.pkl'
+
+# Extensions picked up when distilling from a directory of source files
+CORPUS_EXTENSIONS = {'py', 'js', 'ts', 'java', 'cpp', 'c', 'cs', 'php', 'rb', 'go', 'rs', 'swift', 'kt', 'scala', 'sh', 'txt'}
+
+
+class DistilledModel:
+    """Logistic student over a subset of the feature vector.
+
+    Trained on the full analyzer's AI/Human decisions, with the feature
+    standardization folded into the weights, so scoring a row is one dot
+    product and a sigmoid.
+    """
+
+    def __init__(self, weights: np.ndarray, bias: float, columns: Sequence[int], report: Optional[Dict] = None,
+                 feature_version: int = FEATURE_VERSION):
+        self.weights = np.asarray(weights, dtype=np.float64)
+        self.bias = float(bias)
+        self.columns = np.asarray(columns, dtype=np.intp)
+        self.report = report or {}
+        self.feature_version = feature_version
+
+    @classmethod
+    def fit(cls, features: np.ndarray, ai_labels: np.ndarray, columns: Optional[Sequence[int]] = None,
+            regularization: float = 1.0) -> 'DistilledModel':
+        """Fit on raw feature rows and the teacher's labels (1 = AI)"""
+        from sklearn.linear_model import LogisticRegression
+
+        columns = np.arange(features.shape[1]) if columns is None else np.asarray(columns, dtype=np.intp)
+        x = np.nan_to_num(np.asarray(features, dtype=np.float64)[:, columns])
+        y = np.asarray(ai_labels, dtype=np.int64)
+        if len(np.unique(y)) < 2:
+            raise ValueError("The teacher gave every sample the same label; need both AI and Human examples")
+
+        mean = x.mean(axis=0)
+        scale = x.std(axis=0)
+        scale[scale == 0] = 1.0
+        classifier = LogisticRegression(C=regularization, max_iter=2000).fit((x - mean) / scale, y)
+
+        weights = classifier.coef_[0] / scale
+        bias = classifier.intercept_[0] - mean @ weights
+        return cls(weights, bias, columns)
+
+    @property
+    def version(self) -> str:
+        """Short fingerprint of the weights, used to namespace cached predictions"""
+        digest = hashlib.blake2b(digest_size=8)
+        for array in (self.weights, np.array([self.bias]), self.columns.astype(np.int64)):
+            digest.update(np.ascontiguousarray(array).tobytes())
+        return digest.hexdigest()
+
+    def predict_ai_probability(self, features, selected: bool = False) -> np.ndarray:
+        """AI probability per row; with selected=True rows hold only this model's columns"""
+        x = np.asarray(features, dtype=np.float64)
+        if x.ndim == 1:
+            x = x[np.newaxis, :]
+        if not selected:
+            x = x[:, self.columns]
+        return expit(np.nan_to_num(x) @ self.weights + self.bias)
+
+    def predict_proba(self, features, selected: bool = False) -> np.ndarray:
+        """(N, 2) probabilities ordered [Human, AI]"""
+        ai_probability = self.predict_ai_probability(features, selected)
+        return np.column_stack([1 - ai_probability, ai_probability])
+
+    def save(self, path: str):
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        joblib.dump({
+            'weights': self.weights,
+            'bias': self.bias,
+            'columns': self.columns,
+            'report': self.report,
+            'feature_version': self.feature_version
+        }, path)
+
+    @classmethod
+    def load(cls, path: str) -> 'DistilledModel':
+        state = joblib.load(path)
+        return cls(state['weights'], state['bias'], state['columns'], state.get('report'), state.get('feature_version'))
+
+
+def _per_row_seconds(function, rows: List, repeat: int = 3) -> float:
+    best = float('inf')
+    for _ in range(repeat):
+        start = time.perf_counter()
+        for row in rows:
+            function(row)
+        best = min(best, (time.perf_counter() - start) / max(len(rows), 1))
+    return best
+
+
+def distill(analyzer, codes: List[str], columns: Optional[Sequence[int]] = None, holdout: float = 0.2,
+            seed: int = 0) -> DistilledModel:
+    """Train a student on the analyzer's full-path decisions and attach a report.
+
+    The report gives agreement with the teacher on a held-out split and the
+    per-row scoring latency of both models.
+    """
+    codes = list(dict.fromkeys(code for code in codes if code.strip()))
+    if len(codes) < 10:
+        raise ValueError("Need at least 10 distinct non-empty snippets to distill")
+
+    teacher = analyzer.predict_batch(codes)
+    features = np.asarray([analyzer.extract_features_fast(code) for code in codes], dtype=np.float64)
+    labels = np.asarray([result['prediction'] == 'AI' for result in teacher], dtype=np.int64)
+
+    order = np.random.RandomState(seed).permutation(len(codes))
+    split = max(1, int(len(codes) * holdout))
+    test, train = order[:split], order[split:]
+
+    student = DistilledModel.fit(features[train], labels[train], columns)
+    student_labels = (student.predict_ai_probability(features) >= 0.5).astype(np.int64)
+
+    # Latency of the model call alone, one row at a time as /analyze sees it
+    sample = [(features[index], teacher[index]['comprehensive_analysis']) for index in test[:200]]
+    teacher_seconds = _per_row_seconds(lambda row: analyzer._score([''], [(list(row[0]), row[1], {})]), sample)
+    student_seconds = _per_row_seconds(lambda row: student.predict_proba(row[0]), sample)
+    start = time.perf_counter()
+    student.predict_proba(features)
+    bulk_seconds = (time.perf_counter() - start) / len(codes)
+
+    student.report = {
+        'teacher_model_type': teacher[0]['model_type'],
+        'teacher_version': analyzer.model_version,
+        'feature_count': len(student.columns),
+        'train_size': int(len(train)),
+        'holdout_size': int(len(test)),
+        'train_agreement': float(np.mean(student_labels[train] == labels[train])),
+        'holdout_agreement': float(np.mean(student_labels[test] == labels[test])),
+        'teacher_ai_share': float(labels.mean()),
+        'teacher_ms_per_row': teacher_seconds * 1000,
+        'student_ms_per_row': student_seconds * 1000,
+        'student_bulk_ms_per_row': bulk_seconds * 1000,
+        'created': time.strftime('%Y-%m-%dT%H:%M:%S')
+    }
+    return student
+
+
+def read_corpus(paths: List[str]) -> List[str]:
+    """Read every source file under the given files or directories"""
+    codes = []
+    for path in paths:
+        files = [path] if os.path.isfile(path) else [
+            os.path.join(root, name) for root, _, names in os.walk(path) for name in names
+        ]
+        for file_path in sorted(files):
+            if '.' in file_path and file_path.rsplit('.', 1)[1].lower() in CORPUS_EXTENSIONS:
+                with open(file_path, 'r', encoding='utf-8', errors='ignore') as f:
+                    codes.append(f.read())
+    return codes
+
+
+def main(argv: Optional[List[str]] = None):
+    parser = argparse.ArgumentParser(description='Distill the full analyzer into the fast tier model')
+    parser.add_argument('corpus', nargs='+', help='Source files or directories to distill on')
+    parser.add_argument('--output', default=None)
+    parser.add_argument('--holdout', type=float, default=0.2)
+    parser.add_argument('--cascade', action='store_true',
+                        help='Train the cascade first stage on the basic features only')
+    args = parser.parse_args(argv)
+
+    from enhanced_analyzer import EnhancedCodeAnalyzer
+    analyzer = EnhancedCodeAnalyzer()
+    columns = range(BASIC_FEATURE_COUNT) if args.cascade else None
+    output = args.output or (CASCADE_MODEL_PATH if args.cascade else FAST_MODEL_PATH)
+    student = distill(analyzer, read_corpus(args.corpus), columns=columns, holdout=args.holdout)
+    student.save(output)
+    print(json.dumps(student.report, indent=2))
+    name = 'cascade' if args.cascade else 'fast'
+    print(f"Saved {name} model ({len(student.columns)} of {FEATURE_COUNT} features) to {output}")
+
+
+if __name__ == '__main__':
+    main(sys.argv[1:])
@@ -0,0 +1,194 @@
+import os
+import json
+import sqlite3
+import hashlib
+import pickle
+import threading
+import numpy as np
+from collections import OrderedDict
+from typing import Any, Dict, Hashable, List, Optional
+
+
+def content_hash(code: str) -> str:
+    """BLAKE2 digest of the code, used as the cache key instead of the text"""
+    return hashlib.blake2b(code.encode('utf-8', 'surrogatepass'), digest_size=16).hexdigest()
+
+
+class FeatureCache:
+    """Thread-safe LRU cache bounded by the total size of its values.
+
+    Keys are small hashables (usually a kind plus a content hash), so the
+    analyzed code itself is never retained. Values are stored pickled, which
+    also gives their size: every get returns a fresh copy, so neither the
+    caller that put a value nor one that got it can change the cached entry.
+    """
+
+    def __init__(self, max_bytes: int = 64 * 1024 * 1024):
+        self.max_bytes = max_bytes
+        self.current_bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: Hashable) -> Optional[Any]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            blob = entry[0]
+        return pickle.loads(blob)
+
+    def put(self, key: Hashable, value: Any, size: Optional[int] = None):
+        blob = pickle.dumps(value, protocol=pickle.HIGHEST_PROTOCOL)
+        size = len(blob) if size is None else size
+        if size > self.max_bytes:
+            return
+        with self._lock:
+            old = self._entries.pop(key, None)
+            if old is not None:
+                self.current_bytes -= old[1]
+            self._entries[key] = (blob, size)
+            self.current_bytes += size
+            while self.current_bytes > self.max_bytes:
+                _, (_, evicted_size) = self._entries.popitem(last=False)
+                self.current_bytes -= evicted_size
+                self.evictions += 1
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self.current_bytes = 0
+
+    def discard(self, predicate) -> int:
+        """Drop every entry whose key matches the predicate; returns how many"""
+        with self._lock:
+            doomed = [key for key in self._entries if predicate(key)]
+            for key in doomed:
+                self.current_bytes -= self._entries.pop(key)[1]
+            return len(doomed)
+
+    def stats(self) -> Dict:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'entries': len(self._entries),
+                'bytes': self.current_bytes,
+                'max_bytes': self.max_bytes,
+                'hits': self.hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+                'hit_rate': self.hits / lookups if lookups else 0.0
+            }
+
+
+class DiskFeatureCache:
+    """SQLite-backed feature/prediction store shared across processes.
+
+    Rows are keyed by content hash and model version. The database runs in
+    WAL mode so concurrent readers never block on a writer, and every
+    thread of every process opens its own connection.
+    """
+
+    def __init__(self, path: str, timeout: float = 5.0):
+        self.path = path
+        self.timeout = timeout
+        self.hits = 0
+        self.misses = 0
+        self.errors = 0
+        self._local = threading.local()
+        self._stats_lock = threading.Lock()
+
+        directory = os.path.dirname(os.path.abspath(path))
+        os.makedirs(directory, exist_ok=True)
+        conn = self._connection()
+        with conn:
+            conn.execute(
+                'CREATE TABLE IF NOT EXISTS entries ('
+                'content_hash TEXT NOT NULL, '
+                'model_version TEXT NOT NULL, '
+                'features BLOB, '
+                'prediction TEXT, '
+                'PRIMARY KEY (content_hash, model_version)) WITHOUT ROWID'
+            )
+
+    def _connection(self) -> sqlite3.Connection:
+        # Connections must not cross a fork, so they are keyed by pid as well
+        conn = getattr(self._local, 'conn', None)
+        if conn is None or self._local.pid != os.getpid():
+            conn = sqlite3.connect(self.path, timeout=self.timeout, isolation_level=None, check_same_thread=False)
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute('PRAGMA synchronous=NORMAL')
+            self._local.conn = conn
+            self._local.pid = os.getpid()
+        return conn
+
+    def _count(self, hit: bool):
+        with self._stats_lock:
+            if hit:
+                self.hits += 1
+            else:
+                self.misses += 1
+
+    def _fetch(self, column: str, content_hash: str, model_version: str):
+        try:
+            row = self._connection().execute(
+                f'SELECT {column} FROM entries WHERE content_hash = ? AND model_version = ?',
+                (content_hash, model_version)
+            ).fetchone()
+        except sqlite3.Error as e:
+            with self._stats_lock:
+                self.errors += 1
+            print(f"Warning: disk cache read failed: {e}")
+            return None
+        value = row[0] if row is not None else None
+        self._count(value is not None)
+        return value
+
+    def get_features(self, content_hash: str, model_version: str) -> Optional[List[float]]:
+        blob = self._fetch('features', content_hash, model_version)
+        return np.frombuffer(blob, dtype=np.float64).tolist() if blob is not None else None
+
+    def get_prediction(self, content_hash: str, model_version: str) -> Optional[Dict]:
+        text = self._fetch('prediction', content_hash, model_version)
+        return json.loads(text) if text is not None else None
+
+    def put(self, content_hash: str, model_version: str, features: List[float], prediction: Optional[Dict] = None):
+        blob = np.asarray(features, dtype=np.float64).tobytes()
+        text = json.dumps(prediction, default=_json_default) if prediction is not None else None
+        try:
+            self._connection().execute(
+                'INSERT INTO entries (content_hash, model_version, features, prediction) VALUES (?, ?, ?, ?) '
+                'ON CONFLICT (content_hash, model_version) DO UPDATE SET '
+                'features = excluded.features, prediction = COALESCE(excluded.prediction, entries.prediction)',
+                (content_hash, model_version, blob, text)
+            )
+        except sqlite3.Error as e:
+            with self._stats_lock:
+                self.errors += 1
+            print(f"Warning: disk cache write failed: {e}")
+
+    def clear(self):
+        self._connection().execute('DELETE FROM entries')
+
+    def stats(self) -> Dict:
+        with self._stats_lock:
+            lookups = self.hits + self.misses
+            return {
+                'path': self.path,
+                'hits': self.hits,
+                'misses': self.misses,
+                'errors': self.errors,
+                'hit_rate': self.hits / lookups if lookups else 0.0
+            }
+
+
+def _json_default(value: Any):
+    """Convert NumPy scalars left in analysis results to plain JSON types"""
+    if isinstance(value, np.generic):
+        return value.item()
+    raise TypeError(f'Object of type {type(value).__name__} is not JSON serializable')
@@ -0,0 +1,603 @@
+import re
+import ast
+import numpy as np
+from collections import Counter
+from typing import Dict, List, Optional, Tuple
+from metrics import StageClock
+
+# Number of slots the neural models are trained on
+FEATURE_COUNT = 80
+
+# Bump whenever extraction output changes; persistent caches key on it
+FEATURE_VERSION = 1
+
+# Leading slots that only need the line index and character histogram
+BASIC_FEATURE_COUNT = 11
+
+COMMENT_PREFIXES = ('#', '//', '/*', '*')
+
+# Literal substrings counted by the enhanced feature group, in slot order
+ENHANCED_KEYWORDS = ['return', 'print', 'assert', 'raise', 'with', 'async', 'await']
+STRING_LITERALS = ['"', "'", 'f"', "f'"]
+CONTROL_KEYWORDS = ['break', 'continue', 'pass']
+ERROR_KEYWORDS = ['except', 'finally', 'else:']
+DOC_MARKERS = ['"""', "'''", 'TODO', 'FIXME', 'HACK']
+MODERN_KEYWORDS = ['lambda', 'yield', 'generator', 'decorator']
+
+# Comprehensive patterns that still fall inside the 80 slots. The remaining
+# comprehensive features (docstrings, magic methods, entropy, ...) were always
+# truncated away, so the fused engine never computes them.
+COMPREHENSIVE_PATTERNS = [
+    'type_hints', 'f_strings', 'list_comprehensions', 'lambda_functions',
+    'generator_expressions', 'context_managers', 'exception_handling', 'assertions'
+]
+
+# Every literal substring counted for the 80 slots. None of them contains a
+# newline, so counts over line-aligned pieces of a document add up exactly.
+COUNTED_LITERALS = list(dict.fromkeys(
+    ['if', 'elif', 'else', 'for', 'while', 'try', 'except', 'finally',
+     'def ', 'class ', 'import ', 'from ']
+    + ENHANCED_KEYWORDS + STRING_LITERALS + CONTROL_KEYWORDS
+    + ERROR_KEYWORDS + DOC_MARKERS + MODERN_KEYWORDS
+))
+
+# Compiled patterns whose match counts fill feature slots
+ENHANCED_PATTERNS = [
+    'function_calls', 'method_calls', 'camel_case', 'snake_case',
+    'variables', 'add_assign', 'sub_assign', 'floats', 'integers',
+    'mixed_case', 'multiple_spaces', 'tabs'
+]
+COUNTED_PATTERNS = ENHANCED_PATTERNS + COMPREHENSIVE_PATTERNS
+
+# Character classes counted by the basic feature group, in slot order
+CHAR_CLASSES = ('alpha', 'digit', 'space', 'bracket', 'punct')
+
+CAMEL_WORD = re.compile(r'^[a-z]+[A-Z]')
+PASCAL_WORD = re.compile(r'^[A-Z][a-zA-Z0-9]*$')
+
+# Every maximal \w run together with the call or assignment operator after it
+RUN_SCAN = re.compile(r'(\w+)(?:\s*(\(|[+-]?=))?')
+ASCII_WORD = re.compile(r'[a-zA-Z_][a-zA-Z0-9_]*')
+IDENTIFIER_START = frozenset('abcdefghijklmnopqrstuvwxyzABCDEFGHIJKLMNOPQRSTUVWXYZ_')
+ASSIGN_OPERATORS = {'=': 'variables', '+=': 'add_assign', '-=': 'sub_assign'}
+WORD_LITERAL = re.compile(r'\w+')
+
+# Counted patterns whose matches start at a \w run or lie inside one
+RUN_PATTERNS = ('function_calls', 'variables', 'add_assign', 'sub_assign', 'integers', 'camel_case', 'snake_case', 'mixed_case')
+
+
+def _char_classes(char: str) -> Tuple[bool, ...]:
+    return (char.isalpha(), char.isdigit(), char.isspace(), char in '{}[]()', char in ';:,.')
+
+
+# Class membership of every ASCII code point, one column per CHAR_CLASSES entry
+ASCII_CLASS_TABLE = np.array([_char_classes(chr(point)) for point in range(128)], dtype=np.int64)
+ASCII_SPACE = ASCII_CLASS_TABLE[:, CHAR_CLASSES.index('space')].astype(bool)
+
+# str.isspace for every code point up to U+3000 (the last Unicode space),
+# plus a False entry that every higher code point is clamped to
+SPACE_TABLE = np.array([chr(point).isspace() for point in range(0x3001)] + [False], dtype=bool)
+
+
+def encode_codepoints(code: str) -> np.ndarray:
+    """One code point per character: uint8 for ASCII text, uint32 otherwise"""
+    if code.isascii():
+        return np.frombuffer(code.encode('ascii'), dtype=np.uint8)
+    return np.frombuffer(code.encode('utf-32-le', 'surrogatepass'), dtype=np.uint32)
+
+
+def whitespace_mask(codepoints: np.ndarray) -> np.ndarray:
+    """Per-character ``str.isspace`` flags"""
+    if codepoints.dtype == np.uint8:
+        return ASCII_SPACE[codepoints]
+    return SPACE_TABLE[np.minimum(codepoints, len(SPACE_TABLE) - 1)]
+
+
+def count_words(space_mask: np.ndarray) -> int:
+    """Equivalent to ``len(code.split())``: starts of non-whitespace runs"""
+    if len(space_mask) == 0:
+        return 0
+    return int(np.count_nonzero(~space_mask[1:] & space_mask[:-1])) + int(not space_mask[0])
+
+
+def char_histogram(codepoints: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    """Distinct code points and their counts from an encoded buffer.
+
+    ASCII text arrives as uint8 bytes and is counted with ``bincount``.
+    For UTF-32 buffers the ASCII part still goes through ``bincount`` and
+    only the non-ASCII code points are sorted.
+    """
+    if codepoints.dtype == np.uint8:
+        hist = np.bincount(codepoints, minlength=128)
+        points = np.flatnonzero(hist)
+        return points, hist[points]
+    
+    ascii_mask = codepoints < 128
+    hist = np.bincount(codepoints[ascii_mask], minlength=128)
+    ascii_points = np.flatnonzero(hist)
+    other_points, other_counts = np.unique(codepoints[~ascii_mask], return_counts=True)
+    return (np.concatenate([ascii_points, other_points.astype(np.int64)]),
+            np.concatenate([hist[ascii_points], other_counts]))
+
+
+def char_class_counts(points: np.ndarray, counts: np.ndarray) -> Dict[str, int]:
+    """Alpha, digit, space, bracket and punctuation counts from a histogram"""
+    ascii_mask = points < 128
+    totals = counts[ascii_mask] @ ASCII_CLASS_TABLE[points[ascii_mask]]
+    if not ascii_mask.all():
+        # Exact str predicates for the (few) distinct non-ASCII characters
+        table = np.array([_char_classes(chr(point)) for point in points[~ascii_mask].tolist()], dtype=np.int64)
+        totals = totals + counts[~ascii_mask] @ table
+    return dict(zip(CHAR_CLASSES, totals.tolist()))
+
+
+def shannon_entropy(counts: np.ndarray) -> float:
+    """Shannon entropy in bits of a character histogram"""
+    total = counts.sum()
+    if total == 0:
+        return 0
+    probabilities = counts / total
+    return float(-(probabilities * np.log2(probabilities)).sum())
+
+
+def classify_indentation(indent_levels) -> str:
+    """Label indentation consistency from the indents of non-blank lines"""
+    distinct = len(set(indent_levels))
+    if distinct == 0:
+        return "No indentation"
+    if distinct == 1:
+        return "Consistent"
+    elif distinct <= 3:
+        return "Mostly consistent"
+    else:
+        return "Inconsistent"
+
+
+def naming_conventions(camel_case: int, snake_case: int, pascal_case: int, total: int) -> Dict:
+    """Naming convention ratios and the dominant style"""
+    if total == 0:
+        return {'camel_case': 0, 'snake_case': 0, 'pascal_case': 0, 'dominant': 'none'}
+    
+    conventions = {
+        'camel_case': camel_case / total,
+        'snake_case': snake_case / total,
+        'pascal_case': pascal_case / total
+    }
+    conventions['dominant'] = max(conventions, key=conventions.get)
+    return conventions
+
+
+def count_naming(words: List[str]) -> Tuple[int, int, int]:
+    """camelCase, snake_case and PascalCase word counts"""
+    camel_case = sum(1 for word in words if CAMEL_WORD.match(word))
+    snake_case = sum(1 for word in words if '_' in word)
+    pascal_case = sum(1 for word in words if PASCAL_WORD.match(word))
+    return camel_case, snake_case, pascal_case
+
+
+class PatternCounter:
+    """Match counts for COUNTED_PATTERNS plus naming-style word counts.
+
+    Calling ``findall`` per pattern scans the text once for each of them.
+    The call, assignment, integer and case patterns either start at a
+    \\w run or never leave one, so one scan of the runs (with the operator
+    following each) gives their exact ``findall`` counts; each distinct
+    run is examined once and weighted by its frequency. The remaining
+    patterns can span punctuation and keep their own scans.
+    """
+
+    def __init__(self, compiled_patterns: Dict[str, re.Pattern]):
+        self.patterns = compiled_patterns
+        self.scanned = [name for name in COUNTED_PATTERNS if name not in RUN_PATTERNS]
+
+    def count(self, code: str) -> Tuple[Dict[str, int], Dict[str, int], Counter]:
+        """Return (pattern counts, naming counts, distinct \\w runs) for the code"""
+        counts = dict.fromkeys(COUNTED_PATTERNS, 0)
+        tokens = Counter()
+        for (token, operator), freq in Counter(RUN_SCAN.findall(code)).items():
+            tokens[token] += freq
+            if operator == '(':
+                counts['function_calls'] += freq
+            elif operator and token[0] in IDENTIFIER_START:
+                counts[ASSIGN_OPERATORS[operator]] += freq
+        
+        camel_case = self.patterns['camel_case']
+        snake_case = self.patterns['snake_case']
+        mixed_case = self.patterns['mixed_case']
+        naming = {'words': 0, 'camel_words': 0, 'snake_words': 0, 'pascal_words': 0}
+        for token, freq in tokens.items():
+            if token[0].isdecimal():
+                counts['integers'] += freq
+            counts['camel_case'] += freq * len(camel_case.findall(token))
+            counts['snake_case'] += freq * len(snake_case.findall(token))
+            counts['mixed_case'] += freq * len(mixed_case.findall(token))
+            
+            # The 'words' pattern matches exactly the runs that are ASCII identifiers
+            if ASCII_WORD.fullmatch(token):
+                naming['words'] += freq
+                if CAMEL_WORD.match(token):
+                    naming['camel_words'] += freq
+                if '_' in token:
+                    naming['snake_words'] += freq
+                if PASCAL_WORD.match(token):
+                    naming['pascal_words'] += freq
+        
+        for name in self.scanned:
+            counts[name] = len(self.patterns[name].findall(code))
+        return counts, naming, tokens
+
+
+class LiteralCounter:
+    """``str.count`` of every counted literal, planned once up front.
+
+    Literals made only of word characters can only occur inside a single
+    \\w run, so they are searched in the distinct runs from PatternCounter
+    (a short string, weighted by run frequency) instead of the whole
+    document. Literals with spaces, quotes or colons keep ``str.count``.
+    Counts are identical to ``code.count(literal)``, non-overlapping per
+    literal and independent across literals.
+    """
+
+    def __init__(self, literals: List[str]):
+        self.literals = list(literals)
+        self.word_literals = [(literal, re.compile(re.escape(literal))) for literal in self.literals if WORD_LITERAL.fullmatch(literal)]
+        self.text_literals = [literal for literal in self.literals if not WORD_LITERAL.fullmatch(literal)]
+
+    def count(self, code: str, runs: Counter) -> Dict[str, int]:
+        counts = {literal: code.count(literal) for literal in self.text_literals}
+        
+        # Runs joined by a non-word separator, so no match spans two of them
+        joined = '\n'.join(runs)
+        run_ends = np.cumsum([len(run) + 1 for run in runs])
+        run_freqs = np.fromiter(runs.values(), dtype=np.int64, count=len(runs))
+        for literal, pattern in self.word_literals:
+            starts = [match.start() for match in pattern.finditer(joined)]
+            counts[literal] = int(run_freqs[np.searchsorted(run_ends, starts, side='right')].sum()) if starts else 0
+        return {literal: counts[literal] for literal in self.literals}
+
+
+def _value(key):
+    return lambda values: values[key]
+
+
+def _total(*keys):
+    return lambda values: sum(values[key] for key in keys)
+
+
+def _ratio(numerator: str, denominator: str):
+    return lambda values: values[numerator] / max(values[denominator], 1)
+
+
+# Readable names for the literal slots that are not plain words
+LITERAL_FEATURE_NAMES = {
+    '"': 'double_quotes', "'": 'single_quotes', 'f"': 'f_double_quotes', "f'": 'f_single_quotes',
+    'else:': 'else_colons', '"""': 'triple_double_quotes', "'''": 'triple_single_quotes'
+}
+
+
+def _literal_slot(literal: str) -> Tuple:
+    name = LITERAL_FEATURE_NAMES.get(literal, literal.strip().lower())
+    return (f'literal_{name}', 'literals', _value(literal))
+
+
+# Every slot of the vector in model order: (feature name, graph node, value
+# taken from that node's output), grouped by feature family. The fused, subset
+# and streaming paths all read this one layout.
+_LAYOUT_GROUPS = [
+    ('basic', [
+        ('length', 'text', _value('length')),
+        ('newlines', 'lines', _value('newlines')),
+        ('words', 'words', _value('split_words')),
+        *((f'{name}_chars', 'chars', _value(name)) for name in CHAR_CLASSES),
+        ('line_count', 'lines', _value('line_count')),
+        ('line_mean', 'lines', _value('line_mean')),
+        ('line_std', 'lines', _value('line_std'))
+    ]),
+
+    ('advanced', [
+        ('comment_lines', 'comments', _value('comment_lines')),
+        ('comment_ratio', 'comments', _ratio('comment_lines', 'line_count')),
+        ('ast_functions', 'ast', _value(ast.FunctionDef)),
+        ('ast_classes', 'ast', _value(ast.ClassDef)),
+        ('ast_imports', 'ast', _value(ast.Import)),
+        ('ast_import_froms', 'ast', _value(ast.ImportFrom)),
+        ('ast_calls', 'ast', _value(ast.Call)),
+        ('ast_assignments', 'ast', _value(ast.Assign)),
+        ('ast_loops', 'ast', _total(ast.For, ast.While)),
+        ('ast_conditionals', 'ast', _value(ast.If)),
+        ('branch_keywords', 'literals', _total('if', 'elif', 'else')),
+        ('loop_keywords', 'literals', _total('for', 'while')),
+        ('exception_keywords', 'literals', _total('try', 'except', 'finally'))
+    ]),
+
+    ('style', [
+        ('indent_mean', 'indentation', _value('indent_mean')),
+        ('indent_std', 'indentation', _value('indent_std')),
+        ('indent_max', 'indentation', _value('indent_max')),
+        ('camel_words', 'naming', _value('camel_words')),
+        ('snake_words', 'naming', _value('snake_words')),
+        ('pascal_words', 'naming', _value('pascal_words')),
+        *(_literal_slot(literal) for literal in ('def ', 'class ', 'import ', 'from '))
+    ]),
+
+    ('enhanced', [
+        *((name, 'patterns', _value(name)) for name in ('function_calls', 'method_calls', 'camel_case', 'snake_case')),
+        *(_literal_slot(keyword) for keyword in ENHANCED_KEYWORDS),
+        *((name, 'patterns', _value(name)) for name in ('variables', 'add_assign', 'sub_assign')),
+        *(_literal_slot(literal) for literal in STRING_LITERALS),
+        *((name, 'patterns', _value(name)) for name in ('floats', 'integers')),
+        *(_literal_slot(keyword) for keyword in CONTROL_KEYWORDS + ERROR_KEYWORDS + DOC_MARKERS + MODERN_KEYWORDS),
+        *((name, 'patterns', _value(name)) for name in ('mixed_case', 'multiple_spaces', 'tabs'))
+    ]),
+
+    ('comprehensive', [  # Comprehensive features (only the slots that fit in the vector)
+        *((name, 'patterns', _value(name)) for name in COMPREHENSIVE_PATTERNS)
+    ])
+]
+FEATURE_LAYOUT = [slot for _, slots in _LAYOUT_GROUPS for slot in slots]
+FEATURE_GROUPS = [group for group, slots in _LAYOUT_GROUPS for _ in slots]
+FEATURE_NAMES = [name for name, _, _ in FEATURE_LAYOUT]
+FEATURE_INDEX = {name: slot for slot, name in enumerate(FEATURE_NAMES)}
+assert len(FEATURE_LAYOUT) == FEATURE_COUNT and len(FEATURE_INDEX) == FEATURE_COUNT
+
+# Graph nodes whose output is a subset of the streaming extractor's stats dict
+STATS_NODES = ('text', 'words', 'chars', 'lines', 'comments', 'indentation', 'naming')
+
+# Stages for graph nodes that more than one feature group reads; every other
+# node is timed under the one group that needs it
+SHARED_STAGES = {
+    'codepoints': 'text',
+    'space_mask': 'text',
+    'line_index': 'text',
+    'scan': 'scan',
+    'patterns': 'scan',
+    'literals': 'literals'
+}
+
+
+def resolve_features(names: List[str]) -> List[int]:
+    """Slot indices for feature names; raises KeyError for unknown names"""
+    return [FEATURE_INDEX[name] for name in names]
+
+
+def assemble_features(stats: Dict, literals: Dict[str, int], pattern_counts: Dict[str, int], node_counts: Counter) -> List[float]:
+    """Lay document aggregates out in the 80-slot order the models expect"""
+    outputs = dict.fromkeys(STATS_NODES, stats)
+    outputs.update(literals=literals, patterns=pattern_counts, ast=node_counts)
+    return [value(outputs[node]) for _, node, value in FEATURE_LAYOUT]
+
+
+class LineIndex:
+    """Array-backed facts about every line of a document.
+
+    Lines are the pieces of ``code.split('\\n')``. Offsets, lengths,
+    indentation and blank/comment flags come from vectorized operations
+    on the encoded buffer instead of per-line substrings.
+    """
+
+    def __init__(self, codepoints: np.ndarray, space_mask: np.ndarray):
+        size = len(codepoints)
+        newlines = np.flatnonzero(codepoints == 10)
+        self.starts = np.concatenate(([0], newlines + 1))
+        ends = np.concatenate((newlines, [size]))
+        self.lengths = ends - self.starts
+        
+        # First non-whitespace character at or after each line start
+        content = np.append(np.flatnonzero(~space_mask), size)
+        first = content[np.searchsorted(content, self.starts)]
+        self.blank = first >= ends
+        self.indents = np.where(self.blank, self.lengths, first - self.starts)
+        
+        # Comment prefixes of the stripped line: '#', '*', '//' and '/*'
+        last = max(size - 1, 0)
+        buffer = codepoints if size else np.zeros(1, dtype=codepoints.dtype)
+        lead = buffer[np.minimum(first, last)]
+        follow = np.where(first + 1 < ends, buffer[np.minimum(first + 1, last)], 0)
+        self.hash_comment = ~self.blank & (lead == ord('#'))
+        self.comment = self.hash_comment | (~self.blank & (
+            (lead == ord('*')) | ((lead == ord('/')) & ((follow == ord('/')) | (follow == ord('*'))))
+        ))
+
+    @property
+    def line_count(self) -> int:
+        return len(self.starts)
+
+    @property
+    def content_lengths(self) -> np.ndarray:
+        """Lengths of the non-blank lines"""
+        return self.lengths[~self.blank]
+
+    @property
+    def content_indents(self) -> np.ndarray:
+        """Indent widths of the non-blank lines"""
+        return self.indents[~self.blank]
+
+
+class ParsedDocument:
+    """Per-request view of a snippet shared by extraction and analysis.
+
+    The encoded buffer, line index, AST and the node-type histogram are
+    computed on first use and reused by every consumer, so a snippet is
+    encoded, parsed and walked at most once per request.
+    """
+
+    def __init__(self, code: str):
+        self.code = code
+        self._codepoints = None
+        self._space_mask = None
+        self._line_index = None
+        self._tree = None
+        self._parsed = False
+        self._node_counts = None
+        self._char_histogram = None
+        self._pattern_counts = None
+        self._literal_counts = None
+
+        # Feature graph outputs for this document, by node
+        self.node_outputs = {}
+
+    @property
+    def codepoints(self) -> np.ndarray:
+        if self._codepoints is None:
+            self._codepoints = encode_codepoints(self.code)
+        return self._codepoints
+
+    @property
+    def space_mask(self) -> np.ndarray:
+        if self._space_mask is None:
+            self._space_mask = whitespace_mask(self.codepoints)
+        return self._space_mask
+
+    @property
+    def line_index(self) -> LineIndex:
+        if self._line_index is None:
+            self._line_index = LineIndex(self.codepoints, self.space_mask)
+        return self._line_index
+
+    @property
+    def tree(self) -> Optional[ast.AST]:
+        """Parsed module, or None when the code is not valid Python"""
+        if not self._parsed:
+            self._parsed = True
+            try:
+                self._tree = ast.parse(self.code)
+            except Exception:
+                self._tree = None
+        return self._tree
+
+    @property
+    def node_counts(self) -> Counter:
+        """Histogram of AST node types built from a single walk"""
+        if self._node_counts is None:
+            tree = self.tree
+            self._node_counts = Counter(type(node) for node in ast.walk(tree)) if tree is not None else Counter()
+        return self._node_counts
+
+    @property
+    def char_histogram(self) -> Tuple[np.ndarray, np.ndarray]:
+        """Distinct code points and their counts"""
+        if self._char_histogram is None:
+            self._char_histogram = char_histogram(self.codepoints)
+        return self._char_histogram
+
+    def pattern_counts(self, counter: PatternCounter) -> Tuple[Dict[str, int], Dict[str, int], Counter]:
+        """Pattern counts, naming counts and distinct runs, scanned once per document"""
+        if self._pattern_counts is None:
+            self._pattern_counts = counter.count(self.code)
+        return self._pattern_counts
+
+    def literal_counts(self, counter: LiteralCounter, pattern_counter: PatternCounter) -> Dict[str, int]:
+        """Counted literal occurrences, reusing the document's run scan"""
+        if self._literal_counts is None:
+            self._literal_counts = counter.count(self.code, self.pattern_counts(pattern_counter)[2])
+        return self._literal_counts
+
+    def count_nodes(self, *node_types) -> int:
+        node_counts = self.node_counts
+        return sum(node_counts[node_type] for node_type in node_types)
+
+
+def _indentation(index: LineIndex) -> Dict:
+    indent_levels = index.content_indents
+    if not len(indent_levels):
+        return {'indent_mean': 0, 'indent_std': 0, 'indent_max': 0}
+    return {'indent_mean': np.mean(indent_levels), 'indent_std': np.std(indent_levels), 'indent_max': int(indent_levels.max())}
+
+
+class FeatureGraph:
+    """Feature groups as nodes of a dependency graph over shared inputs.
+
+    Input nodes (encoded text, line index, character histogram, AST, run
+    scan) read the lazy ParsedDocument properties; group nodes turn them
+    into the named values FEATURE_LAYOUT takes slots from. Asking for a
+    subset of slots evaluates only the nodes they need and their
+    prerequisites, and node outputs are memoized on the document.
+    """
+
+    def __init__(self, pattern_counter: PatternCounter, literal_counter: LiteralCounter):
+        # node: (dependencies, compute(doc) -> output)
+        self.nodes = {
+            'codepoints': ((), lambda doc: doc.codepoints),
+            'space_mask': (('codepoints',), lambda doc: doc.space_mask),
+            'line_index': (('codepoints', 'space_mask'), lambda doc: doc.line_index),
+            'char_histogram': (('codepoints',), lambda doc: doc.char_histogram),
+            'tree': ((), lambda doc: doc.tree),
+            'scan': ((), lambda doc: doc.pattern_counts(pattern_counter)),
+            'text': ((), lambda doc: {'length': len(doc.code)}),
+            'words': (('space_mask',), lambda doc: {'split_words': count_words(doc.space_mask)}),
+            'chars': (('char_histogram',), lambda doc: char_class_counts(*doc.char_histogram)),
+            'lines': (('line_index',), lambda doc: {
+                'newlines': doc.line_index.line_count - 1,
+                'line_count': doc.line_index.line_count,
+                'line_mean': np.mean(doc.line_index.lengths),
+                'line_std': np.std(doc.line_index.lengths)
+            }),
+            'comments': (('line_index',), lambda doc: {
+                'comment_lines': int(np.count_nonzero(doc.line_index.comment)),
+                'line_count': doc.line_index.line_count
+            }),
+            'indentation': (('line_index',), lambda doc: _indentation(doc.line_index)),
+            'ast': (('tree',), lambda doc: doc.node_counts),
+            'naming': (('scan',), lambda doc: doc.pattern_counts(pattern_counter)[1]),
+            'patterns': (('scan',), lambda doc: doc.pattern_counts(pattern_counter)[0]),
+            'literals': (('scan',), lambda doc: doc.literal_counts(literal_counter, pattern_counter))
+        }
+        groups = {}
+        for slot, group in enumerate(FEATURE_GROUPS):
+            for node in self.requirements([slot]):
+                groups.setdefault(node, set()).add(group)
+        self.stages = {node: SHARED_STAGES[node] if len(used_by) > 1 else used_by.pop()
+                       for node, used_by in groups.items()}
+
+    def requirements(self, slots) -> List[str]:
+        """Nodes needed for the given slots, prerequisites first"""
+        order = []
+
+        def visit(node):
+            if node in order:
+                return
+            for dependency in self.nodes[node][0]:
+                visit(dependency)
+            order.append(node)
+
+        for slot in slots:
+            visit(FEATURE_LAYOUT[slot][1])
+        return order
+
+    def evaluate(self, doc: ParsedDocument, slots, timings: Optional[Dict[str, float]] = None) -> List[float]:
+        """Values of the given slots in the order requested.
+
+        Each node's duration is added to timings under its stage: the
+        feature group (basic, advanced, style, enhanced) that reads it, or
+        SHARED_STAGES (text, scan, literals) for inputs several groups read.
+        """
+        lap = StageClock(timings)
+        outputs = doc.node_outputs
+        for node in self.requirements(slots):
+            if node not in outputs:
+                outputs[node] = self.nodes[node][1](doc)
+                lap(self.stages[node])
+        return [value(outputs[node]) for _, node, value in (FEATURE_LAYOUT[slot] for slot in slots)]
+
+
+class FusedFeatureExtractor:
+    """Fills feature slots from the feature graph of a shared document.
+
+    The text is encoded once, parsed once and walked once; the full
+    vector is identical to concatenating the individual ``_extract_*``
+    groups of EnhancedCodeAnalyzer and truncating to 80.
+    """
+
+    def __init__(self, compiled_patterns: Dict[str, re.Pattern]):
+        self.patterns = compiled_patterns
+        self.pattern_counter = PatternCounter(compiled_patterns)
+        self.literal_counter = LiteralCounter(COUNTED_LITERALS)
+        self.graph = FeatureGraph(self.pattern_counter, self.literal_counter)
+
+    def extract(self, doc: ParsedDocument, timings: Optional[Dict[str, float]] = None) -> List[float]:
+        """Return the 80-slot vector, adding per-node durations to timings"""
+        return self.graph.evaluate(doc, range(FEATURE_COUNT), timings)
+
+    def extract_columns(self, doc: ParsedDocument, columns, timings: Optional[Dict[str, float]] = None) -> List[float]:
+        """Only the given slots, computing just the nodes they depend on"""
+        return self.graph.evaluate(doc, columns, timings)
@@ -0,0 +1,383 @@
+import ast
+import math
+import tokenize
+from collections import Counter
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple
+from feature_engine import (
+    CHAR_CLASSES, COMMENT_PREFIXES, COUNTED_LITERALS, COUNTED_PATTERNS, IDENTIFIER_START, LiteralCounter, PatternCounter,
+    assemble_features, char_class_counts, char_histogram, encode_codepoints, classify_indentation, naming_conventions
+)
+from metrics import StageClock
+
+# Keywords that continue the previous top-level statement instead of starting one
+CONTINUATION_KEYWORDS = frozenset(['else', 'elif', 'except', 'finally'])
+
+
+def iter_lines(chunks: Iterable[str]) -> Iterator[str]:
+    """Re-cut arbitrary text chunks into lines.
+
+    Every line keeps its trailing newline except the last one, so the lines
+    are exactly ``code.split('\\n')`` of the concatenated chunks.
+    """
+    partial = []
+    for chunk in chunks:
+        pieces = chunk.split('\n')
+        if len(pieces) == 1:
+            partial.append(chunk)
+            continue
+        partial.append(pieces[0])
+        yield ''.join(partial) + '\n'
+        for piece in pieces[1:-1]:
+            yield piece + '\n'
+        partial = [pieces[-1]]
+    yield ''.join(partial)
+
+
+def _is_word_char(char: str) -> bool:
+    # Same definition as the re module's Unicode \w
+    return char.isalnum() or char == '_'
+
+
+class RunningStats:
+    """Welford mean/variance accumulator with an exact integer total"""
+
+    def __init__(self):
+        self.count = 0
+        self.total = 0
+        self.maximum = None
+        self._mean = 0.0
+        self._m2 = 0.0
+
+    def add(self, value: int):
+        self.count += 1
+        self.total += value
+        delta = value - self._mean
+        self._mean += delta / self.count
+        self._m2 += delta * (value - self._mean)
+        if self.maximum is None or value > self.maximum:
+            self.maximum = value
+
+    @property
+    def mean(self) -> float:
+        # Integer samples: total / count is exactly what np.mean returns
+        return self.total / self.count if self.count else float('nan')
+
+    @property
+    def std(self) -> float:
+        return math.sqrt(self._m2 / self.count) if self.count else float('nan')
+
+
+class StatementParser:
+    """Counts AST node types one top-level statement at a time.
+
+    Tokens mark where each top-level statement starts. Lines are buffered
+    only until the next statement begins, so memory is bounded by the
+    largest top-level statement instead of the document. If any statement
+    fails to parse, every count is zero, matching a failed whole-file
+    ``ast.parse``.
+    """
+
+    def __init__(self):
+        self.node_counts = Counter()
+        self.failed = False
+        self._lines = []
+        self._first_row = 1
+        self._logical_start = True
+        self._after_decorator = False
+
+    def add_line(self, line: str):
+        if not self.failed:
+            self._lines.append(line)
+
+    def on_token(self, token: tokenize.TokenInfo):
+        if token.type == tokenize.NEWLINE:
+            self._logical_start = True
+            return
+        if token.type in (tokenize.NL, tokenize.COMMENT, tokenize.INDENT, tokenize.DEDENT, tokenize.ENDMARKER):
+            return
+        if self._logical_start:
+            self._logical_start = False
+            row, col = token.start
+            if col == 0 and not self._after_decorator and token.string not in CONTINUATION_KEYWORDS:
+                self._flush_before(row)
+            self._after_decorator = token.string == '@'
+
+    def fail(self):
+        self.failed = True
+        self.node_counts = Counter()
+        self._lines = []
+
+    def finish(self) -> Counter:
+        if not self.failed:
+            self._parse(''.join(self._lines))
+            self._lines = []
+        return self.node_counts
+
+    def _flush_before(self, row: int):
+        cut = row - self._first_row
+        if cut > 0:
+            block = ''.join(self._lines[:cut])
+            del self._lines[:cut]
+            self._first_row = row
+            self._parse(block)
+
+    def _parse(self, source: str):
+        if self.failed or not source:
+            return
+        try:
+            tree = ast.parse(source)
+        except Exception:
+            self.fail()
+            return
+        self.node_counts.update(type(node) for node in ast.walk(tree))
+
+
+class _StreamState:
+    """Running aggregates for one streamed document.
+
+    Work is timed with ``lap`` under the stages the fused extractor reports:
+    line splitting and per-line aggregates under text, character classes and
+    words under basic, the pattern scan under scan, literal counts under
+    literals, naming under style and statement parsing under advanced.
+    """
+
+    def __init__(self, pattern_counter: PatternCounter, literal_counter: LiteralCounter, block_size: int,
+                 lap: StageClock):
+        self.pattern_counter = pattern_counter
+        self.literal_counter = literal_counter
+        self.block_size = block_size
+        self.lap = lap
+        self.parser = StatementParser()
+
+        # Per-line aggregates
+        self.line_stats = RunningStats()
+        self.indent_stats = RunningStats()
+        self.nonblank_stats = RunningStats()
+        self.indent_levels = set()
+        self.comment_lines = 0
+        self.hash_comment_lines = 0
+        self.blank_lines = 0
+
+        # Per-block aggregates
+        self.char_classes = dict.fromkeys(CHAR_CLASSES, 0)
+        self.split_words = 0
+        self.literals = dict.fromkeys(COUNTED_LITERALS, 0)
+        self.pattern_counts = dict.fromkeys(COUNTED_PATTERNS, 0)
+        self.naming = {'words': 0, 'camel_words': 0, 'snake_words': 0, 'pascal_words': 0}
+        self._block = []
+        self._block_chars = 0
+
+        # Matches that can continue across a block boundary
+        self.space_run = 0
+        self.pending_call = False
+        self.pending_assign = False
+        self.pending_hint = False
+
+    def add_line(self, line: str):
+        self.parser.add_line(line)
+        text = line[:-1] if line.endswith('\n') else line
+
+        length = len(text)
+        self.line_stats.add(length)
+        stripped = text.strip()
+        if stripped:
+            indent = length - len(text.lstrip())
+            self.indent_stats.add(indent)
+            self.indent_levels.add(indent)
+            self.nonblank_stats.add(length)
+            if stripped.startswith(COMMENT_PREFIXES):
+                self.comment_lines += 1
+            if stripped.startswith('#'):
+                self.hash_comment_lines += 1
+        else:
+            self.blank_lines += 1
+
+        self._block.append(line)
+        self._block_chars += len(line)
+        if self._block_chars >= self.block_size and line.endswith('\n'):
+            self._process_block()
+
+    def _process_block(self):
+        # Blocks always end right after a newline (except the last one), so
+        # literal counts, word splits and single-line patterns add up exactly
+        block = ''.join(self._block)
+        self._block = []
+        self._block_chars = 0
+        lap = self.lap
+        lap('text')
+
+        for name, value in char_class_counts(*char_histogram(encode_codepoints(block))).items():
+            self.char_classes[name] += value
+        self.split_words += len(block.split())
+        lap('basic')
+        pattern_counts, naming, runs = self.pattern_counter.count(block)
+        lap('scan')
+        for literal, value in self.literal_counter.count(block, runs).items():
+            self.literals[literal] += value
+        lap('literals')
+        for name, value in naming.items():
+            self.naming[name] += value
+        lap('style')
+        for name in COUNTED_PATTERNS:
+            if name != 'multiple_spaces':
+                self.pattern_counts[name] += pattern_counts[name]
+
+        stripped_end = len(block.rstrip())
+        if stripped_end == 0:
+            # Whitespace-only block: it extends the current run and keeps pending matches alive
+            self.space_run += len(block)
+            lap('scan')
+            return
+
+        # Patterns whose \s can span the newline between two blocks
+        lead = len(block) - len(block.lstrip())
+        first = block[lead]
+        if self.pending_call and first == '(':
+            self.pattern_counts['function_calls'] += 1
+        if self.pending_assign:
+            if first == '=':
+                self.pattern_counts['variables'] += 1
+            elif block.startswith('+=', lead):
+                self.pattern_counts['add_assign'] += 1
+            elif block.startswith('-=', lead):
+                self.pattern_counts['sub_assign'] += 1
+        if self.pending_hint and _is_word_char(first):
+            self.pattern_counts['type_hints'] += 1
+
+        # Whitespace runs touching the block edges are merged with their neighbours
+        trail = len(block) - stripped_end
+        runs = pattern_counts['multiple_spaces']
+        runs -= (lead >= 2) + (trail >= 2)
+        runs += (self.space_run + lead >= 2)
+        self.pattern_counts['multiple_spaces'] += runs
+        self.space_run = trail
+
+        word_start = stripped_end
+        while word_start > 0 and _is_word_char(block[word_start - 1]):
+            word_start -= 1
+        self.pending_call = word_start < stripped_end
+        self.pending_assign = self.pending_call and block[word_start] in IDENTIFIER_START
+        self.pending_hint = block[stripped_end - 1] == ':'
+        lap('scan')
+
+    def finish(self) -> Tuple[Dict, Counter]:
+        self._process_block()
+        self.pattern_counts['multiple_spaces'] += (self.space_run >= 2)
+        node_counts = self.parser.finish()
+        self.lap('advanced')
+
+        stats = {
+            'length': self.line_stats.total + self.line_stats.count - 1,
+            'newlines': self.line_stats.count - 1,
+            'split_words': self.split_words,
+            'line_count': self.line_stats.count,
+            'line_mean': self.line_stats.mean,
+            'line_std': self.line_stats.std,
+            'comment_lines': self.comment_lines
+        }
+        stats.update(self.char_classes)
+        stats.update(self.naming)
+        if self.indent_stats.count:
+            stats.update(indent_mean=self.indent_stats.mean, indent_std=self.indent_stats.std,
+                         indent_max=self.indent_stats.maximum)
+        else:
+            stats.update(indent_mean=0, indent_std=0, indent_max=0)
+        self.lap('basic')
+        return stats, node_counts
+
+    def analysis(self, stats: Dict, node_counts: Counter) -> Dict:
+        """Same structure as EnhancedCodeAnalyzer.analyze_code_comprehensive"""
+        def count_nodes(*node_types):
+            return sum(node_counts[node_type] for node_type in node_types)
+
+        total_lines = self.line_stats.count
+        pattern_counts = self.pattern_counts
+        return {
+            'basic_metrics': {
+                'total_lines': total_lines,
+                'code_lines': total_lines - self.blank_lines - self.hash_comment_lines,
+                'comment_lines': self.hash_comment_lines,
+                'blank_lines': self.blank_lines,
+                'total_characters': stats['length'],
+                'average_line_length': self.nonblank_stats.mean
+            },
+            'complexity': {
+                'functions': count_nodes(ast.FunctionDef),
+                'classes': count_nodes(ast.ClassDef),
+                'imports': count_nodes(ast.Import, ast.ImportFrom),
+                'function_calls': count_nodes(ast.Call),
+                'assignments': count_nodes(ast.Assign),
+                'loops': count_nodes(ast.For, ast.While),
+                'conditionals': count_nodes(ast.If),
+                'exceptions': count_nodes(ast.Try, ast.ExceptHandler)
+            },
+            'style': {
+                'indentation_consistency': classify_indentation(self.indent_levels),
+                'naming_conventions': naming_conventions(stats['camel_words'], stats['snake_words'], stats['pascal_words'], stats['words']),
+                'comment_ratio': self.hash_comment_lines / max(total_lines, 1),
+                'line_length_variation': self.nonblank_stats.std
+            },
+            'quality': {
+                # Two non-overlapping triple quotes are exactly what the docstring regex needs
+                'has_docstrings': self.literals['"""'] >= 2 or self.literals["'''"] >= 2,
+                'has_type_hints': pattern_counts['type_hints'] > 0,
+                'has_error_handling': pattern_counts['exception_handling'] > 0,
+                'has_assertions': pattern_counts['assertions'] > 0,
+                'uses_modern_features': pattern_counts['f_strings'] > 0 or pattern_counts['lambda_functions'] > 0
+            }
+        }
+
+
+class StreamingFeatureExtractor:
+    """Feature extraction over an iterator of text chunks in bounded memory.
+
+    Counts are exact; line-length and indentation spreads use Welford
+    updates and agree with the in-memory path to floating-point rounding.
+    Memory is bounded by ``block_size``, the longest line and the largest
+    top-level Python statement.
+    """
+
+    def __init__(self, compiled_patterns: Dict, block_size: int = 1 << 16):
+        self.pattern_counter = PatternCounter(compiled_patterns)
+        self.literal_counter = LiteralCounter(COUNTED_LITERALS)
+        self.block_size = block_size
+
+    def extract(self, chunks: Iterable[str], timings: Optional[Dict[str, float]] = None) -> Tuple[List[float], Dict]:
+        """Return the 80-slot feature vector and the comprehensive analysis.
+
+        Durations are added to timings under the fused extractor's stages,
+        with the analysis itself under 'analysis'.
+        """
+        lap = StageClock(timings)
+        state = _StreamState(self.pattern_counter, self.literal_counter, self.block_size, lap)
+        parser = state.parser
+        lines = iter_lines(chunks)
+
+        def readline():
+            # Time since the previous line went to the tokenizer and statement parser
+            lap('advanced')
+            line = next(lines, None)
+            if line is None:
+                return ''
+            state.add_line(line)
+            lap('text')
+            return line
+
+        # tokenize pulls the lines, so statement boundaries are seen as they arrive
+        try:
+            for token in tokenize.generate_tokens(readline):
+                parser.on_token(token)
+                if parser.failed:
+                    break
+        except Exception:
+            parser.fail()
+        lap('advanced')
+        for line in lines:
+            state.add_line(line)
+        lap('text')
+
+        stats, node_counts = state.finish()
+        features = assemble_features(stats, state.literals, state.pattern_counts, node_counts)
+        analysis = state.analysis(stats, node_counts)
+        lap('analysis')
+        return features, analysis
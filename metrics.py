@@ -0,0 +1,102 @@
+import time
+import threading
+from typing import Dict, Optional, Tuple
+
+# Histogram buckets in seconds, from sub-millisecond stages up to large uploads
+DEFAULT_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+class StageClock:
+    """Adds the time since the previous lap to a per-request timing record"""
+
+    def __init__(self, timings: Optional[Dict[str, float]]):
+        self.timings = timings
+        self.last = time.perf_counter()
+
+    def __call__(self, stage: str):
+        now = time.perf_counter()
+        if self.timings is not None:
+            self.timings[stage] = self.timings.get(stage, 0.0) + (now - self.last)
+        self.last = now
+
+
+class MetricsRegistry:
+    """Process-wide counters, gauges and histograms in Prometheus text format"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._help = {}
+        self._types = {}
+        self._buckets = {}
+        self._values = {}
+
+    def _register(self, name: str, metric_type: str, help_text: str):
+        if name not in self._types:
+            self._types[name] = metric_type
+            self._help[name] = help_text
+            self._values[name] = {}
+
+    @staticmethod
+    def _labels(labels: Dict[str, str]) -> Tuple:
+        return tuple(sorted((key, str(value)) for key, value in labels.items()))
+
+    def inc(self, name: str, amount: float = 1, help_text: str = '', **labels):
+        with self._lock:
+            self._register(name, 'counter', help_text)
+            key = self._labels(labels)
+            self._values[name][key] = self._values[name].get(key, 0) + amount
+
+    def set_gauge(self, name: str, value: float, help_text: str = '', **labels):
+        with self._lock:
+            self._register(name, 'gauge', help_text)
+            self._values[name][self._labels(labels)] = value
+
+    def observe(self, name: str, value: float, help_text: str = '', buckets: Tuple = DEFAULT_BUCKETS, **labels):
+        with self._lock:
+            self._register(name, 'histogram', help_text)
+            self._buckets.setdefault(name, buckets)
+            key = self._labels(labels)
+            series = self._values[name].get(key)
+            if series is None:
+                series = self._values[name][key] = [[0] * len(self._buckets[name]), 0.0, 0]
+            for index, bound in enumerate(self._buckets[name]):
+                if value <= bound:
+                    series[0][index] += 1
+            series[1] += value
+            series[2] += 1
+
+    def observe_timings(self, timings: Dict[str, float]):
+        """Record every stage of a per-request timing record"""
+        for stage, seconds in timings.items():
+            self.observe('analyzer_stage_seconds', seconds, 'Time spent per analysis stage', stage=stage)
+
+    def render(self) -> str:
+        with self._lock:
+            lines = []
+            for name in sorted(self._types):
+                metric_type = self._types[name]
+                if self._help[name]:
+                    lines.append(f'# HELP {name} {self._help[name]}')
+                lines.append(f'# TYPE {name} {metric_type}')
+                for key, value in sorted(self._values[name].items()):
+                    if metric_type != 'histogram':
+                        lines.append(f'{name}{_format_labels(key)} {value}')
+                        continue
+                    counts, total, count = value
+                    for bound, bucket_count in zip(self._buckets[name], counts):
+                        lines.append(f'{name}_bucket{_format_labels(key + (("le", repr(bound)),))} {bucket_count}')
+                    lines.append(f'{name}_bucket{_format_labels(key + (("le", "+Inf"),))} {count}')
+                    lines.append(f'{name}_sum{_format_labels(key)} {total}')
+                    lines.append(f'{name}_count{_format_labels(key)} {count}')
+            return '\n'.join(lines) + '\n'
+
+
+def _format_labels(key: Tuple) -> str:
+    if not key:
+        return ''
+    pairs = ','.join('{}="{}"'.format(label, value.replace('\\', '\\\\').replace('"', '\\"')) for label, value in key)
+    return '{' + pairs + '}'
+
+
+# Shared registry for the whole process
+REGISTRY = MetricsRegistry()
@@ -0,0 +1,345 @@
+import os
+import sys
+import argparse
+import numpy as np
+from scipy.special import expit
+from typing import Dict, List, Optional, Tuple
+
+# Feature rows the int8 engine is checked against at load time
+CALIBRATION_PATH = 'models/mlp_calibration.npy'
+
+
+def _relu(x: np.ndarray) -> np.ndarray:
+    return np.maximum(x, 0, out=x)
+
+
+def _tanh(x: np.ndarray) -> np.ndarray:
+    return np.tanh(x, out=x)
+
+
+def _logistic(x: np.ndarray) -> np.ndarray:
+    return expit(x, out=x)
+
+
+def _identity(x: np.ndarray) -> np.ndarray:
+    return x
+
+
+def _softmax(x: np.ndarray) -> np.ndarray:
+    x -= x.max(axis=1)[:, np.newaxis]
+    np.exp(x, out=x)
+    x /= x.sum(axis=1)[:, np.newaxis]
+    return x
+
+
+ACTIVATIONS = {
+    'relu': _relu,
+    'tanh': _tanh,
+    'logistic': _logistic,
+    'identity': _identity,
+    'softmax': _softmax
+}
+
+
+class FoldedMLP:
+    """Forward pass of a fitted MLPClassifier in plain NumPy.
+
+    The StandardScaler is folded into the first layer: for
+    ``(x - mean) / scale`` the weights become ``W / scale`` and the bias
+    ``b - (mean / scale) @ W``, so raw feature rows go straight into a
+    chain of matrix products with no sklearn validation or dispatch.
+    """
+
+    def __init__(self, weights: List[np.ndarray], biases: List[np.ndarray], activation: str,
+                 out_activation: str, classes: np.ndarray):
+        if activation not in ACTIVATIONS or out_activation not in ACTIVATIONS:
+            raise ValueError(f"Unsupported activation: {activation}/{out_activation}")
+        self.weights = weights
+        self.biases = biases
+        self.activation = activation
+        self.out_activation = out_activation
+        self.classes_ = classes
+        self.n_features_in_ = weights[0].shape[0]
+
+    @classmethod
+    def from_sklearn(cls, model, scaler=None) -> 'FoldedMLP':
+        """Take the weights of a fitted MLPClassifier and fold in the scaler.
+
+        Only the first layer is rewritten; the others are used in place, so
+        memory-mapped weights stay shared.
+        """
+        weights = [np.asarray(coef, dtype=np.float64) for coef in model.coefs_]
+        biases = [np.asarray(intercept, dtype=np.float64) for intercept in model.intercepts_]
+
+        if scaler is not None:
+            mean = getattr(scaler, 'mean_', None)
+            scale = getattr(scaler, 'scale_', None)
+            if scale is not None:
+                weights[0] = weights[0] / np.asarray(scale, dtype=np.float64)[:, np.newaxis]
+            if mean is not None:
+                biases[0] = biases[0] - np.asarray(mean, dtype=np.float64) @ weights[0]
+
+        return cls(weights, biases, model.activation, model.out_activation_, np.asarray(model.classes_))
+
+    def predict_proba(self, features) -> np.ndarray:
+        """Class probabilities for raw (unscaled) feature rows"""
+        x = np.asarray(features, dtype=np.float64)
+        if x.ndim != 2 or x.shape[1] != self.n_features_in_:
+            raise ValueError(f"X has {x.shape[-1]} features, but the model is expecting {self.n_features_in_} features as input")
+
+        hidden = ACTIVATIONS[self.activation]
+        last = len(self.weights) - 1
+        for layer, (weight, bias) in enumerate(zip(self.weights, self.biases)):
+            x = x @ weight
+            x += bias
+            if layer < last:
+                x = hidden(x)
+        x = ACTIVATIONS[self.out_activation](x)
+
+        # Binary models have a single logistic output unit
+        if x.shape[1] == 1:
+            x = np.hstack([1 - x, x])
+        return x
+
+    def predict(self, features) -> np.ndarray:
+        return self.classes_[np.argmax(self.predict_proba(features), axis=1)]
+
+
+def probe_inputs(n_features: int, scaler=None, rows: int = 64, seed: int = 0) -> np.ndarray:
+    """Deterministic rows spread around the scaler's training distribution"""
+    rng = np.random.RandomState(seed)
+    x = rng.standard_normal((rows, n_features)) * 2
+    if scaler is not None:
+        scale = getattr(scaler, 'scale_', None)
+        mean = getattr(scaler, 'mean_', None)
+        if scale is not None:
+            x *= scale
+        if mean is not None:
+            x += mean
+    return x
+
+
+def verify_against_sklearn(engine: FoldedMLP, model, scaler=None, rtol: float = 1e-7,
+                           atol: float = 1e-9) -> Tuple[bool, float]:
+    """Compare the engine with sklearn on probe rows; returns (ok, max abs difference)"""
+    x = probe_inputs(engine.n_features_in_, scaler)
+    scaled = scaler.transform(x) if scaler is not None else x
+    expected = model.predict_proba(scaled)
+    actual = engine.predict_proba(x)
+    if expected.shape != actual.shape:
+        return False, float('inf')
+    difference = float(np.max(np.abs(expected - actual))) if expected.size else 0.0
+    same_labels = np.array_equal(np.argmax(expected, axis=1), np.argmax(actual, axis=1))
+    return bool(same_labels and np.allclose(actual, expected, rtol=rtol, atol=atol)), difference
+
+
+def build_engine(model, scaler=None) -> Optional[FoldedMLP]:
+    """Folded engine for a loaded model, or None when it is unsupported or fails the self-check"""
+    if model is None or not hasattr(model, 'coefs_'):
+        return None
+    try:
+        engine = FoldedMLP.from_sklearn(model, scaler)
+        ok, difference = verify_against_sklearn(engine, model, scaler)
+    except Exception as e:
+        print(f"Warning: NumPy inference engine unavailable: {e}")
+        return None
+    if not ok:
+        print(f"Warning: NumPy inference engine disagrees with sklearn (max diff {difference:.3g}), using sklearn")
+        return None
+    print(f"NumPy inference engine verified against sklearn (max diff {difference:.3g})")
+    return engine
+
+
+# Largest fan-in for which int8 x int8 dot products stay exact in float32
+# (127 * 127 * fan_in must stay below 2**24)
+EXACT_FLOAT32_FAN_IN = (1 << 24) // (127 * 127)
+
+
+def _quantize_rows(x: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    """Symmetric int8 quantization with one scale per row.
+
+    The quantized values are returned on the int8 grid but kept in float32,
+    which is what the sgemm path consumes anyway.
+    """
+    scale = np.abs(x).max(axis=1, keepdims=True)
+    scale /= 127
+    scale[scale == 0] = 1
+    return np.rint(x / scale), scale
+
+
+def _matmul_operand(weight: np.ndarray) -> np.ndarray:
+    """The int8 weights in the form _int8_matmul consumes.
+
+    NumPy integer matmul bypasses BLAS, so layers narrow enough for exact
+    float32 accumulation keep their int8 values as float32 for sgemm;
+    wider layers stay int8.
+    """
+    return weight.astype(np.float32) if weight.shape[0] <= EXACT_FLOAT32_FAN_IN else weight
+
+
+def _int8_matmul(x: np.ndarray, weight: np.ndarray) -> np.ndarray:
+    """Exact integer product of int8-valued activations and a _matmul_operand"""
+    if weight.dtype == np.float32:
+        return x @ weight
+    return np.matmul(x.astype(np.int8), weight, dtype=np.int32).astype(np.float32)
+
+
+class QuantizedMLP:
+    """Int8 weight-quantized forward pass of a fitted MLPClassifier.
+
+    Each layer keeps int8 weights with a single scale; activations are
+    quantized per row before every layer and the integer products are
+    rescaled into float32. The scaler is applied in float first so the
+    inputs share one range, which the per-row activation scale needs.
+    Weights are held in their matmul form, converted once here.
+    """
+
+    def __init__(self, weights: List[np.ndarray], weight_scales: List[float], biases: List[np.ndarray],
+                 mean: np.ndarray, scale: np.ndarray, activation: str, out_activation: str, classes: np.ndarray):
+        if activation not in ACTIVATIONS or out_activation not in ACTIVATIONS:
+            raise ValueError(f"Unsupported activation: {activation}/{out_activation}")
+        self.weights = [_matmul_operand(weight) for weight in weights]
+        self.weight_scales = weight_scales
+        self.biases = biases
+        self.mean = mean
+        self.scale = scale
+        self.activation = activation
+        self.out_activation = out_activation
+        self.classes_ = classes
+        self.n_features_in_ = weights[0].shape[0]
+
+    @classmethod
+    def from_sklearn(cls, model, scaler=None) -> 'QuantizedMLP':
+        """Quantize the weights of a fitted MLPClassifier"""
+        weights, weight_scales = [], []
+        for coef in model.coefs_:
+            coef = np.asarray(coef, dtype=np.float64)
+            weight_scale = float(np.abs(coef).max()) / 127 or 1.0
+            weights.append(np.rint(coef / weight_scale).astype(np.int8))
+            weight_scales.append(weight_scale)
+        biases = [np.asarray(intercept, dtype=np.float32) for intercept in model.intercepts_]
+
+        n_features = weights[0].shape[0]
+        mean = getattr(scaler, 'mean_', None)
+        scale = getattr(scaler, 'scale_', None)
+        mean = np.zeros(n_features) if mean is None else np.asarray(mean, dtype=np.float64)
+        scale = np.ones(n_features) if scale is None else np.asarray(scale, dtype=np.float64)
+        return cls(weights, weight_scales, biases, mean, scale, model.activation, model.out_activation_,
+                   np.asarray(model.classes_))
+
+    @property
+    def nbytes(self) -> int:
+        return sum(weight.nbytes for weight in self.weights) + sum(bias.nbytes for bias in self.biases)
+
+    def predict_proba(self, features) -> np.ndarray:
+        """Class probabilities for raw (unscaled) feature rows"""
+        x = np.asarray(features, dtype=np.float64)
+        if x.ndim != 2 or x.shape[1] != self.n_features_in_:
+            raise ValueError(f"X has {x.shape[-1]} features, but the model is expecting {self.n_features_in_} features as input")
+
+        x = ((x - self.mean) / self.scale).astype(np.float32)
+        hidden = ACTIVATIONS[self.activation]
+        last = len(self.weights) - 1
+        for layer, (weight, weight_scale, bias) in enumerate(zip(self.weights, self.weight_scales, self.biases)):
+            quantized, row_scale = _quantize_rows(x)
+            x = _int8_matmul(quantized, weight)
+            x *= row_scale * weight_scale
+            x += bias
+            if layer < last:
+                x = hidden(x)
+        x = ACTIVATIONS[self.out_activation](x.astype(np.float64))
+
+        if x.shape[1] == 1:
+            x = np.hstack([1 - x, x])
+        return x
+
+    def predict(self, features) -> np.ndarray:
+        return self.classes_[np.argmax(self.predict_proba(features), axis=1)]
+
+
+class MLPSummary:
+    """Labels and shape of a fitted MLP without its weights.
+
+    Stands in for the float model once the int8 engine has replaced it,
+    so the float weights are not kept resident next to the int8 copy.
+    """
+
+    def __init__(self, model):
+        self.classes_ = np.asarray(model.classes_)
+        self.n_features_in_ = model.coefs_[0].shape[0]
+        self.layer_sizes = [coef.shape[1] for coef in model.coefs_]
+        self.activation = model.activation
+        self.out_activation_ = model.out_activation_
+
+
+def load_calibration(path: str) -> Optional[np.ndarray]:
+    """Stored calibration feature rows, or None when there are none"""
+    try:
+        rows = np.load(path)
+    except (OSError, ValueError):
+        return None
+    return rows if rows.ndim == 2 and len(rows) else None
+
+
+def build_quantized_engine(model, scaler=None, calibration: Optional[np.ndarray] = None,
+                           min_agreement: float = 0.99,
+                           max_difference: float = 0.05) -> Tuple[Optional[QuantizedMLP], Dict]:
+    """Int8 engine and its calibration report; the engine is None when it fails the guardrail.
+
+    Predictions on the calibration rows (or probe rows around the scaler's
+    distribution when no calibration set is stored) must agree with the
+    float model on at least min_agreement of the labels and stay within
+    max_difference in every probability.
+    """
+    report = {'enabled': False}
+    if model is None or not hasattr(model, 'coefs_'):
+        return None, report
+    try:
+        engine = QuantizedMLP.from_sklearn(model, scaler)
+        source = 'stored' if calibration is not None else 'probe'
+        rows = calibration if calibration is not None else probe_inputs(engine.n_features_in_, scaler, rows=512)
+        expected = model.predict_proba(scaler.transform(rows) if scaler is not None else rows)
+        actual = engine.predict_proba(rows)
+    except Exception as e:
+        print(f"Warning: int8 inference engine unavailable: {e}")
+        return None, report
+
+    agreement = float(np.mean(np.argmax(expected, axis=1) == np.argmax(actual, axis=1)))
+    difference = float(np.max(np.abs(expected - actual)))
+    report.update(
+        calibration_source=source,
+        calibration_rows=int(len(rows)),
+        agreement=agreement,
+        max_difference=difference,
+        weight_bytes=engine.nbytes,
+        float_weight_bytes=sum(coef.nbytes for coef in model.coefs_) + sum(bias.nbytes for bias in model.intercepts_)
+    )
+    if agreement < min_agreement or difference > max_difference:
+        print(f"Warning: int8 engine disagrees on calibration rows (agreement {agreement:.3f}, "
+              f"max diff {difference:.3g}), disabling it")
+        return None, report
+    report['enabled'] = True
+    print(f"Int8 inference engine calibrated on {len(rows)} {source} rows (agreement {agreement:.3f})")
+    return engine, report
+
+
+def main(argv: Optional[List[str]] = None):
+    parser = argparse.ArgumentParser(description='Store feature rows for calibrating the int8 inference engine')
+    parser.add_argument('corpus', nargs='+', help='Source files or directories to extract rows from')
+    parser.add_argument('--output', default=CALIBRATION_PATH)
+    args = parser.parse_args(argv)
+
+    from enhanced_analyzer import EnhancedCodeAnalyzer
+    from fast_model import read_corpus
+    analyzer = EnhancedCodeAnalyzer(load_models=False)
+    codes = [code for code in dict.fromkeys(read_corpus(args.corpus)) if code.strip()]
+    rows = np.asarray([analyzer.extract_features_fast(code) for code in codes], dtype=np.float64)
+    directory = os.path.dirname(args.output)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    np.save(args.output, rows)
+    print(f"Saved {len(rows)} calibration rows to {args.output}")
+
+
+if __name__ == '__main__':
+    main(sys.argv[1:])
@@ -0,0 +1,219 @@
+import os
+import sys
+import json
+import time
+import shutil
+import hashlib
+import argparse
+import joblib
+import numpy as np
+from typing import Dict, List, Optional, Tuple
+from mlp_engine import FoldedMLP
+
+# Directory holding the exported .npy arrays and their manifest
+BUNDLE_DIR = 'models/bundle'
+MANIFEST_NAME = 'manifest.json'
+BUNDLE_FORMAT = 1
+
+# Pickled artifacts in load order: the improved models win over the simple ones
+PICKLE_CANDIDATES = {
+    'neural model': ['improved_neural_model.pkl', 'simple_neural_model.pkl'],
+    'scaler': ['improved_scaler.pkl', 'simple_neural_scaler.pkl'],
+    'label encoder': ['improved_label_encoder.pkl', 'simple_neural_label_encoder.pkl']
+}
+
+
+class MLPParameters:
+    """Read-only stand-in for a fitted MLPClassifier, backed by bundle arrays"""
+
+    def __init__(self, coefs: List[np.ndarray], intercepts: List[np.ndarray], activation: str,
+                 out_activation: str, classes: np.ndarray):
+        self.coefs_ = coefs
+        self.intercepts_ = intercepts
+        self.activation = activation
+        self.out_activation_ = out_activation
+        self.classes_ = classes
+        self.n_features_in_ = coefs[0].shape[0]
+        self._forward = FoldedMLP(coefs, intercepts, activation, out_activation, classes)
+
+    def predict_proba(self, features_scaled) -> np.ndarray:
+        return self._forward.predict_proba(features_scaled)
+
+
+class ScalerParameters:
+    """Read-only stand-in for a fitted StandardScaler"""
+
+    def __init__(self, mean: np.ndarray, scale: np.ndarray):
+        self.mean_ = mean
+        self.scale_ = scale
+        self.n_features_in_ = len(mean)
+
+    def transform(self, features) -> np.ndarray:
+        return (np.asarray(features, dtype=np.float64) - self.mean_) / self.scale_
+
+
+class LabelParameters:
+    """Read-only stand-in for a fitted LabelEncoder"""
+
+    def __init__(self, classes: np.ndarray):
+        self.classes_ = classes
+
+    def inverse_transform(self, labels) -> np.ndarray:
+        return self.classes_[np.asarray(labels, dtype=np.intp)]
+
+
+class ModelBundle:
+    """Model, scaler and label classes memory-mapped from an exported bundle"""
+
+    def __init__(self, neural_model: MLPParameters, scaler: ScalerParameters,
+                 label_encoder: Optional[LabelParameters], manifest: Dict):
+        self.neural_model = neural_model
+        self.scaler = scaler
+        self.label_encoder = label_encoder
+        self.manifest = manifest
+
+    @property
+    def checksum(self) -> str:
+        return self.manifest['checksum']
+
+
+def load_pickles(directory: str = 'models') -> Tuple[object, object, object]:
+    """(neural model, scaler, label encoder) from the first pickle of each kind found"""
+    loaded = []
+    for kind, names in PICKLE_CANDIDATES.items():
+        artifact = None
+        for name in names:
+            path = os.path.join(directory, name)
+            if os.path.exists(path):
+                artifact = joblib.load(path)
+                print(f"Loaded {kind} from {name}")
+                break
+        loaded.append(artifact)
+    return tuple(loaded)
+
+
+def _file_digest(path: str) -> str:
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(1 << 20), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def _manifest_checksum(files: Dict[str, Dict]) -> str:
+    """Digest over every array's name and file digest, in name order"""
+    digest = hashlib.sha256()
+    for name in sorted(files):
+        digest.update(f"{name}:{files[name]['sha256']}\n".encode('utf-8'))
+    return digest.hexdigest()
+
+
+def _plain_array(values) -> np.ndarray:
+    # Object arrays would need pickle to load, so labels are stored as text
+    array = np.asarray(values)
+    return array.astype(str) if array.dtype == object else array
+
+
+def export_bundle(neural_model, scaler, label_encoder=None, directory: str = BUNDLE_DIR) -> Dict:
+    """Write the model as .npy arrays plus a manifest; returns the manifest.
+
+    The bundle is assembled next to the target and renamed into place, so
+    a reader never sees a half-written directory.
+    """
+    n_features = neural_model.coefs_[0].shape[0]
+    mean = getattr(scaler, 'mean_', None)
+    scale = getattr(scaler, 'scale_', None)
+    if mean is None or not getattr(scaler, 'with_mean', True):
+        mean = np.zeros(n_features)
+    if scale is None or not getattr(scaler, 'with_std', True):
+        scale = np.ones(n_features)
+
+    arrays = {'scaler_mean': mean, 'scaler_scale': scale, 'classes': _plain_array(neural_model.classes_)}
+    for layer, (coef, intercept) in enumerate(zip(neural_model.coefs_, neural_model.intercepts_)):
+        arrays[f'coef_{layer}'] = np.asarray(coef, dtype=np.float64)
+        arrays[f'intercept_{layer}'] = np.asarray(intercept, dtype=np.float64)
+    if label_encoder is not None:
+        arrays['label_classes'] = _plain_array(label_encoder.classes_)
+
+    staging = directory.rstrip('/\\') + '.tmp'
+    shutil.rmtree(staging, ignore_errors=True)
+    os.makedirs(staging)
+    files = {}
+    for name, values in arrays.items():
+        path = os.path.join(staging, f'{name}.npy')
+        np.save(path, np.ascontiguousarray(values), allow_pickle=False)
+        files[name] = {'sha256': _file_digest(path), 'shape': list(np.shape(values)), 'dtype': str(np.asarray(values).dtype)}
+
+    manifest = {
+        'format': BUNDLE_FORMAT,
+        'layers': len(neural_model.coefs_),
+        'n_features': int(n_features),
+        'activation': neural_model.activation,
+        'out_activation': neural_model.out_activation_,
+        'files': files,
+        'checksum': _manifest_checksum(files),
+        'created': time.strftime('%Y-%m-%dT%H:%M:%S')
+    }
+    with open(os.path.join(staging, MANIFEST_NAME), 'w') as f:
+        json.dump(manifest, f, indent=2)
+
+    if os.path.isdir(directory):
+        retired = directory.rstrip('/\\') + '.old'
+        shutil.rmtree(retired, ignore_errors=True)
+        os.replace(directory, retired)
+        os.replace(staging, directory)
+        shutil.rmtree(retired, ignore_errors=True)
+    else:
+        os.replace(staging, directory)
+    return manifest
+
+
+def load_bundle(directory: str = BUNDLE_DIR, verify: bool = True) -> Optional[ModelBundle]:
+    """Memory-map an exported bundle read-only, or None when there is none.
+
+    With verify, every array file is hashed against the manifest first;
+    a mismatch raises ValueError rather than serving a corrupt model.
+    """
+    manifest_path = os.path.join(directory, MANIFEST_NAME)
+    if not os.path.exists(manifest_path):
+        return None
+    with open(manifest_path) as f:
+        manifest = json.load(f)
+    if manifest.get('format') != BUNDLE_FORMAT:
+        raise ValueError(f"Unsupported bundle format {manifest.get('format')}")
+
+    files = manifest['files']
+    if verify:
+        if _manifest_checksum(files) != manifest['checksum']:
+            raise ValueError("Bundle manifest checksum mismatch")
+        for name, entry in files.items():
+            if _file_digest(os.path.join(directory, f'{name}.npy')) != entry['sha256']:
+                raise ValueError(f"Bundle array {name} does not match its checksum")
+
+    def array(name: str) -> np.ndarray:
+        return np.load(os.path.join(directory, f'{name}.npy'), mmap_mode='r', allow_pickle=False)
+
+    layers = range(manifest['layers'])
+    neural_model = MLPParameters([array(f'coef_{layer}') for layer in layers],
+                                 [array(f'intercept_{layer}') for layer in layers],
+                                 manifest['activation'], manifest['out_activation'], np.asarray(array('classes')))
+    scaler = ScalerParameters(array('scaler_mean'), array('scaler_scale'))
+    label_encoder = LabelParameters(np.asarray(array('label_classes'))) if 'label_classes' in files else None
+    return ModelBundle(neural_model, scaler, label_encoder, manifest)
+
+
+def main(argv: Optional[List[str]] = None):
+    parser = argparse.ArgumentParser(description='Export the pickled models to a memory-mappable bundle')
+    parser.add_argument('--models', default='models', help='Directory with the pickled models')
+    parser.add_argument('--output', default=BUNDLE_DIR)
+    args = parser.parse_args(argv)
+
+    neural_model, scaler, label_encoder = load_pickles(args.models)
+    if neural_model is None or not hasattr(neural_model, 'coefs_'):
+        parser.error(f"No MLP model found in {args.models}")
+    manifest = export_bundle(neural_model, scaler, label_encoder, args.output)
+    print(f"Exported {manifest['layers']}-layer model to {args.output} (checksum {manifest['checksum'][:16]})")
+
+
+if __name__ == '__main__':
+    main(sys.argv[1:])
@@ -0,0 +1,181 @@
+import time
+import hashlib
+import pickle
+import threading
+from collections import deque
+import numpy as np
+from typing import Dict, Optional
+from feature_engine import FEATURE_COUNT
+from metrics import REGISTRY
+from mlp_engine import build_engine
+from model_bundle import load_bundle, load_pickles
+
+# Candidate model scored next to the live one; same layout as the models directory
+SHADOW_DIR = 'models/shadow'
+
+# Absolute differences between the live and shadow AI probabilities
+DIFFERENCE_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.2, 0.3, 0.5, 1.0)
+
+
+class ShadowModel:
+    """A candidate network and scaler that never decides a response"""
+
+    def __init__(self, neural_model, scaler, version: str, model_format: str):
+        self.neural_model = neural_model
+        self.scaler = scaler
+        self.version = version
+        self.model_format = model_format
+        self.engine = build_engine(neural_model, scaler)
+
+    def predict_proba(self, matrix: np.ndarray) -> np.ndarray:
+        if self.engine is not None:
+            return self.engine.predict_proba(matrix)
+        return self.neural_model.predict_proba(self.scaler.transform(matrix))
+
+
+def load_shadow_model(directory: str = SHADOW_DIR) -> Optional[ShadowModel]:
+    """Shadow model from a bundle or pickles in directory, or None when there is none"""
+    bundle = load_bundle(directory)
+    if bundle is not None:
+        neural_model, scaler = bundle.neural_model, bundle.scaler
+        version, model_format = bundle.checksum[:16], 'bundle'
+    else:
+        neural_model, scaler, _ = load_pickles(directory)
+        if neural_model is None or scaler is None:
+            return None
+        payload = pickle.dumps((neural_model, scaler), protocol=pickle.HIGHEST_PROTOCOL)
+        version, model_format = hashlib.blake2b(payload, digest_size=8).hexdigest(), 'pickle'
+    if getattr(neural_model, 'n_features_in_', FEATURE_COUNT) != FEATURE_COUNT:
+        raise ValueError(f"shadow model expects {neural_model.n_features_in_} features, not {FEATURE_COUNT}")
+    return ShadowModel(neural_model, scaler, version, model_format)
+
+
+def _ai_probabilities(probabilities: np.ndarray) -> np.ndarray:
+    # Same reading of a probability row as the live responses
+    return probabilities[:, 1] if probabilities.shape[1] > 1 else probabilities[:, 0]
+
+
+class ShadowScorer:
+    """Scores live feature rows with a shadow model on a background thread.
+
+    Requests only append the rows they already scored to a bounded queue;
+    every tick the thread drains up to max_batch rows, scores them with one
+    call and records agreement and latency against the live model. When the
+    queue is full new rows are dropped and counted, never waited for.
+    """
+
+    def __init__(self, interval: float = 0.5, max_batch: int = 512, max_pending: int = 8192):
+        self.interval = interval
+        self.max_batch = max_batch
+        self.max_pending = max_pending
+        self._pending = deque()
+        self._pending_rows = 0
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._dropped = 0
+
+        # Running totals per shadow version, so a reload starts a fresh comparison
+        self._totals = {}
+        self._latest = None
+        self._thread = threading.Thread(target=self._run, name='shadow-scorer', daemon=True)
+        self._thread.start()
+
+    def submit(self, shadow: ShadowModel, matrix: np.ndarray, probabilities: np.ndarray, live_seconds: float):
+        """Queue rows the live model scored in live_seconds; never blocks"""
+        rows = len(matrix)
+        with self._lock:
+            if self._pending_rows + rows > self.max_pending:
+                self._dropped += rows
+                dropped = True
+            else:
+                self._pending.append((shadow, matrix, probabilities, live_seconds))
+                self._pending_rows += rows
+                dropped = False
+        if dropped:
+            REGISTRY.inc('analyzer_shadow_dropped_rows_total', rows, 'Rows not shadow-scored because the queue was full')
+
+    def stop(self):
+        self._stop.set()
+        self._thread.join()
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            while self._drain():
+                pass
+
+    def _drain(self) -> bool:
+        """Score one batch per shadow model from the queue; False when it was empty"""
+        batch = []
+        with self._lock:
+            rows = 0
+            while self._pending and rows < self.max_batch:
+                item = self._pending.popleft()
+                batch.append(item)
+                rows += len(item[1])
+            self._pending_rows -= rows
+        if not batch:
+            return False
+
+        # A reload can change the shadow model between requests; score each separately
+        by_model = {}
+        for shadow, matrix, probabilities, live_seconds in batch:
+            by_model.setdefault(id(shadow), (shadow, []))[1].append((matrix, probabilities, live_seconds))
+        for shadow, items in by_model.values():
+            try:
+                self._score(shadow, items)
+            except Exception as e:
+                REGISTRY.inc('analyzer_shadow_errors_total', 1, 'Shadow batches that failed to score', shadow_version=shadow.version)
+                print(f"Warning: shadow scoring failed: {e}")
+        return True
+
+    def _score(self, shadow: ShadowModel, items):
+        matrix = np.concatenate([item[0] for item in items])
+        live = np.concatenate([item[1] for item in items])
+        live_seconds = sum(item[2] for item in items)
+
+        start = time.perf_counter()
+        shadow_probabilities = shadow.predict_proba(matrix)
+        shadow_seconds = time.perf_counter() - start
+
+        agreed = int(np.count_nonzero(np.argmax(live, axis=1) == np.argmax(shadow_probabilities, axis=1)))
+        rows = len(matrix)
+        difference = np.abs(_ai_probabilities(live) - _ai_probabilities(shadow_probabilities))
+
+        labels = {'shadow_version': shadow.version}
+        REGISTRY.inc('analyzer_shadow_rows_total', agreed, 'Shadow-scored rows by agreement with the live model',
+                     outcome='agree', **labels)
+        REGISTRY.inc('analyzer_shadow_rows_total', rows - agreed, 'Shadow-scored rows by agreement with the live model',
+                     outcome='disagree', **labels)
+        for value in difference:
+            REGISTRY.observe('analyzer_shadow_probability_difference', float(value),
+                             'Absolute AI probability difference between the live and shadow models',
+                             buckets=DIFFERENCE_BUCKETS, **labels)
+
+        with self._lock:
+            totals = self._totals.setdefault(shadow.version, {'rows': 0, 'agreed': 0, 'live_seconds': 0.0, 'shadow_seconds': 0.0})
+            self._latest = shadow.version
+            totals['rows'] += rows
+            totals['agreed'] += agreed
+            totals['live_seconds'] += live_seconds
+            totals['shadow_seconds'] += shadow_seconds
+            agreement = totals['agreed'] / totals['rows']
+            latency_delta = (totals['shadow_seconds'] - totals['live_seconds']) / totals['rows']
+        REGISTRY.set_gauge('analyzer_shadow_agreement_ratio', agreement, 'Share of shadow-scored rows where both models agree', **labels)
+        REGISTRY.set_gauge('analyzer_shadow_latency_delta_seconds', latency_delta,
+                           'Mean per-row model time of the shadow minus the live model', **labels)
+
+    def stats(self) -> Dict:
+        """Comparison totals for the most recently scored shadow version"""
+        with self._lock:
+            totals = dict(self._totals.get(self._latest, {'rows': 0, 'agreed': 0, 'live_seconds': 0.0, 'shadow_seconds': 0.0}))
+            version, pending, dropped = self._latest, self._pending_rows, self._dropped
+        rows = totals['rows']
+        return {
+            'shadow_version': version,
+            'rows_scored': rows,
+            'rows_pending': pending,
+            'rows_dropped': dropped,
+            'agreement': totals['agreed'] / rows if rows else None,
+            'live_seconds_per_row': totals['live_seconds'] / rows if rows else None,
+            'shadow_seconds_per_row': totals['shadow_seconds'] / rows if rows else None
+        }
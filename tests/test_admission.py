@@ -0,0 +1,201 @@
+"""Admission control: the small-request budget, the large-upload lane and Retry-After."""
+import io
+import threading
+import time
+import zipfile
+
+import pytest
+
+from admission import AdmissionController
+from metrics import REGISTRY
+
+THRESHOLD = 1000
+
+
+def _estimate(size):
+    # One second per 100 bytes, so costs are easy to read
+    return size / 100
+
+
+def _controller(capacity=10.0, max_large=1, max_wait=0.0):
+    return AdmissionController(capacity, max_large, THRESHOLD, _estimate, max_wait)
+
+
+def _wait_count(outcome):
+    series = REGISTRY._values.get('analyzer_admission_wait_seconds', {}).get((('outcome', outcome),))
+    return series[2] if series else 0
+
+
+def test_small_requests_share_the_budget_and_are_turned_away_with_503():
+    controller = _controller()
+    first, second = controller.admit(600), controller.admit(400)
+    assert first.admitted and second.admitted and first.lane == second.lane == 'small'
+    assert controller.stats()['cost']['small'] == pytest.approx(10.0)
+
+    rejected = controller.admit(100)
+    assert not rejected.admitted and rejected.status == 503 and rejected.lane == 'small'
+    controller.release(first)
+    assert controller.admit(100).admitted
+
+
+def test_an_idle_small_lane_admits_a_request_over_the_budget():
+    controller = _controller(capacity=1.0)
+    assert controller.admit(THRESHOLD).admitted
+
+
+def test_a_small_request_waits_for_budget_to_free_up():
+    controller = _controller(max_wait=2.0)
+    held = controller.admit(1000)
+    admitted_before = _wait_count('admitted')
+    timer = threading.Timer(0.1, controller.release, args=(held,))
+    timer.start()
+    started = time.perf_counter()
+    ticket = controller.admit(500)
+    waited = time.perf_counter() - started
+    timer.join()
+
+    assert ticket.admitted
+    assert 0.05 < waited < 1.5
+    assert _wait_count('admitted') == admitted_before + 1
+
+
+def test_a_small_request_is_rejected_once_its_wait_runs_out():
+    controller = _controller(max_wait=0.1)
+    controller.admit(1000)
+    rejected_before = _wait_count('rejected')
+    started = time.perf_counter()
+    ticket = controller.admit(500)
+    assert not ticket.admitted and ticket.status == 503
+    assert time.perf_counter() - started >= 0.1
+    assert _wait_count('rejected') == rejected_before + 1
+
+
+def test_large_requests_take_their_own_slots_and_are_rejected_at_once_with_429():
+    controller = _controller(max_wait=5.0)
+    # Unknown lengths count as large
+    held = controller.admit(None)
+    assert held.admitted and held.lane == 'large'
+
+    started = time.perf_counter()
+    rejected = controller.admit(THRESHOLD + 1)
+    assert not rejected.admitted and rejected.status == 429 and rejected.lane == 'large'
+    assert time.perf_counter() - started < 1.0
+    # A busy large lane does not take budget from small requests
+    assert controller.admit(500).admitted
+
+    controller.release(held)
+    assert controller.admit(THRESHOLD + 1).admitted
+
+
+def test_retry_after_follows_the_service_time_of_the_lane():
+    controller = _controller(max_large=1)
+    assert controller.admit(None).retry_after == 0
+    assert controller.admit(None).retry_after == 10
+
+    controller = _controller(max_large=1)
+    # Each release moves the estimate a fifth of the way to the elapsed time
+    for _ in range(40):
+        controller.release(controller.admit(None), elapsed=2.2)
+    controller.admit(None)
+    assert controller.stats()['service_time']['large'] == pytest.approx(2.2, abs=0.01)
+    assert controller.admit(None).retry_after == 3
+
+    small = _controller(capacity=1.0)
+    small.admit(100)
+    assert small.admit(100).retry_after == 1
+
+
+def test_release_is_idempotent_and_ignores_rejected_tickets():
+    controller = _controller()
+    ticket = controller.admit(500)
+    controller.release(ticket)
+    controller.release(ticket)
+    controller.release(controller.admit(None))
+    controller.admit(None)
+    controller.release(controller.admit(None))
+    assert controller.stats()['in_flight'] == {'small': 0, 'large': 1}
+    assert controller.stats()['cost']['small'] == 0.0
+
+
+def test_resize_keeps_a_ticket_that_still_covers_the_request():
+    controller = _controller()
+    ticket = controller.admit(500)
+    assert controller.resize(ticket, 300) is ticket
+    assert controller.stats()['in_flight']['small'] == 1
+
+
+def test_resize_charges_the_extracted_size_in_the_small_lane():
+    controller = _controller()
+    controller.admit(500)
+    ticket = controller.resize(controller.admit(100), 400)
+    assert ticket.admitted and ticket.cost == 4.0
+    assert controller.stats()['cost']['small'] == pytest.approx(9.0)
+    assert controller.stats()['in_flight']['small'] == 2
+
+    rejected = controller.resize(ticket, 600)
+    assert not rejected.admitted and rejected.status == 503
+    assert controller.stats()['cost']['small'] == pytest.approx(5.0)
+
+
+def test_resize_moves_a_request_that_decompresses_past_the_threshold_to_the_large_lane():
+    controller = _controller(max_large=1)
+    ticket = controller.resize(controller.admit(200), THRESHOLD * 10)
+    assert ticket.admitted and ticket.lane == 'large'
+    assert controller.stats()['in_flight'] == {'small': 0, 'large': 1}
+
+    rejected = controller.resize(controller.admit(200), THRESHOLD * 10)
+    assert not rejected.admitted and rejected.status == 429
+    assert controller.stats()['in_flight'] == {'small': 0, 'large': 1}
+
+
+@pytest.fixture(scope='module')
+def app_module():
+    import enhanced_app
+    enhanced_app.analyzer.wait_for_models(30)
+    return enhanced_app
+
+
+@pytest.fixture
+def admission(app_module, monkeypatch):
+    controller = AdmissionController(4.0, 1, app_module.STREAM_UPLOAD_THRESHOLD, app_module.estimate_processing_time)
+    monkeypatch.setattr(app_module, 'admission', controller)
+    return controller
+
+
+def test_rejections_carry_a_retry_after_header(app_module):
+    controller = _controller()
+    controller.admit(None)
+    ticket = controller.admit(None)
+    body, status, headers = app_module.admission_rejection(ticket)
+    assert status == 429 and headers == {'Retry-After': '10'}
+    assert body['retry_after'] == 10 and 'Retry in 10s' in body['error']
+
+
+def test_the_app_turns_a_large_upload_away_while_the_large_lane_is_full(app_module, admission):
+    held = admission.admit(None)
+    client = app_module.app.test_client()
+    response = client.post('/analyze', json={'code': 'x' * app_module.STREAM_UPLOAD_THRESHOLD})
+    assert response.status_code == 429
+    assert response.headers['Retry-After'] == '10'
+    assert response.get_json()['retry_after'] == 10
+
+    admission.release(held)
+    assert client.post('/analyze', json={'code': 'x = 1\n'}).status_code == 200
+    assert admission.stats()['in_flight'] == {'small': 0, 'large': 0}
+
+
+def test_the_app_admits_a_zip_again_at_its_extracted_size(app_module, admission):
+    text = 'value = 1\n' * (app_module.STREAM_UPLOAD_THRESHOLD // 10 + 1)
+    archive = io.BytesIO()
+    with zipfile.ZipFile(archive, 'w', zipfile.ZIP_DEFLATED) as zf:
+        zf.writestr('big.py', text)
+    data = archive.getvalue()
+    assert len(data) < app_module.STREAM_UPLOAD_THRESHOLD < len(text)
+
+    held = admission.admit(None)
+    response = app_module.app.test_client().post('/upload', data={'file': (io.BytesIO(data), 'big.zip')},
+                                                 content_type='multipart/form-data')
+    assert response.status_code == 429 and 'Retry-After' in response.headers
+    # The rejected request gave its small-lane ticket back
+    assert admission.stats()['in_flight'] == {'small': 0, 'large': 1}
+    admission.release(held)
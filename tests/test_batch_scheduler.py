@@ -0,0 +1,161 @@
+"""The micro-batcher: how requests are grouped, how many batches run and what callers get back."""
+import threading
+import time
+
+import pytest
+
+from batch_scheduler import MicroBatcher
+from enhanced_analyzer import EnhancedCodeAnalyzer
+
+SNIPPETS = ['def f(x):\n    return x + 1\n', 'class A:\n    pass\n', 'for i in range(3):\n    print(i)\n',
+            'import os\nprint(os.getcwd())\n', 'x = [i * i for i in range(10)]\n',
+            '// comment\nfunction g() { return 1; }\n']
+
+
+class RecordingPredictor:
+    """predict_batch stand-in that records its batches and can hold them open"""
+
+    def __init__(self, fail_mode=None):
+        self.batches = []
+        self.gate = threading.Event()
+        self.gate.set()
+        self.fail_mode = fail_mode
+        self.active = 0
+        self.max_active = 0
+        self._lock = threading.Lock()
+
+    def __call__(self, codes, mode):
+        with self._lock:
+            self.batches.append((list(codes), mode))
+            self.active += 1
+            self.max_active = max(self.max_active, self.active)
+        try:
+            self.gate.wait(10)
+            if mode == self.fail_mode:
+                raise ValueError(f'{mode} model failed')
+            return [{'code': code, 'mode': mode} for code in codes]
+        finally:
+            with self._lock:
+                self.active -= 1
+
+
+def _wait_for(condition, timeout=5.0):
+    deadline = time.time() + timeout
+    while not condition() and time.time() < deadline:
+        time.sleep(0.005)
+    return condition()
+
+
+@pytest.fixture
+def make_batcher():
+    batchers = []
+
+    def make(predict_batch, **kwargs):
+        batcher = MicroBatcher(predict_batch, **kwargs)
+        batchers.append(batcher)
+        return batcher
+
+    yield make
+    for batcher in batchers:
+        batcher.close()
+
+
+def test_a_request_that_would_pass_max_chars_starts_the_next_batch(make_batcher):
+    predictor = RecordingPredictor()
+    predictor.gate.clear()
+    batcher = make_batcher(predictor, window=0.0, max_chars=10, concurrency=1)
+    # Hold the only slot so the next requests queue up together
+    blocker = batcher.submit('0')
+    assert _wait_for(lambda: predictor.active == 1)
+    futures = [batcher.submit(code) for code in ('aaaaaa', 'bbbbbb', 'cc', 'ddd')]
+    predictor.gate.set()
+
+    assert blocker.result(5) == {'code': '0', 'mode': 'full'}
+    assert [future.result(5)['code'] for future in futures] == ['aaaaaa', 'bbbbbb', 'cc', 'ddd']
+    assert [codes for codes, _ in predictor.batches] == [['0'], ['aaaaaa'], ['bbbbbb', 'cc'], ['ddd']]
+    assert all(sum(map(len, codes)) <= 10 for codes, _ in predictor.batches)
+
+
+def test_a_request_over_max_chars_is_not_accepted(make_batcher):
+    batcher = make_batcher(RecordingPredictor(), max_chars=10)
+    assert batcher.accepts('x' * 10)
+    assert not batcher.accepts('x' * 11)
+
+
+def test_requests_arriving_within_the_window_share_a_batch(make_batcher):
+    predictor = RecordingPredictor()
+    batcher = make_batcher(predictor, window=0.5, max_items=3)
+    futures = [batcher.submit(code) for code in 'abcd']
+    assert [future.result(5)['code'] for future in futures] == list('abcd')
+    # max_items closes the first batch before its window runs out
+    assert [codes for codes, _ in predictor.batches] == [['a', 'b', 'c'], ['d']]
+
+
+def test_no_more_than_concurrency_batches_run_and_waiting_requests_join_one_batch(make_batcher):
+    predictor = RecordingPredictor()
+    predictor.gate.clear()
+    batcher = make_batcher(predictor, window=0.0, concurrency=2)
+    first = [batcher.submit('a')]
+    assert _wait_for(lambda: predictor.active == 1)
+    first.append(batcher.submit('b'))
+    assert _wait_for(lambda: predictor.active == 2)
+
+    waiting = [batcher.submit(code) for code in 'cde']
+    time.sleep(0.1)
+    assert predictor.active == 2 and len(predictor.batches) == 2
+    assert not any(future.done() for future in first + waiting)
+
+    predictor.gate.set()
+    assert [future.result(5)['code'] for future in first + waiting] == list('abcde')
+    assert predictor.max_active == 2
+    assert [codes for codes, _ in predictor.batches] == [['a'], ['b'], ['c', 'd', 'e']]
+
+
+def test_a_failing_batch_fails_only_its_own_mode(make_batcher):
+    predictor = RecordingPredictor(fail_mode='fast')
+    batcher = make_batcher(predictor, window=0.5, max_items=4, concurrency=1)
+    futures = [batcher.submit('a', 'full'), batcher.submit('b', 'fast'), batcher.submit('c', 'fast'),
+               batcher.submit('d', 'full')]
+
+    assert futures[0].result(5) == {'code': 'a', 'mode': 'full'}
+    assert futures[3].result(5) == {'code': 'd', 'mode': 'full'}
+    for future in futures[1:3]:
+        with pytest.raises(ValueError, match='fast model failed'):
+            future.result(5)
+    assert sorted(predictor.batches) == [(['a', 'd'], 'full'), (['b', 'c'], 'fast')]
+
+    # The failure released its slot, so later requests still run
+    assert batcher.predict('e') == {'code': 'e', 'mode': 'full'}
+
+
+def test_close_dispatches_the_requests_already_queued():
+    predictor = RecordingPredictor()
+    batcher = MicroBatcher(predictor, window=0.5)
+    futures = [batcher.submit(code) for code in 'abc']
+    batcher.close()
+    assert all(future.done() for future in futures)
+    assert [future.result()['code'] for future in futures] == list('abc')
+
+
+def _without_timings(result):
+    return {key: value for key, value in result.items() if key not in ('timings', 'processing_time')}
+
+
+@pytest.mark.parametrize('mode', ['full', 'fast'])
+def test_batched_predictions_equal_direct_predictions(make_batcher, mode):
+    direct = EnhancedCodeAnalyzer(load_models=False)
+    batched = EnhancedCodeAnalyzer(load_models=False)
+    batcher = make_batcher(batched.predict_batch, window=0.05, max_chars=200)
+    results = [None] * len(SNIPPETS)
+
+    def predict(i):
+        results[i] = batcher.predict(SNIPPETS[i], mode)
+
+    threads = [threading.Thread(target=predict, args=(i,)) for i in range(len(SNIPPETS))]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    expected = [direct.predict_batch([code], mode)[0] for code in SNIPPETS]
+    assert [_without_timings(result) for result in results] == [_without_timings(result) for result in expected]
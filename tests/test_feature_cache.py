@@ -0,0 +1,236 @@
+"""The in-memory and SQLite feature caches, and the prediction cache built on them."""
+import multiprocessing
+import os
+import pickle
+import sqlite3
+import threading
+
+import numpy as np
+import pytest
+
+from enhanced_analyzer import EnhancedCodeAnalyzer
+from feature_cache import DiskFeatureCache, FeatureCache, content_hash
+
+CODE = 'def f(x):\n    return x + 1\n'
+
+
+@pytest.fixture
+def analyzer():
+    return EnhancedCodeAnalyzer(load_models=False)
+
+
+def test_get_returns_a_copy_the_caller_can_mutate():
+    cache = FeatureCache()
+    cache.put('key', {'nested': {'value': 1}, 'items': [1, 2]})
+    first = cache.get('key')
+    first['nested']['value'] = 2
+    first['items'].append(3)
+    assert cache.get('key') == {'nested': {'value': 1}, 'items': [1, 2]}
+
+
+def test_mutating_a_value_after_put_leaves_the_entry_alone():
+    cache = FeatureCache()
+    value = {'nested': {'value': 1}}
+    cache.put('key', value)
+    value['nested']['value'] = 2
+    assert cache.get('key') == {'nested': {'value': 1}}
+
+
+def test_mutating_a_cached_prediction_does_not_corrupt_the_cache(analyzer):
+    first = analyzer.predict_batch([CODE])[0]
+    expected = first['comprehensive_analysis']['complexity']['functions']
+    first['comprehensive_analysis']['complexity']['functions'] = 99
+    first['comprehensive_analysis']['quality'].clear()
+
+    second = analyzer.predict_batch([CODE])[0]
+    assert 'cache_lookup' in second['timings']
+    assert second['comprehensive_analysis']['complexity']['functions'] == expected
+    assert second['comprehensive_analysis']['quality']
+    second['timings']['cache_lookup'] = -1.0
+    assert analyzer.predict_batch([CODE])[0]['timings']['cache_lookup'] >= 0.0
+
+
+def test_repeated_snippets_in_one_batch_get_separate_results(analyzer):
+    first, second = analyzer.predict_batch([CODE, CODE])
+    assert first == second
+    first['comprehensive_analysis']['complexity']['functions'] = 99
+    assert second['comprehensive_analysis']['complexity']['functions'] != 99
+
+
+def _sizes(cache):
+    return cache.stats()['bytes'], cache.stats()['entries']
+
+
+def test_lru_evicts_least_recently_used_entries_to_stay_within_the_byte_budget():
+    cache = FeatureCache(max_bytes=300)
+    for key in 'abc':
+        cache.put(key, 'x', size=100)
+    assert cache.get('a') == 'x'
+    cache.put('d', 'x', size=100)
+
+    assert cache.get('b') is None
+    assert [cache.get(key) for key in 'acd'] == ['x', 'x', 'x']
+    assert _sizes(cache) == (300, 3)
+    assert cache.stats()['evictions'] == 1
+
+
+def test_a_large_entry_evicts_as_many_entries_as_it_needs():
+    cache = FeatureCache(max_bytes=300)
+    for key in 'abc':
+        cache.put(key, 'x', size=100)
+    cache.put('big', 'y', size=250)
+    assert [cache.get(key) for key in 'abc'] == [None, None, None]
+    assert _sizes(cache) == (250, 1)
+
+
+def test_entries_over_the_budget_are_not_cached():
+    cache = FeatureCache(max_bytes=300)
+    cache.put('a', 'x', size=100)
+    cache.put('huge', 'y', size=301)
+    assert cache.get('huge') is None
+    assert _sizes(cache) == (100, 1)
+
+
+def test_entries_are_sized_by_their_pickled_bytes():
+    cache = FeatureCache()
+    value = [0.5] * 1000
+    cache.put('features', value)
+    assert cache.stats()['bytes'] == len(pickle.dumps(value, protocol=pickle.HIGHEST_PROTOCOL))
+
+
+def test_replacing_a_key_updates_its_size():
+    cache = FeatureCache(max_bytes=300)
+    cache.put('a', 'x', size=100)
+    cache.put('a', 'y', size=50)
+    assert cache.get('a') == 'y'
+    assert _sizes(cache) == (50, 1)
+
+
+def test_discard_and_stats():
+    cache = FeatureCache()
+    for key in range(4):
+        cache.put(('features', key), [key], size=10)
+    assert cache.discard(lambda key: key[1] % 2 == 0) == 2
+    assert cache.get(('features', 0)) is None
+    assert cache.get(('features', 1)) == [1]
+    stats = cache.stats()
+    assert (stats['entries'], stats['bytes'], stats['hits'], stats['misses']) == (2, 20, 1, 1)
+    assert stats['hit_rate'] == 0.5
+
+
+def test_content_hash_is_a_stable_digest_of_the_text():
+    assert content_hash(CODE) == content_hash(''.join(CODE))
+    assert len(content_hash(CODE)) == 32
+    assert int(content_hash(CODE), 16) >= 0
+    assert content_hash(CODE) != content_hash(CODE + ' ')
+    assert content_hash('') != content_hash(' ')
+    # Lone surrogates from lossy decoding still hash instead of raising
+    assert content_hash('x = "\ud800"') != content_hash('x = "\ud801"')
+
+
+def test_disk_cache_round_trips_features_and_predictions(tmp_path):
+    cache = DiskFeatureCache(str(tmp_path / 'cache' / 'features.db'))
+    features = [0.1 * i for i in range(80)]
+    cache.put('abc', 'v1', features, {'prediction': 'human', 'confidence': 0.75})
+    assert cache.get_features('abc', 'v1') == features
+    assert cache.get_prediction('abc', 'v1') == {'prediction': 'human', 'confidence': 0.75}
+    assert cache.get_features('abc', 'v2') is None
+    assert cache.get_prediction('abd', 'v1') is None
+    assert (cache.stats()['hits'], cache.stats()['misses']) == (2, 2)
+
+
+def test_disk_cache_upsert_replaces_features_and_keeps_an_existing_prediction(tmp_path):
+    path = str(tmp_path / 'features.db')
+    cache = DiskFeatureCache(path)
+    cache.put('abc', 'v1', [1.0] * 80, {'prediction': 'ai'})
+    cache.put('abc', 'v1', [2.0] * 80)
+    assert cache.get_features('abc', 'v1') == [2.0] * 80
+    assert cache.get_prediction('abc', 'v1') == {'prediction': 'ai'}
+
+    cache.put('abc', 'v1', [3.0] * 80, {'prediction': 'human'})
+    assert cache.get_prediction('abc', 'v1') == {'prediction': 'human'}
+    with sqlite3.connect(path) as conn:
+        assert conn.execute('SELECT COUNT(*) FROM entries').fetchone()[0] == 1
+        assert conn.execute('PRAGMA journal_mode').fetchone()[0] == 'wal'
+
+
+def test_disk_cache_stores_numpy_scalars_as_plain_json(tmp_path):
+    cache = DiskFeatureCache(str(tmp_path / 'features.db'))
+    cache.put('abc', 'v1', np.arange(80, dtype=np.float64), {'confidence': np.float32(0.5), 'count': np.int64(3)})
+    assert cache.get_prediction('abc', 'v1') == {'confidence': 0.5, 'count': 3}
+    assert cache.get_features('abc', 'v1') == [float(i) for i in range(80)]
+
+
+def test_threads_share_the_memory_cache_within_its_budget():
+    cache = FeatureCache(max_bytes=50 * 100)
+    errors = []
+
+    def work(worker):
+        try:
+            for i in range(500):
+                key = (worker, i % 80)
+                cache.put(key, [worker, i], size=100)
+                value = cache.get(key)
+                assert value is None or value[0] == worker
+        except Exception as e:  # pragma: no cover - reported below
+            errors.append(e)
+
+    threads = [threading.Thread(target=work, args=(worker,)) for worker in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert errors == []
+    assert cache.stats()['bytes'] == cache.stats()['entries'] * 100 <= 50 * 100
+
+
+def test_threads_write_and_read_the_disk_cache_on_their_own_connections(tmp_path):
+    cache = DiskFeatureCache(str(tmp_path / 'features.db'))
+    connections = set()
+    started = threading.Barrier(4)
+    errors = []
+
+    def work(worker):
+        try:
+            connections.add(id(cache._connection()))
+            started.wait(10)
+            for i in range(20):
+                cache.put(f'{worker}-{i}', 'v1', [float(worker)] * 80, {'worker': worker})
+                assert cache.get_prediction(f'{worker}-{i}', 'v1') == {'worker': worker}
+        except Exception as e:  # pragma: no cover - reported below
+            errors.append(e)
+
+    threads = [threading.Thread(target=work, args=(worker,)) for worker in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert errors == []
+    assert len(connections) == 4
+    assert cache.stats()['errors'] == 0
+    assert all(cache.get_features(f'{worker}-19', 'v1') == [float(worker)] * 80 for worker in range(4))
+
+
+def _write_from_process(cache, worker):
+    for i in range(20):
+        cache.put(f'{worker}-{i}', 'v1', [float(worker)] * 80, {'pid': os.getpid()})
+    assert cache.stats()['errors'] == 0
+
+
+def test_processes_share_the_disk_cache(tmp_path):
+    path = str(tmp_path / 'features.db')
+    cache = DiskFeatureCache(path)
+    # The forked children inherit this connection and must open their own
+    cache.put('parent', 'v1', [0.0] * 80)
+
+    context = multiprocessing.get_context('fork')
+    processes = [context.Process(target=_write_from_process, args=(cache, worker)) for worker in range(1, 4)]
+    for process in processes:
+        process.start()
+    for process in processes:
+        process.join(30)
+    assert [process.exitcode for process in processes] == [0, 0, 0]
+
+    pids = {cache.get_prediction(f'{worker}-{i}', 'v1')['pid'] for worker in range(1, 4) for i in range(20)}
+    assert len(pids) == 3 and os.getpid() not in pids
+    assert cache.get_features('parent', 'v1') == [0.0] * 80
@@ -0,0 +1,153 @@
+"""The fused, graph subset and streaming extractors against the frozen baseline.
+
+Every live path must produce the baseline's 80 features and comprehensive
+analysis: exactly for the in-memory paths, and to floating-point rounding
+for streaming, whose line-length and indentation spreads are accumulated.
+"""
+import glob
+import math
+import os
+import random
+import numbers
+
+import pytest
+
+from baseline_extractor import BaselineExtractor
+from enhanced_analyzer import EnhancedCodeAnalyzer
+from feature_engine import FEATURE_NAMES, ParsedDocument
+from feature_stream import StreamingFeatureExtractor
+
+pytestmark = pytest.mark.filterwarnings('ignore::RuntimeWarning', 'ignore::SyntaxWarning')
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Whitespace str.split() and str.strip() treat as such but a plain ASCII scan would not
+UNICODE_WHITESPACE = '\x0b\x0c\x1c\x1d\x1e\x1f\x85\xa0\u1680\u2000\u2007\u200a\u2028\u2029\u202f\u205f\u3000'
+
+EDGE_CASES = [
+    '', '\n', '\r\n', '  \n  \n', 'foo\n(1)\n', 'x\n= 1', 'a:\n   int', 'def f(:\n',
+    'if x:\n  pass\nelse:\n  pass\n@dec\ndef g(): pass\n', 'a  \n  \n   \n b', "s = '''\nabc\n'''\n",
+    'x = (1,\n 2)\nclass A:\n    def f(self):\n        return 1\n', '\t\t\n\t x',
+    '# only a comment', '// c style\n/* block\n * star\n */\nint x;', '  # indented\n\t// tabbed\n *',
+    'x = 1  # trailing\ny = "# not a comment"\n', '"""doc\n# inside\n"""\n',
+    'a\u2028b\u2029c\x85d\n', '\u3000\u3000x = 1\n\xa0\xa0y = 2\n', '\x0c\nclass A: pass\x0b\n',
+    '\u2003# em-space comment\n\u00a0// nbsp comment\n', 'caf\xe9 = "\u65e5\u672c"\n\u00e9t\u00e9 = 1\n',
+    'x = 1\r\ny = 2\r\n', 'lambda_functions = [x for x in y]\nwith open(f) as g: pass\n',
+]
+
+# Fragments the random snippets are assembled from
+FRAGMENTS = [
+    'def ', 'class ', 'import ', 'from ', 'return', 'print(', 'lambda x: x', 'yield', 'async ', 'await ',
+    'try:', 'except', 'finally', 'else:', 'elif', 'for ', 'while ', 'if ', 'with ', 'assert ',
+    '#', '//', '/*', '*/', '*', '"""', "'''", '"', "'", 'f"', "f'", 'TODO', 'FIXME', '__init__', '_private',
+    'CONSTANT = ', 'camelCase', 'snake_case', 'PascalCase', 'x += 1', 'y -= 2', '3.14', '42', '[a for a in b]',
+    '(c for c in d)', ': int', ': List[str]', '{', '}', '[', ']', '(', ')', ';', ':', ',', '.',
+    ' ', '  ', '    ', '\t', '\n', '\n', '\n', '\r\n', 'pass', 'break', 'continue', '@decorator',
+]
+
+
+def _read(path):
+    with open(path, 'r', encoding='utf-8', errors='ignore') as f:
+        return f.read()
+
+
+def _corpus():
+    paths = sorted(glob.glob(os.path.join(REPO_ROOT, '*.py')) + glob.glob(os.path.join(REPO_ROOT, '*.js'))
+                   + glob.glob(os.path.join(REPO_ROOT, '*.css')) + glob.glob(os.path.join(REPO_ROOT, '*.html')))
+    return [(os.path.basename(path), _read(path)) for path in paths]
+
+
+def _random_snippets(count, seed=0):
+    rng = random.Random(seed)
+    snippets = []
+    for i in range(count):
+        parts = [rng.choice(FRAGMENTS) if rng.random() < 0.85 else rng.choice(UNICODE_WHITESPACE)
+                 for _ in range(rng.randint(0, 120))]
+        snippets.append((f'random-{i}', ''.join(parts)))
+    return snippets
+
+
+SAMPLES = (_corpus() + [(f'edge-{i}', code) for i, code in enumerate(EDGE_CASES)] + _random_snippets(150)
+           + [('corpus-joined', '\n'.join(code for _, code in _corpus()[:6]))])
+
+
+def _same(expected, actual, rel_tol=0.0):
+    if isinstance(expected, dict) or isinstance(actual, dict):
+        return (isinstance(expected, dict) and isinstance(actual, dict) and expected.keys() == actual.keys()
+                and all(_same(expected[key], actual[key], rel_tol) for key in expected))
+    if isinstance(expected, (bool, str)) or isinstance(actual, (bool, str)):
+        return expected == actual
+    if isinstance(expected, numbers.Number) and isinstance(actual, numbers.Number):
+        expected, actual = float(expected), float(actual)
+        if math.isnan(expected) or math.isnan(actual):
+            return math.isnan(expected) and math.isnan(actual)
+        return expected == actual or math.isclose(expected, actual, rel_tol=rel_tol, abs_tol=rel_tol)
+    return expected == actual
+
+
+def _differences(expected, actual, rel_tol=0.0):
+    assert len(expected) == len(actual) == len(FEATURE_NAMES)
+    return [(FEATURE_NAMES[i], a, b) for i, (a, b) in enumerate(zip(expected, actual)) if not _same(a, b, rel_tol)]
+
+
+@pytest.fixture(scope='module')
+def baseline():
+    return BaselineExtractor()
+
+
+@pytest.fixture(scope='module')
+def analyzer():
+    return EnhancedCodeAnalyzer(load_models=False)
+
+
+@pytest.fixture(scope='module')
+def expected(baseline):
+    return {name: (baseline.extract_features(code), baseline.analyze_code_comprehensive(code)) for name, code in SAMPLES}
+
+
+@pytest.mark.parametrize('name,code', SAMPLES, ids=[name for name, _ in SAMPLES])
+def test_fused_extraction_matches_baseline(name, code, analyzer, expected):
+    features, analysis = expected[name]
+    doc = ParsedDocument(code)
+    assert _differences(features, analyzer._extract_document_features(doc)) == []
+    assert _same(analysis, analyzer.analyze_code_comprehensive(code, doc))
+
+
+@pytest.mark.parametrize('name,code', SAMPLES, ids=[name for name, _ in SAMPLES])
+def test_feature_subset_matches_baseline(name, code, analyzer, expected):
+    features, _ = expected[name]
+    names = random.Random(name).sample(FEATURE_NAMES, 12)
+    subset = analyzer.extract_feature_subset(code, names)
+    assert [subset[feature] for feature in names] == [features[FEATURE_NAMES.index(feature)] for feature in names]
+
+
+@pytest.mark.parametrize('block_size', [1, 2, 7, 64, 1 << 16])
+def test_streaming_matches_baseline(block_size, analyzer, expected):
+    extractor = StreamingFeatureExtractor(analyzer.compiled_patterns, block_size=block_size)
+    rng = random.Random(block_size)
+    failures = []
+    for name, code in SAMPLES:
+        # Chunk boundaries fall anywhere, including inside lines, comments and \r\n pairs
+        cuts = sorted(rng.sample(range(len(code) + 1), min(len(code) + 1, 6)))
+        chunks = [code[start:end] for start, end in zip([0] + cuts, cuts + [len(code)])]
+        features, analysis = extractor.extract(iter(chunks))
+        differences = _differences(expected[name][0], features, rel_tol=1e-9)
+        if differences or not _same(expected[name][1], analysis, rel_tol=1e-9):
+            failures.append((name, differences[:3]))
+    assert failures == []
+
+
+def test_shared_nodes_are_timed_under_their_own_stage(analyzer):
+    timings = {}
+    analyzer.feature_extractor.extract(ParsedDocument(_read(os.path.join(REPO_ROOT, 'app.js'))), timings)
+    assert set(timings) == {'text', 'basic', 'advanced', 'style', 'scan', 'literals'}
+    assert analyzer.feature_extractor.graph.stages['scan'] == 'scan'
+    assert analyzer.feature_extractor.graph.stages['tree'] == 'advanced'
+
+
+def test_streaming_reports_the_fused_stages(analyzer):
+    code = _read(os.path.join(REPO_ROOT, 'enhanced_analyzer.py'))
+    _, _, fused = analyzer._extract_and_analyze(code)
+    streamed = {}
+    StreamingFeatureExtractor(analyzer.compiled_patterns, block_size=1024).extract(iter([code]), streamed)
+    assert set(streamed) == set(fused)
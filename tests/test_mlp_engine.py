@@ -0,0 +1,88 @@
+"""The folded float and int8 NumPy engines against the sklearn model they replace."""
+import numpy as np
+import pytest
+from sklearn.neural_network import MLPClassifier
+from sklearn.preprocessing import StandardScaler
+
+from mlp_engine import (
+    EXACT_FLOAT32_FAN_IN, FoldedMLP, QuantizedMLP, _int8_matmul, _matmul_operand, build_engine,
+    build_quantized_engine
+)
+
+pytestmark = pytest.mark.filterwarnings('ignore::sklearn.exceptions.ConvergenceWarning')
+
+
+def _training_set(classes, seed=0):
+    rng = np.random.RandomState(seed)
+    # Raw features on very different scales, like the analyzer's counts and ratios
+    x = rng.standard_normal((400, 80)) * rng.uniform(0.1, 500, 80) + rng.uniform(0, 1000, 80)
+    score = x[:, :8] @ rng.standard_normal(8) / x[:, :8].std(axis=0).sum()
+    y = np.digitize(score, np.quantile(score, np.linspace(0, 1, classes + 1)[1:-1]))
+    return x, y
+
+
+@pytest.fixture(scope='module', params=[2, 3], ids=['binary', 'multiclass'])
+def fitted(request):
+    x, y = _training_set(request.param)
+    scaler = StandardScaler().fit(x)
+    model = MLPClassifier(hidden_layer_sizes=(32, 16), max_iter=300, random_state=0).fit(scaler.transform(x), y)
+    return model, scaler, x
+
+
+def test_folded_engine_matches_sklearn(fitted):
+    model, scaler, x = fitted
+    engine = build_engine(model, scaler)
+    assert isinstance(engine, FoldedMLP)
+    np.testing.assert_allclose(engine.predict_proba(x), model.predict_proba(scaler.transform(x)), rtol=1e-7, atol=1e-9)
+
+
+def test_quantized_engine_agrees_with_the_float_model(fitted):
+    model, scaler, x = fitted
+    engine = QuantizedMLP.from_sklearn(model, scaler)
+    expected = model.predict_proba(scaler.transform(x))
+    actual = engine.predict_proba(x)
+
+    assert actual.shape == expected.shape
+    np.testing.assert_allclose(actual.sum(axis=1), 1.0, rtol=1e-6)
+    assert np.mean(np.argmax(actual, axis=1) == np.argmax(expected, axis=1)) >= 0.99
+    assert np.max(np.abs(actual - expected)) < 0.05
+    assert list(engine.predict(x[:20])) == list(model.classes_[np.argmax(actual[:20], axis=1)])
+
+
+def test_quantized_engine_passes_the_guardrail_on_stored_calibration_rows(fitted):
+    model, scaler, x = fitted
+    engine, report = build_quantized_engine(model, scaler, calibration=x[:200])
+    assert isinstance(engine, QuantizedMLP)
+    assert report['enabled'] and report['calibration_source'] == 'stored' and report['calibration_rows'] == 200
+    assert report['agreement'] >= 0.99 and report['max_difference'] <= 0.05
+    assert report['weight_bytes'] < report['float_weight_bytes']
+
+
+def test_guardrail_rejects_an_engine_outside_its_limits(fitted):
+    model, scaler, x = fitted
+    engine, report = build_quantized_engine(model, scaler, calibration=x[:200], max_difference=0.0)
+    assert engine is None
+    assert report['enabled'] is False and report['max_difference'] > 0.0
+
+
+def test_narrow_layers_hold_float32_weights_converted_once(fitted):
+    model, scaler, _ = fitted
+    engine = QuantizedMLP.from_sklearn(model, scaler)
+    for weight, coef in zip(engine.weights, model.coefs_):
+        assert weight.dtype == np.float32 and weight.shape == coef.shape
+        assert np.array_equal(weight, np.rint(weight)) and np.abs(weight).max() <= 127
+
+
+def test_wide_layers_keep_int8_weights_and_multiply_exactly():
+    rng = np.random.RandomState(0)
+    fan_in = EXACT_FLOAT32_FAN_IN + 100
+    weight = rng.randint(-127, 128, (fan_in, 8)).astype(np.int8)
+    x = rng.randint(-127, 128, (4, fan_in)).astype(np.float32)
+
+    operand = _matmul_operand(weight)
+    assert operand.dtype == np.int8
+    expected = x.astype(np.int64) @ weight.astype(np.int64)
+    assert np.array_equal(_int8_matmul(x, operand), expected.astype(np.float32))
+    narrow = _matmul_operand(weight[:EXACT_FLOAT32_FAN_IN])
+    assert np.array_equal(_int8_matmul(x[:, :EXACT_FLOAT32_FAN_IN], narrow),
+                          x[:, :EXACT_FLOAT32_FAN_IN].astype(np.int64) @ weight[:EXACT_FLOAT32_FAN_IN].astype(np.int64))
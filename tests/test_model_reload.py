@@ -0,0 +1,171 @@
+"""Hot reload: atomic model swaps, rejected model sets and the directory watcher."""
+import os
+import shutil
+import threading
+import time
+
+import joblib
+import numpy as np
+import pytest
+from sklearn.neural_network import MLPClassifier
+from sklearn.preprocessing import StandardScaler
+
+from enhanced_analyzer import EnhancedCodeAnalyzer
+from feature_engine import FEATURE_COUNT
+
+pytestmark = pytest.mark.filterwarnings('ignore::sklearn.exceptions.ConvergenceWarning', 'ignore::UserWarning')
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+SNIPPETS = ['def f(x):\n    return x + 1\n', 'class A:\n    pass\n', 'for i in range(3):\n    print(i)\n',
+            'import os\nprint(os.getcwd())\n', 'x = [i * i for i in range(10)]\n']
+
+
+def _fit(n_features=FEATURE_COUNT, seed=0):
+    rng = np.random.RandomState(seed)
+    x = rng.standard_normal((200, n_features)) * 10
+    y = (x[:, seed % n_features] > 0).astype(int)
+    scaler = StandardScaler().fit(x)
+    return MLPClassifier(hidden_layer_sizes=(8,), max_iter=50, random_state=seed).fit(scaler.transform(x), y), scaler
+
+
+def _write_models(model, scaler):
+    joblib.dump(model, os.path.join('models', 'improved_neural_model.pkl'))
+    joblib.dump(scaler, os.path.join('models', 'improved_scaler.pkl'))
+
+
+@pytest.fixture
+def model_dir(tmp_path, monkeypatch):
+    # Every model path is relative to the working directory
+    monkeypatch.chdir(tmp_path)
+    os.makedirs('models')
+    return tmp_path / 'models'
+
+
+@pytest.fixture
+def analyzer(model_dir):
+    _write_models(*_fit(seed=0))
+    analyzer = EnhancedCodeAnalyzer()
+    yield analyzer
+    analyzer.stop_watching_models()
+
+
+def _install_shipped_pickles(prefix):
+    for name in os.listdir('models'):
+        os.remove(os.path.join('models', name))
+    model_name = 'simple_neural_model.pkl' if prefix == 'simple_neural' else f'{prefix}_neural_model.pkl'
+    for name in (model_name, f'{prefix}_scaler.pkl', f'{prefix}_label_encoder.pkl'):
+        shutil.copy(os.path.join(REPO_ROOT, name), os.path.join('models', name))
+
+
+def test_reload_swaps_in_new_models_while_requests_run(analyzer):
+    before = analyzer.models
+    assert before.neural_model is not None and before.version != 'rule_based'
+    errors, versions = [], set()
+    stop = threading.Event()
+
+    def predict():
+        while not stop.is_set():
+            try:
+                batch = {result['model_version'] for result in analyzer.predict_batch(SNIPPETS)}
+            except Exception as e:  # pragma: no cover - reported below
+                errors.append(e)
+                return
+            # One request scores with one model state from start to end
+            if len(batch) != 1:
+                errors.append(batch)
+            versions.update(batch)
+
+    threads = [threading.Thread(target=predict) for _ in range(3)]
+    for thread in threads:
+        thread.start()
+    time.sleep(0.2)
+    _write_models(*_fit(seed=1))
+    result = analyzer.reload_models()
+    time.sleep(0.2)
+    stop.set()
+    for thread in threads:
+        thread.join()
+
+    assert result == {'reloaded': True, 'model_version': analyzer.models.version, 'previous_version': before.version}
+    assert analyzer.models is not before and analyzer.models.version != before.version
+    assert errors == []
+    assert versions <= {before.version, analyzer.models.version}
+    assert {result['model_version'] for result in analyzer.predict_batch(SNIPPETS)} == {analyzer.models.version}
+
+
+@pytest.mark.parametrize('prefix,n_features', [('improved', 70), ('simple_neural', 60)])
+def test_reload_rejects_the_shipped_pickles(analyzer, prefix, n_features):
+    before = analyzer.models
+    _install_shipped_pickles(prefix)
+    result = analyzer.reload_models()
+    assert result['reloaded'] is False and result['model_version'] == before.version
+    assert f'expects {n_features} features' in result['error']
+    assert analyzer.models is before
+    assert analyzer.predict(SNIPPETS[0])['model_version'] == before.version
+
+
+@pytest.mark.parametrize('prefix', ['improved', 'simple_neural'])
+def test_startup_with_the_shipped_pickles_falls_back_to_rule_based(model_dir, prefix):
+    _install_shipped_pickles(prefix)
+    analyzer = EnhancedCodeAnalyzer()
+    assert analyzer.models.neural_model is None and analyzer.models.version == 'rule_based'
+    assert analyzer.predict(SNIPPETS[0])['model_version'] == 'rule_based'
+
+
+def test_reload_keeps_the_models_when_the_neural_model_disappears(analyzer):
+    before = analyzer.models
+    os.remove(os.path.join('models', 'improved_neural_model.pkl'))
+    result = analyzer.reload_models()
+    assert result['reloaded'] is False and 'no neural model' in result['error']
+    assert analyzer.models is before
+
+
+def test_reload_drops_predictions_cached_by_the_old_models(analyzer):
+    old_namespace = analyzer.models.namespace
+    analyzer.predict_batch(SNIPPETS)
+    assert 'cache_lookup' in analyzer.predict(SNIPPETS[0])['timings']
+    _write_models(*_fit(seed=1))
+    assert analyzer.reload_models()['reloaded']
+
+    # Features do not depend on the model and survive the swap
+    kinds = {key[0] for key in analyzer.feature_cache._entries}
+    assert kinds == {'features'}
+    assert 'cache_lookup' not in analyzer.predict(SNIPPETS[0])['timings']
+    assert ('prediction', old_namespace) not in {key[0] for key in analyzer.feature_cache._entries}
+
+
+def _wait_for(condition, timeout=10.0):
+    deadline = time.time() + timeout
+    while not condition() and time.time() < deadline:
+        time.sleep(0.02)
+    return condition()
+
+
+def test_watcher_reloads_once_the_files_settle(analyzer):
+    version = analyzer.models.version
+    analyzer.watch_models(interval=0.05, directory='models')
+    _write_models(*_fit(seed=1))
+    assert _wait_for(lambda: analyzer.models.version != version)
+
+
+def test_watcher_keeps_the_models_when_the_new_files_are_rejected(analyzer):
+    before = analyzer.models
+    analyzer.watch_models(interval=0.05, directory='models')
+    _write_models(*_fit(n_features=70, seed=1))
+    time.sleep(0.5)
+    assert analyzer.models is before
+
+    # Fixing the files is picked up by the same watcher
+    _write_models(*_fit(seed=2))
+    assert _wait_for(lambda: analyzer.models is not before)
+
+
+def test_stopped_watcher_no_longer_reloads(analyzer):
+    before = analyzer.models
+    analyzer.watch_models(interval=0.05, directory='models')
+    analyzer.stop_watching_models()
+    time.sleep(0.1)
+    _write_models(*_fit(seed=1))
+    time.sleep(0.5)
+    assert analyzer.models is before